@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from typing import List, Dict, Any
+from app.core.locations import get_location_id
 from app.utils.db_helper import fetch_all, fetch_one, get_db_connection
 
 router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
@@ -16,20 +17,21 @@ def get_analytics_summary():
     try:
         # 1. Total Revenue
         # Use payments table for authoritative revenue
-        query_revenue = "SELECT COALESCE(SUM(amount), 0) FROM payments"
-        total_revenue = fetch_one(query_revenue)[0]
+        location_id = get_location_id()
+        query_revenue = "SELECT COALESCE(SUM(amount), 0) FROM payments WHERE location_id = %s"
+        total_revenue = fetch_one(query_revenue, (location_id,), replica=True)[0]
 
         # 2. Total Paid Orders
-        query_paid_orders = "SELECT COUNT(*) FROM orders WHERE status = 'paid'"
-        total_paid_orders = fetch_one(query_paid_orders)[0]
+        query_paid_orders = "SELECT COUNT(*) FROM orders WHERE location_id = %s AND status = 'paid'"
+        total_paid_orders = fetch_one(query_paid_orders, (location_id,), replica=True)[0]
 
         # 3. Average Order Value (AOV)
         aov = float(total_revenue) / total_paid_orders if total_paid_orders > 0 else 0
 
         # 4. Active Orders (not paid, not cancelled, not served)
         # Assuming 'served' is technically active until paid, but let's count 'pending', 'preparing', 'ready'
-        query_active = "SELECT COUNT(*) FROM orders WHERE status IN ('pending', 'preparing', 'ready')"
-        active_orders = fetch_one(query_active)[0]
+        query_active = "SELECT COUNT(*) FROM orders WHERE location_id = %s AND status IN ('pending', 'preparing', 'ready')"
+        active_orders = fetch_one(query_active, (location_id,), replica=True)[0]
 
         return {
             "total_revenue": float(total_revenue),
@@ -53,11 +55,12 @@ def get_revenue_chart(period: str = 'daily'):
                 TO_CHAR(payment_time, 'YYYY-MM-DD') as date, 
                 SUM(amount) as revenue 
             FROM payments 
+            WHERE location_id = %s
             GROUP BY TO_CHAR(payment_time, 'YYYY-MM-DD') 
             ORDER BY date ASC 
             LIMIT 30
         """
-        rows = fetch_all(query)
+        rows = fetch_all(query, (get_location_id(),), replica=True)
         
         return [
             {"date": r[0], "revenue": float(r[1])}
@@ -81,12 +84,12 @@ def get_top_items():
             FROM order_items oi
             JOIN orders o ON oi.order_id = o.id
             JOIN menu_items m ON oi.menu_item_id = m.id
-            WHERE o.status != 'cancelled'
+            WHERE o.location_id = %s AND o.status != 'cancelled'
             GROUP BY m.name
             ORDER BY total_qty DESC
             LIMIT 5
         """
-        rows = fetch_all(query)
+        rows = fetch_all(query, (get_location_id(),), replica=True)
         
         return [
             {"name": r[0], "quantity": r[1], "sales": float(r[2])}
@@ -101,8 +104,8 @@ def get_order_status_distribution():
     Returns count of orders by status.
     """
     try:
-        query = "SELECT status, COUNT(*) FROM orders GROUP BY status"
-        rows = fetch_all(query)
+        query = "SELECT status, COUNT(*) FROM orders WHERE location_id = %s GROUP BY status"
+        rows = fetch_all(query, (get_location_id(),), replica=True)
         
         return [
             {"status": r[0], "count": r[1]}
@@ -0,0 +1,35 @@
+from datetime import date
+from fastapi import APIRouter, HTTPException
+from app.utils.closeout import get_settlement, preview, settle
+
+router = APIRouter(prefix="/api/closeout", tags=["Closeout"])
+
+@router.get("/{business_date}")
+def get_closeout(business_date: date):
+    """
+    Returns the stored settlement for a business day, or a live preview
+    (settled: false) if the day has not been closed out yet.
+    """
+    try:
+        settlement = get_settlement(business_date)
+        if settlement:
+            return dict(settlement, settled=True)
+        return dict(preview(business_date), settled=False)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/{business_date}", status_code=201)
+def close_out_day(business_date: date):
+    """
+    Closes out a finished business day and writes its immutable settlement
+    record. A day can only be settled once.
+    """
+    try:
+        settlement, created = settle(business_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not created:
+        raise HTTPException(status_code=409, detail=f"Business day {business_date} is already settled")
+    return dict(settlement, settled=True)
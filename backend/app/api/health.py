@@ -1,5 +1,19 @@
+import time
 from fastapi import APIRouter
-from app.utils.db_helper import fetch_one
+from fastapi.responses import JSONResponse
+from app.core.config import HEALTH_CACHE_SECONDS
+from app.core.config import WARMUP_ENABLED
+from app.core.database import connection_stats, pool_status, replica_status, shard_status
+from app.core.warmup import state as warmup_state
+from app.utils.admission import admission
+from app.utils.audit_log import audit_log
+from app.utils.idempotency import idempotency
+from app.utils.kitchen_queue import kitchen
+from app.utils.reference_data import reference_data
+from app.utils.db_helper import fetch_one, fetch_all
+from app.utils.loop_monitor import monitor
+from app.utils.stock import stock
+from app.utils.websockets import manager
 
 router = APIRouter(prefix="/api")
 
@@ -10,3 +24,81 @@ def health_check():
         "status": "OK",
         "database": "connected" if db_status else "not connected"
     }
+
+@router.get("/health/live")
+async def liveness_check():
+    """
+    Liveness probe. Touches no database; it runs on the event loop, so a
+    worker whose loop is blocked answers late instead of falsely fast.
+    """
+    return {"status": "OK", "loop_lag_ms": round(monitor.last_lag * 1000, 2)}
+
+_db_probe = {"checked_at": 0.0, "result": None}
+
+def _probe_database():
+    now = time.monotonic()
+    if _db_probe["result"] is not None and now - _db_probe["checked_at"] < HEALTH_CACHE_SECONDS:
+        return _db_probe["result"]
+
+    try:
+        start = time.perf_counter()
+        fetch_one("SELECT 1;")
+        round_trip = (time.perf_counter() - start) * 1000
+
+        # Server-wide connection usage for this database
+        rows = fetch_all("""
+            SELECT COALESCE(state, 'unknown'), COUNT(*)
+            FROM pg_stat_activity
+            WHERE datname = current_database()
+            GROUP BY 1
+        """)
+        max_connections = int(fetch_one("SHOW max_connections;")[0])
+        by_state = {r[0]: r[1] for r in rows}
+        result = {
+            "connected": True,
+            "round_trip_ms": round(round_trip, 2),
+            "connections": {
+                "total": sum(by_state.values()),
+                "max": max_connections,
+                "by_state": by_state,
+            },
+        }
+    except Exception as e:
+        result = {"connected": False, "error": str(e)}
+
+    _db_probe["checked_at"] = now
+    _db_probe["result"] = result
+    return result
+
+@router.get("/health/ready")
+def readiness_check():
+    """
+    Readiness and diagnostics: warm-up state, DB round trip, connection usage,
+    WebSocket clients and recent event loop stalls. Returns 503 while warming
+    up or when the database is unreachable.
+    """
+    database = _probe_database()
+    warming_up = WARMUP_ENABLED and not warmup_state["ready"]
+    ready = database["connected"] and not warming_up
+    body = {
+        "status": "ready" if ready else ("warming up" if warming_up else "not ready"),
+        "warmup": warmup_state,
+        "database": database,
+        "pool": pool_status(),
+        "replicas": replica_status(),
+        "shards": shard_status(),
+        "process": {
+            "connections_opened": connection_stats["opened"],
+            "replica_connections": connection_stats["replica"],
+            "replica_failovers": connection_stats["replica_failovers"],
+        },
+        "websocket_clients": len(manager.active_connections),
+        "event_loop": monitor.snapshot(),
+        "audit_log": audit_log.status(),
+        "reference_data": reference_data.status(),
+        "idempotency": idempotency.status(),
+        "stock": stock.status(),
+        "kitchen": kitchen.status(),
+        "admission": admission.snapshot(),
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
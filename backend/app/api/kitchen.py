@@ -0,0 +1,58 @@
+from datetime import datetime
+from fastapi import APIRouter, Query
+from app.core.locations import get_location_id
+from app.schemas.kitchen import KitchenQueueResponse, KitchenStationsResponse
+from app.utils.kitchen_queue import kitchen
+
+router = APIRouter(prefix="/api/kitchen", tags=["Kitchen"])
+
+def _line_to_dict(line):
+    return {
+        "menu_item_id": line.menu_item_id,
+        "name": line.name,
+        "quantity": line.quantity,
+        "notes": line.notes,
+        "station": line.station,
+        "course": line.course,
+        "prep_seconds": line.prep_seconds,
+        "fire_at": datetime.fromtimestamp(line.fire_at),
+    }
+
+@router.get("/queue", response_model=KitchenQueueResponse)
+def get_queue(limit: int = Query(100, ge=1, le=1000)):
+    """Active tickets (pending and preparing) in the order the kitchen should work them."""
+    policy, tickets = kitchen.queue(get_location_id(), limit)
+    return {
+        "policy": policy,
+        "tickets": [
+            {
+                "order_id": t.order_id,
+                "table_id": t.table_id,
+                "status": t.status,
+                "guests": t.guests,
+                "created_at": t.created_at,
+                "fire_at": datetime.fromtimestamp(t.fire_at),
+                "items": [_line_to_dict(line) for line in t.lines],
+            } for t in tickets
+        ],
+    }
+
+@router.get("/stations", response_model=KitchenStationsResponse)
+def get_stations(limit: int = Query(10, ge=1, le=100)):
+    """The next lines each station should fire, from tickets not yet started."""
+    stations = kitchen.next_up(get_location_id(), limit)
+    return {
+        "stations": {
+            station: [
+                {
+                    "order_id": t.order_id,
+                    "table_id": t.table_id,
+                    "menu_item_id": line.menu_item_id,
+                    "name": line.name,
+                    "quantity": line.quantity,
+                    "notes": line.notes,
+                    "fire_at": datetime.fromtimestamp(line.fire_at),
+                } for t, line in lines
+            ] for station, lines in stations.items()
+        }
+    }
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException
+from typing import List
+from app.core.locations import known_locations
+from app.utils.db_helper import fetch_all, fetch_one, fetch_one_and_commit
+from app.schemas.location import Location, LocationCreate
+
+router = APIRouter(prefix="/api/locations", tags=["Locations"])
+
+@router.get("/", response_model=List[Location])
+def get_locations():
+    """
+    Locations registered in the database serving this request. Other API
+    calls pick their location with the X-Location-Id header.
+    """
+    results = fetch_all("SELECT id, name, is_active FROM locations ORDER BY id")
+    return [{"id": r[0], "name": r[1], "is_active": r[2]} for r in results]
+
+@router.post("/", response_model=Location)
+def create_location(location: LocationCreate):
+    if fetch_one("SELECT id FROM locations WHERE name = %s", (location.name,)):
+        raise HTTPException(status_code=400, detail="Location name already exists")
+
+    query = """
+        INSERT INTO locations (name, is_active)
+        VALUES (%s, %s)
+        RETURNING id, name, is_active
+    """
+    result = fetch_one_and_commit(query, (location.name, location.is_active))
+    known_locations.invalidate(result[0])
+    return {"id": result[0], "name": result[1], "is_active": result[2]}
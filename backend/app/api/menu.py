@@ -1,52 +1,84 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from app.core.locations import get_location_id
 from app.utils.db_helper import fetch_all, fetch_one, execute_query
-from app.schemas.menu import MenuItem, MenuItemCreate, MenuItemUpdate, Category
+from app.schemas.menu import MenuItem, MenuItemCreate, MenuItemUpdate, Category, StockLevel, StockUpdate
+from app.utils.cache import cache
+from app.utils.reference_data import reference_data
+from app.utils.serialization import fast_response
+from app.utils.stock import stock
+from app.utils.websockets import manager
 from typing import List
 
 router = APIRouter(prefix="/api/menu", tags=["Menu"])
 
-@router.get("/categories", response_model=List[Category])
-def get_categories():
+# Suffixed with the location id: each location has its own menu (and may
+# live on a different database shard).
+CATEGORIES_CACHE_KEY = "menu:categories"
+ITEMS_CACHE_KEY = "menu:items"
+
+def _load_categories(replica=True):
     query = "SELECT id, name, display_order FROM categories ORDER BY display_order"
-    results = fetch_all(query)
-    if not results:
-        return []
-    return [{"id": r[0], "name": r[1], "display_order": r[2]} for r in results]
+    results = fetch_all(query, replica=replica)
+    # Keys in Category field order for the fast response path
+    return [{"name": r[1], "display_order": r[2], "id": r[0]} for r in results]
 
-@router.get("/items", response_model=List[MenuItem])
-def get_menu_items():
+def _load_menu_items(location_id, replica=True):
     query = """
         SELECT m.id, m.name, m.description, m.price, m.category_id, m.image_url, m.is_active, c.name as category_name
         FROM menu_items m
         LEFT JOIN categories c ON m.category_id = c.id
+        WHERE m.location_id = %s
         ORDER BY c.display_order, m.name
     """
-    results = fetch_all(query)
-    if not results:
-        return []
+    results = fetch_all(query, (location_id,), replica=replica)
     
+    # Keys in MenuItem field order for the fast response path
     items = []
     for r in results:
         items.append({
-            "id": r[0],
             "name": r[1],
             "description": r[2],
             "price": float(r[3]),
             "category_id": r[4],
             "image_url": r[5],
             "is_active": r[6],
+            "id": r[0],
             "category_name": r[7]
         })
     return items
 
+async def publish_availability(location_id, changes):
+    """
+    Pushes menu items' availability changes (from app/utils/stock.py, or
+    made by hand) to the location's WebSocket clients as one message.
+    """
+    if not changes:
+        return
+    cache.invalidate(f"{ITEMS_CACHE_KEY}:{location_id}")
+    reference_data.invalidate(location_id)
+    await manager.broadcast({"type": "availability", "items": changes}, location_id)
+
+@router.get("/categories", response_model=List[Category])
+def get_categories(request: Request):
+    key = f"{CATEGORIES_CACHE_KEY}:{get_location_id()}"
+    return fast_response(cache.get_or_load(key, _load_categories), request)
+
+@router.get("/items", response_model=List[MenuItem])
+def get_menu_items(request: Request):
+    location_id = get_location_id()
+    key = f"{ITEMS_CACHE_KEY}:{location_id}"
+    return fast_response(cache.get_or_load(key, lambda replica: _load_menu_items(location_id, replica)), request)
+
 @router.post("/items", response_model=MenuItem)
 def create_menu_item(item: MenuItemCreate):
     query = """
-        INSERT INTO menu_items (name, description, price, category_id, image_url, is_active)
-        VALUES (%s, %s, %s, %s, %s, %s)
+        INSERT INTO menu_items (name, description, price, category_id, image_url, is_active, location_id)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
         RETURNING id
     """
-    params = (item.name, item.description, item.price, item.category_id, item.image_url, item.is_active)
+    location_id = get_location_id()
+    params = (item.name, item.description, item.price, item.category_id, item.image_url, item.is_active, location_id)
     
     # We need to execute and fetch the ID, but execute_query doesn't return result.
     # So we'll use a custom fetch here or modify execute_query. 
@@ -60,6 +92,8 @@ def create_menu_item(item: MenuItemCreate):
         cur.execute(query, params)
         new_id = cur.fetchone()[0]
         conn.commit()
+        cache.invalidate(f"{ITEMS_CACHE_KEY}:{location_id}")
+        reference_data.invalidate(location_id)
         
         # Fetch the full object to return
         return {**item.dict(), "id": new_id}
@@ -71,7 +105,15 @@ def create_menu_item(item: MenuItemCreate):
         conn.close()
 
 @router.put("/items/{item_id}")
-def update_menu_item(item_id: int, item: MenuItemUpdate):
+async def update_menu_item(item_id: int, item: MenuItemUpdate):
+    location_id = get_location_id()
+    # Async only to publish the change; the update itself runs in the threadpool
+    await run_in_threadpool(_update_menu_item, item_id, item, location_id)
+    if item.is_active is not None:
+        await publish_availability(location_id, [{"menu_item_id": item_id, "is_active": item.is_active, "remaining": None}])
+    return {"message": "Item updated successfully"}
+
+def _update_menu_item(item_id, item, location_id):
     # Construct dynamic update query
     fields = []
     values = []
@@ -98,20 +140,54 @@ def update_menu_item(item_id: int, item: MenuItemUpdate):
     if not fields:
         raise HTTPException(status_code=400, detail="No fields to update")
         
-    query = f"UPDATE menu_items SET {', '.join(fields)} WHERE id = %s"
-    values.append(item_id)
+    query = f"UPDATE menu_items SET {', '.join(fields)} WHERE id = %s AND location_id = %s"
+    values.extend([item_id, location_id])
     
     try:
         execute_query(query, tuple(values))
-        return {"message": "Item updated successfully"}
+        cache.invalidate(f"{ITEMS_CACHE_KEY}:{location_id}")
+        reference_data.invalidate(location_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/items/{item_id}")
 def delete_menu_item(item_id: int):
-    query = "DELETE FROM menu_items WHERE id = %s"
+    query = "DELETE FROM menu_items WHERE id = %s AND location_id = %s"
+    location_id = get_location_id()
     try:
-        execute_query(query, (item_id,))
+        execute_query(query, (item_id, location_id))
+        cache.invalidate(f"{ITEMS_CACHE_KEY}:{location_id}")
+        reference_data.invalidate(location_id)
         return {"message": "Item deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+def _stock_level(r):
+    return {"menu_item_id": r[0], "name": r[1], "par_level": r[2], "remaining": r[3], "is_active": r[4], "sold_out": r[5]}
+
+@router.get("/stock", response_model=List[StockLevel])
+def get_stock_levels():
+    return [_stock_level(r) for r in stock.levels(get_location_id())]
+
+@router.put("/items/{item_id}/stock", response_model=List[StockLevel])
+async def set_stock_level(item_id: int, update: StockUpdate):
+    """
+    Sets an item's daily par level and refills its stock to it, or stops
+    counting the item's stock when par_level is null. The counter refills to
+    par at the start of every business day.
+    """
+    location_id = get_location_id()
+    changes = await run_in_threadpool(stock.set_par_level, location_id, item_id, update.par_level)
+    if changes is None:
+        raise HTTPException(status_code=404, detail="Menu item not found")
+    # Whether the item is counted is part of the reference data
+    reference_data.invalidate(location_id)
+    await publish_availability(location_id, changes)
+    return [_stock_level(r) for r in await run_in_threadpool(stock.levels, location_id, item_id)]
+
+@router.post("/stock/refill", response_model=List[StockLevel])
+async def refill_stock():
+    """Refills every counted item to its par level now, reactivating the ones that sold out."""
+    location_id = get_location_id()
+    await publish_availability(location_id, await run_in_threadpool(stock.refill, location_id))
+    return [_stock_level(r) for r in await run_in_threadpool(stock.levels, location_id)]
@@ -0,0 +1,74 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from app.core.config import QUERY_LOG_ENABLED
+from app.core.database import get_db_connection
+from app.utils import query_log
+from app.utils.admission import admission
+from app.utils.loop_monitor import monitor
+from app.utils.plan_check import find_seq_scans
+from app.utils.metrics import render_prometheus
+
+router = APIRouter(prefix="/api")
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Prometheus text exposition of per-route latency, queries per request,
+    DB time per request, row counts, event loop lag and requests shed by
+    admission control. Counters are per worker process.
+    """
+    return render_prometheus() + monitor.render_prometheus() + admission.render_prometheus()
+
+def _require_query_log():
+    if not QUERY_LOG_ENABLED:
+        raise HTTPException(status_code=404, detail="Query log is disabled (set QUERY_LOG_ENABLED=true)")
+
+@router.get("/metrics/queries")
+def get_query_stats():
+    """
+    Per-fingerprint call counts and latency percentiles, slowest total first.
+    """
+    _require_query_log()
+    return query_log.snapshot()
+
+@router.delete("/metrics/queries")
+def reset_query_stats():
+    _require_query_log()
+    query_log.reset()
+    return {"message": "Query statistics reset"}
+
+@router.get("/metrics/queries/seq-scans")
+def get_seq_scans():
+    """
+    Recorded statements whose current plan reads a large table sequentially,
+    i.e. that no index serves.
+    """
+    _require_query_log()
+    return find_seq_scans()
+
+@router.post("/metrics/queries/{fingerprint_id}/explain")
+def explain_query(fingerprint_id: str):
+    """
+    Runs EXPLAIN ANALYZE for the most recent call of a fingerprint, using its
+    real parameters. Only SELECT statements are allowed and the transaction is
+    always rolled back.
+    """
+    _require_query_log()
+    sample = query_log.get_sample(fingerprint_id)
+    if not sample:
+        raise HTTPException(status_code=404, detail="Unknown fingerprint")
+
+    query, params = sample
+    if not query.lstrip().upper().startswith("SELECT"):
+        raise HTTPException(status_code=400, detail="Only SELECT statements can be explained")
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params or ())
+        plan = cur.fetchone()[0]
+        return {"id": fingerprint_id, "plan": plan}
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
@@ -1,12 +1,127 @@
-from fastapi import APIRouter, HTTPException, Body, WebSocket, WebSocketDisconnect
+import psycopg2.errors
+from collections import defaultdict
+from fastapi import APIRouter, HTTPException, Body, Request, WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
 from typing import List
 from datetime import datetime
-from app.utils.db_helper import fetch_all, fetch_one, fetch_one_and_commit, execute_query, get_db_connection
-from app.schemas.order import Order, OrderCreate, OrderUpdateStatus, OrderItem, PaymentCreate, Payment
+from app.api.menu import publish_availability
+from app.core.config import ORDER_HOT_DAYS
+from app.core.locations import get_location_id
+from app.utils.db_helper import PreparedStatement, UnitOfWork, fetch_all, fetch_one
+from app.schemas.order import (
+    Order, OrderBatch, OrderBatchResponse, OrderCreate, OrderUpdateStatus, OrderItem, PaymentCreate, Payment,
+)
+from app.utils.audit_log import audit_log
+from app.utils.idempotency import IdempotencyKey, idempotency
+from app.utils.kitchen_queue import kitchen
+from app.utils.order_batch import ingest
+from app.utils.reference_data import reference_data
+from app.utils.serialization import fast_response
+from app.utils.stock import OutOfStock, stock
 from app.utils.websockets import manager
 
 router = APIRouter(prefix="/api/orders", tags=["Orders"])
 
+ORDER_COLUMNS = "id, table_id, reservation_id, status, total_amount, created_at, updated_at"
+
+# The statements every order passes through are prepared once per connection.
+# Lookups by id try the orders of the last ORDER_HOT_DAYS first, so only the
+# latest partitions are checked; the unbounded form finds older orders. The
+# upper bound (past any batch's clock skew) also rules out the default and
+# future partitions.
+RECENT = "{0} >= LOCALTIMESTAMP - make_interval(secs => %s) AND {0} < LOCALTIMESTAMP + interval '1 day'"
+HOT_SECONDS = ORDER_HOT_DAYS * 86400
+
+ORDER_QUERY = PreparedStatement(
+    "order_by_id", f"SELECT {ORDER_COLUMNS} FROM orders WHERE id = %s AND location_id = %s"
+)
+
+RECENT_ORDER_QUERY = PreparedStatement(
+    "recent_order_by_id",
+    f"SELECT {ORDER_COLUMNS} FROM orders WHERE id = %s AND location_id = %s AND {RECENT.format('created_at')}"
+)
+
+# Items are inserted in the same transaction as their order, so bounding
+# created_at by the order's lets Postgres skip older order_items partitions.
+ORDER_ITEMS_QUERY = PreparedStatement("order_items", """
+    SELECT oi.id, oi.order_id, oi.menu_item_id, oi.quantity, oi.unit_price, oi.notes, m.name
+    FROM order_items oi
+    JOIN menu_items m ON oi.menu_item_id = m.id
+    WHERE oi.order_id = %s AND oi.created_at >= %s
+""")
+
+# Reservations aren't part of the cached reference data
+RESERVATION_PARTY_SIZE = PreparedStatement(
+    "reservation_party_size", "SELECT party_size FROM reservations WHERE id = %s AND location_id = %s"
+)
+
+# Foreign keys that fail when the cached reference data is out of date
+REFERENCE_CONSTRAINTS = {"orders_table_id_fkey", "order_items_menu_item_id_fkey"}
+
+INSERT_ORDER = PreparedStatement("insert_order", """
+    INSERT INTO orders (table_id, reservation_id, total_amount, status, location_id)
+    VALUES (%s, %s, %s, 'pending', %s)
+    RETURNING id, created_at, updated_at
+""")
+
+# All of an order's items in one statement, however many there are
+INSERT_ORDER_ITEMS = PreparedStatement("insert_order_items", """
+    INSERT INTO order_items (order_id, menu_item_id, quantity, unit_price, notes)
+    SELECT %s, * FROM unnest(%s::int[], %s::int[], %s::numeric[], %s::text[])
+""")
+
+# Locked until the status change commits, so concurrent bumps and payments
+# of one order see each other's status
+LOCK_ORDER = PreparedStatement(
+    "lock_order",
+    "SELECT status, total_amount, created_at FROM orders WHERE id = %s AND location_id = %s FOR UPDATE"
+)
+
+LOCK_RECENT_ORDER = PreparedStatement(
+    "lock_recent_order",
+    "SELECT status, total_amount, created_at FROM orders "
+    f"WHERE id = %s AND location_id = %s AND {RECENT.format('created_at')} FOR UPDATE"
+)
+
+# By the locked row's created_at, so only its partition is touched
+SET_ORDER_STATUS = PreparedStatement("set_order_status", """
+    UPDATE orders
+    SET status = %s, updated_at = CURRENT_TIMESTAMP
+    WHERE id = %s AND created_at = %s AND location_id = %s
+    RETURNING updated_at
+""")
+
+INSERT_PAYMENT = PreparedStatement("insert_payment", """
+    INSERT INTO payments (order_id, amount, payment_method, transaction_id, location_id)
+    VALUES (%s, %s, %s, %s, %s)
+    RETURNING id, payment_time
+""")
+
+# Row mappers for the fast response path. Keys follow the field order of the
+# Order / OrderItem schemas so the JSON matches a response_model round trip.
+def _order_item_to_dict(r):
+    return {
+        "menu_item_id": r[2],
+        "quantity": r[3],
+        "notes": r[5],
+        "id": r[0],
+        "order_id": r[1],
+        "unit_price": float(r[4]),
+        "menu_item_name": r[6]
+    }
+
+def _order_to_dict(r, items_rows):
+    return {
+        "table_id": r[1],
+        "reservation_id": r[2],
+        "id": r[0],
+        "status": r[3],
+        "total_amount": float(r[4]),
+        "created_at": r[5],
+        "updated_at": r[6],
+        "items": [_order_item_to_dict(ir) for ir in items_rows]
+    }
+
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
@@ -19,57 +134,111 @@ async def websocket_endpoint(websocket: WebSocket):
         manager.disconnect(websocket)
 
 @router.post("/", response_model=Order)
-async def create_order(order: OrderCreate):
-    conn = get_db_connection()
-    cur = conn.cursor()
+async def create_order(order: OrderCreate, idempotency_key: IdempotencyKey = None):
+    async with idempotency.request(idempotency_key, "create_order", order) as claim:
+        if claim.response is not None:
+            return claim.response
+        return await _create_order(order, claim)
+
+async def _create_order(order, claim):
+    # 1. Validate table (against the cached reference data, which is reloaded
+    # after another worker changes it, so fetched off the event loop)
+    location_id = get_location_id()
+    reference = await run_in_threadpool(reference_data.get, location_id)
+    if order.table_id not in reference.tables:
+        raise HTTPException(status_code=404, detail="Table not found")
+
+    # 2. Calculate total and validate items
+    total_amount = 0
+    valid_items = []
+    counted = defaultdict(int)
+
+    for item in order.items:
+        menu_item = reference.menu_items.get(item.menu_item_id)
+        if not menu_item:
+            raise HTTPException(status_code=404, detail=f"Menu item {item.menu_item_id} not found")
+
+        price = float(menu_item.price)
+        total_amount += price * item.quantity
+        valid_items.append({
+            "menu_item_id": item.menu_item_id,
+            "quantity": item.quantity,
+            "unit_price": price,
+            "notes": item.notes,
+            "name": menu_item.name
+        })
+        if menu_item.stock_counted:
+            counted[item.menu_item_id] += item.quantity
+
+    if counted and stock.refill_due(location_id):
+        # The first order of the day refills the counters, locking every shard
+        await publish_availability(location_id, await run_in_threadpool(stock.refill_if_due, location_id))
+
     try:
-        # 1. Validate table
-        cur.execute("SELECT id FROM tables WHERE id = %s", (order.table_id,))
-        if not cur.fetchone():
-            raise HTTPException(status_code=404, detail="Table not found")
-            
-        # 2. Calculate total and validate items
-        total_amount = 0
-        valid_items = []
-        
-        for item in order.items:
-            cur.execute("SELECT price, name FROM menu_items WHERE id = %s", (item.menu_item_id,))
-            menu_item = cur.fetchone()
-            if not menu_item:
-                raise HTTPException(status_code=404, detail=f"Menu item {item.menu_item_id} not found")
-            
-            price = float(menu_item[0])
-            name = menu_item[1]
-            total_amount += price * item.quantity
-            valid_items.append({
-                "menu_item_id": item.menu_item_id,
-                "quantity": item.quantity,
-                "unit_price": price,
-                "notes": item.notes,
-                "name": name
-            })
-            
+        # The key's row lock and the stock counters may wait on other
+        # requests: the whole transaction runs off the event loop
+        placed = await run_in_threadpool(_insert_order, order, claim, location_id, total_amount, valid_items, counted)
+    except psycopg2.errors.ForeignKeyViolation as e:
+        if e.diag.constraint_name not in REFERENCE_CONSTRAINTS:
+            # e.g. the reservation was deleted after the check above
+            raise HTTPException(status_code=409, detail="Referenced data changed, please retry")
+        # Deleted after our copy of the reference data was taken
+        reference_data.invalidate(location_id)
+        raise HTTPException(status_code=404, detail="Table or menu item not found")
+    except OutOfStock as e:
+        name = reference.menu_items[e.menu_item_id].name
+        if e.available == 0:
+            # Sold out but still active, e.g. switched back on by hand
+            await publish_availability(location_id, await run_in_threadpool(stock.sell_out, [e.menu_item_id]))
+            raise HTTPException(status_code=409, detail=f"{name} is sold out")
+        raise HTTPException(status_code=409, detail=f"Only {e.available} {name} left")
+
+    if placed is None:
+        # A retry of a request that has already completed
+        return claim.response
+    new_order, emptied = placed
+
+    # Broadcast event
+    await manager.broadcast({
+        "type": "new_order",
+        "order": _new_order_event(new_order, location_id)
+    })
+    if emptied:
+        await publish_availability(location_id, await run_in_threadpool(stock.sell_out, emptied))
+
+    return new_order
+
+def _insert_order(order, claim, location_id, total_amount, valid_items, counted):
+    """
+    Runs the order's transaction. Returns (Order, ids of items that may have
+    sold out), or None when `claim` found the response of an earlier request.
+    """
+    party_size = None
+    with UnitOfWork() as uow:
+        if claim.take(uow):
+            return None
+
+        if order.reservation_id is not None:
+            reservation = uow.fetch_one(RESERVATION_PARTY_SIZE, (order.reservation_id, location_id))
+            if reservation is None:
+                raise HTTPException(status_code=404, detail="Reservation not found")
+            party_size = reservation[0]
+
         # 3. Create Order
-        cur.execute("""
-            INSERT INTO orders (table_id, reservation_id, total_amount, status)
-            VALUES (%s, %s, %s, 'pending')
-            RETURNING id, created_at, updated_at
-        """, (order.table_id, order.reservation_id, total_amount))
-        
-        order_row = cur.fetchone()
-        order_id = order_row[0]
-        created_at = order_row[1]
-        updated_at = order_row[2]
-        
+        order_id, created_at, updated_at = uow.fetch_one(
+            INSERT_ORDER, (order.table_id, order.reservation_id, total_amount, location_id)
+        )
         # 4. Create Order Items
-        for item in valid_items:
-            cur.execute("""
-                INSERT INTO order_items (order_id, menu_item_id, quantity, unit_price, notes)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (order_id, item["menu_item_id"], item["quantity"], item["unit_price"], item["notes"]))
-            
-        conn.commit()
-        
+        uow.execute(INSERT_ORDER_ITEMS, (
+            order_id,
+            [i["menu_item_id"] for i in valid_items],
+            [i["quantity"] for i in valid_items],
+            [i["unit_price"] for i in valid_items],
+            [i["notes"] for i in valid_items],
+        ))
+        # Spent only if the order commits
+        emptied = stock.take(uow, counted)
+
         # Construct response
         response_items = [
             OrderItem(
@@ -82,7 +251,6 @@ async def create_order(order: OrderCreate):
                 menu_item_name=i["name"]
             ) for i in valid_items
         ]
-        # Construct response object first
         new_order = Order(
             id=order_id,
             table_id=order.table_id,
@@ -93,212 +261,222 @@ async def create_order(order: OrderCreate):
             updated_at=updated_at,
             items=response_items
         )
-        
-        # Broadcast event
+        # Committed together with the order
+        claim.save(uow, new_order)
+
+    # Guests of a walk-in come from the reference data, which may reload
+    kitchen.order_created(location_id, new_order, party_size)
+    return new_order, emptied
+
+def _fire_at(location_id, order_id):
+    # The ticket's queue position, so displays patch their order instead of refetching the queue
+    fire_at = kitchen.fire_at(location_id, order_id)
+    return fire_at.isoformat() if fire_at else None
+
+def _new_order_event(order, location_id):
+    return {
+        "id": order.id,
+        "table_id": order.table_id,
+        "status": order.status,
+        "items": [{"name": i.menu_item_name, "quantity": i.quantity} for i in order.items],
+        "created_at": order.created_at.isoformat(),
+        "fire_at": _fire_at(location_id, order.id)
+    }
+
+@router.post("/batch", response_model=OrderBatchResponse)
+async def create_order_batch(batch: OrderBatch):
+    """
+    Ingests orders a POS queued while offline. Each order is created,
+    reported as a duplicate of one already received with the same
+    client_order_id, or rejected with the reason; one bad order doesn't
+    fail the others.
+    """
+    location_id = get_location_id()
+    # A whole batch of round trips: run it off the event loop
+    await publish_availability(location_id, await run_in_threadpool(stock.refill_if_due, location_id))
+    results, created, emptied = await run_in_threadpool(ingest, batch, location_id)
+
+    # One message for the whole burst instead of one per order
+    if created:
         await manager.broadcast({
-            "type": "new_order",
-            "order": {
-                "id": new_order.id,
-                "table_id": new_order.table_id,
-                "status": new_order.status,
-                "items": [{"name": i.menu_item_name, "quantity": i.quantity} for i in new_order.items],
-                "created_at": new_order.created_at.isoformat()
-            }
+            "type": "new_orders",
+            "orders": [_new_order_event(o, location_id) for o in sorted(created, key=lambda o: o.created_at)]
         })
-        
-        return new_order
-        
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        cur.close()
-        conn.close()
+    await publish_availability(location_id, await run_in_threadpool(stock.sell_out, emptied))
 
-@router.get("/{order_id}", response_model=Order)
-def get_order(order_id: int):
-    query_order = "SELECT id, table_id, reservation_id, status, total_amount, created_at, updated_at FROM orders WHERE id = %s"
-    order_row = fetch_one(query_order, (order_id,))
+    counts = {status: sum(r.status == status for r in results) for status in ("created", "duplicate", "rejected")}
+    return OrderBatchResponse(
+        created=counts["created"], duplicates=counts["duplicate"], rejected=counts["rejected"], results=results
+    )
+
+def _lock_order(uow, order_id, location_id):
+    """(status, total_amount, created_at) of the order, locked in `uow`, or None."""
+    return (uow.fetch_one(LOCK_RECENT_ORDER, (order_id, location_id, HOT_SECONDS))
+            or uow.fetch_one(LOCK_ORDER, (order_id, location_id)))
+
+def _load_order(order_id, replica=False):
+    location_id = get_location_id()
+    order_row = (fetch_one(RECENT_ORDER_QUERY, (order_id, location_id, HOT_SECONDS), replica=replica)
+                 or fetch_one(ORDER_QUERY, (order_id, location_id), replica=replica))
     if not order_row:
         raise HTTPException(status_code=404, detail="Order not found")
-        
-    query_items = """
-        SELECT oi.id, oi.order_id, oi.menu_item_id, oi.quantity, oi.unit_price, oi.notes, m.name
-        FROM order_items oi
-        JOIN menu_items m ON oi.menu_item_id = m.id
-        WHERE oi.order_id = %s
-    """
-    items_rows = fetch_all(query_items, (order_id,))
-    
-    items = [
-        OrderItem(
-            id=r[0],
-            order_id=r[1],
-            menu_item_id=r[2],
-            quantity=r[3],
-            unit_price=float(r[4]),
-            notes=r[5],
-            menu_item_name=r[6]
-        ) for r in items_rows
-    ]
-    
-    return Order(
-        id=order_row[0],
-        table_id=order_row[1],
-        reservation_id=order_row[2],
-        status=order_row[3],
-        total_amount=float(order_row[4]),
-        created_at=order_row[5],
-        updated_at=order_row[6],
-        items=items
-    )
+
+    items_rows = fetch_all(ORDER_ITEMS_QUERY, (order_id, order_row[5]), replica=replica)
+    return _order_to_dict(order_row, items_rows)
+
+@router.get("/{order_id}", response_model=Order)
+def get_order(order_id: int, request: Request):
+    return fast_response(_load_order(order_id, replica=True), request)
 
 @router.get("/", response_model=List[Order])
-def get_orders(status: str = None):
-    query = "SELECT id, table_id, reservation_id, status, total_amount, created_at, updated_at FROM orders"
-    params = []
+def get_orders(request: Request, status: str = None, since: datetime = None):
+    """
+    The location's orders, newest first. Listings by status (open tabs, the
+    kitchen) cover the last ORDER_HOT_DAYS unless `since` says otherwise, so
+    they only read the latest partitions.
+    """
+    where = "o.location_id = %s"
+    params = [get_location_id()]
     if status:
-        query += " WHERE status = %s"
+        where += " AND o.status = %s"
         params.append(status)
-    query += " ORDER BY created_at DESC"
-    
-    orders_rows = fetch_all(query, tuple(params) if params else None)
-    
-    orders = []
-    for r in orders_rows:
-        query_items = """
-            SELECT oi.id, oi.order_id, oi.menu_item_id, oi.quantity, oi.unit_price, oi.notes, m.name
-            FROM order_items oi
-            JOIN menu_items m ON oi.menu_item_id = m.id
-            WHERE oi.order_id = %s
-        """
-        items_rows = fetch_all(query_items, (r[0],))
-        items = [
-            OrderItem(
-                id=ir[0],
-                order_id=ir[1],
-                menu_item_id=ir[2],
-                quantity=ir[3],
-                unit_price=float(ir[4]),
-                notes=ir[5],
-                menu_item_name=ir[6]
-            ) for ir in items_rows
-        ]
-        
-        orders.append(Order(
-            id=r[0],
-            table_id=r[1],
-            reservation_id=r[2],
-            status=r[3],
-            total_amount=float(r[4]),
-            created_at=r[5],
-            updated_at=r[6],
-            items=items
-        ))
-        
-    return orders
+    items_where, items_params = where, list(params)
+    bound = ("{0} >= %s", since) if since is not None else (RECENT, HOT_SECONDS) if status else None
+    if bound:
+        condition, value = bound
+        where += " AND " + condition.format("o.created_at")
+        params.append(value)
+        # Items share their order's created_at: the same bound prunes order_items
+        items_where = f"{where} AND {condition.format('oi.created_at')}"
+        items_params = params + [value]
+
+    # The items of every listed order in one query, not one query per order
+    items_query = f"""
+        SELECT oi.id, oi.order_id, oi.menu_item_id, oi.quantity, oi.unit_price, oi.notes, m.name
+        FROM orders o
+        JOIN order_items oi ON oi.order_id = o.id AND oi.created_at >= o.created_at
+        JOIN menu_items m ON oi.menu_item_id = m.id
+        WHERE {items_where}
+    """
+    with UnitOfWork(replica=True) as uow:
+        orders_rows = uow.fetch_all(
+            f"SELECT {ORDER_COLUMNS} FROM orders o WHERE {where} ORDER BY created_at DESC", tuple(params)
+        )
+        items_by_order = defaultdict(list)
+        for ir in uow.fetch_all(items_query, tuple(items_params)):
+            items_by_order[ir[1]].append(ir)
+
+    orders = [_order_to_dict(r, items_by_order[r[0]]) for r in orders_rows]
+    return fast_response(orders, request)
 
 @router.put("/{order_id}/status", response_model=Order)
-async def update_order_status(order_id: int, status_update: OrderUpdateStatus):
+async def update_order_status(order_id: int, status_update: OrderUpdateStatus, request: Request):
     valid_statuses = ['pending', 'preparing', 'ready', 'served', 'paid', 'cancelled']
     if status_update.status not in valid_statuses:
         raise HTTPException(status_code=400, detail="Invalid status")
         
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
+    location_id = get_location_id()
+    new_status = status_update.status
+    # The row lock may wait on another change of the order: off the event loop
+    old_status, updated = await run_in_threadpool(_set_status, order_id, new_status, location_id)
+    kitchen.status_changed(location_id, order_id, new_status)
+
+    # Broadcast update
+    await manager.broadcast({
+        "type": "status_update",
+        "order_id": order_id,
+        "new_status": new_status,
+        "old_status": old_status,
+        "fire_at": _fire_at(location_id, order_id)
+    })
+
+    return fast_response(updated, request)
+
+def _set_status(order_id, new_status, location_id):
+    with UnitOfWork() as uow:
         # Get current status
-        cur.execute("SELECT status FROM orders WHERE id = %s", (order_id,))
-        row = cur.fetchone()
+        row = _lock_order(uow, order_id, location_id)
         if not row:
             raise HTTPException(status_code=404, detail="Order not found")
-        
         old_status = row[0]
-        new_status = status_update.status
-        
-        cur.execute("""
-            UPDATE orders 
-            SET status = %s, updated_at = CURRENT_TIMESTAMP 
-            WHERE id = %s 
-        """, (new_status, order_id))
-        
-        cur.execute("""
-            INSERT INTO order_logs (order_id, old_status, new_status)
-            VALUES (%s, %s, %s)
-        """, (order_id, old_status, new_status))
-        
-        conn.commit()
-        
-        # Broadcast update
-        await manager.broadcast({
-            "type": "status_update",
-            "order_id": order_id,
-            "new_status": new_status,
-            "old_status": old_status
-        })
-        
-        return get_order(order_id)
-        
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        cur.close()
-        conn.close()
+
+        changed_at = uow.fetch_one(SET_ORDER_STATUS, (new_status, order_id, row[2], location_id))[0]
+
+        # Kitchen bumps are logged write-behind unless AUDIT_LOG_MODE=sync;
+        # paid and cancelled always with the change itself
+        deferred = audit_log.deferred(new_status)
+        if not deferred:
+            audit_log.write(uow.cur, order_id, old_status, new_status)
+
+    if deferred:
+        audit_log.enqueue(order_id, old_status, new_status, changed_at)
+
+    # Read-after-write: load the updated order from the primary, not a replica
+    return old_status, _load_order(order_id)
 
 @router.post("/{order_id}/pay", response_model=Payment)
-async def pay_order(order_id: int, payment: PaymentCreate):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
+async def pay_order(order_id: int, payment: PaymentCreate, idempotency_key: IdempotencyKey = None):
+    async with idempotency.request(idempotency_key, f"pay_order:{order_id}", payment) as claim:
+        if claim.response is not None:
+            return claim.response
+        return await _pay_order(order_id, payment, claim)
+
+async def _pay_order(order_id, payment, claim):
+    location_id = get_location_id()
+    new_status = 'paid'
+    # Waits on the key's and the order's row locks: off the event loop
+    paid = await run_in_threadpool(_record_payment, order_id, payment, claim, location_id)
+    if paid is None:
+        # A retry of a payment that has already gone through
+        return claim.response
+    result, status = paid
+
+    kitchen.status_changed(location_id, order_id, new_status)
+
+    # Broadcast update
+    await manager.broadcast({
+        "type": "status_update",
+        "order_id": order_id,
+        "new_status": new_status,
+        "old_status": status,
+        "fire_at": _fire_at(location_id, order_id)
+    })
+
+    return result
+
+def _record_payment(order_id, payment, claim, location_id):
+    """
+    Runs the payment's transaction. Returns (Payment, the order's previous
+    status), or None when `claim` found the response of an earlier request.
+    """
+    new_status = 'paid'
+    with UnitOfWork() as uow:
+        if claim.take(uow):
+            return None
+
         # 1. Get Order
-        cur.execute("SELECT status, total_amount FROM orders WHERE id = %s", (order_id,))
-        row = cur.fetchone()
+        row = _lock_order(uow, order_id, location_id)
         if not row:
             raise HTTPException(status_code=404, detail="Order not found")
-        
-        status, total_amount = row
-        
+
+        status, total_amount, created_at = row
+
         # 2. Check status
         if status == 'paid':
-             raise HTTPException(status_code=400, detail="Order already paid")
-             
+            raise HTTPException(status_code=400, detail="Order already paid")
+
         # 3. Record Payment
-        cur.execute("""
-            INSERT INTO payments (order_id, amount, payment_method, transaction_id)
-            VALUES (%s, %s, %s, %s)
-            RETURNING id, payment_time
-        """, (order_id, payment.amount, payment.payment_method, payment.transaction_id))
-        
-        pay_row = cur.fetchone()
-        payment_id = pay_row[0]
-        payment_time = pay_row[1]
-        
+        payment_id, payment_time = uow.fetch_one(INSERT_PAYMENT, (
+            order_id, payment.amount, payment.payment_method, payment.transaction_id, location_id
+        ))
+
         # 4. Update Order Status to 'paid'
-        new_status = 'paid'
-        cur.execute("""
-            UPDATE orders 
-            SET status = %s, updated_at = CURRENT_TIMESTAMP 
-            WHERE id = %s 
-        """, (new_status, order_id))
-        
-        # 5. Log change
-        cur.execute("""
-            INSERT INTO order_logs (order_id, old_status, new_status)
-            VALUES (%s, %s, %s)
-        """, (order_id, status, new_status))
-        
-        conn.commit()
-        
-        # Broadcast update
-        await manager.broadcast({
-            "type": "status_update",
-            "order_id": order_id,
-            "new_status": new_status,
-            "old_status": status
-        })
-        
-        return Payment(
+        uow.execute(SET_ORDER_STATUS, (new_status, order_id, created_at, location_id))
+
+        # 5. Log change, in the same transaction as the payment
+        audit_log.write(uow.cur, order_id, status, new_status)
+
+        result = Payment(
             id=payment_id,
             order_id=order_id,
             amount=payment.amount,
@@ -306,10 +484,5 @@ async def pay_order(order_id: int, payment: PaymentCreate):
             transaction_id=payment.transaction_id,
             payment_time=payment_time
         )
-        
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        cur.close()
-        conn.close()
+        claim.save(uow, result)
+    return result, status
@@ -1,19 +1,42 @@
+import psycopg2.errors
 from fastapi import APIRouter, HTTPException
 from typing import List
 from datetime import timedelta
-from app.utils.db_helper import fetch_all, fetch_one, execute_query, fetch_one_and_commit
+from app.core.locations import get_location_id
+from app.utils.db_helper import PreparedStatement, UnitOfWork, fetch_all
+from app.utils.reference_data import reference_data
 from app.schemas.reservation import Reservation, ReservationCreate
 
 router = APIRouter(prefix="/api/reservations", tags=["Reservations"])
 
+# Overlap logic: (StartA < EndB) and (StartB < EndA)
+# Note: make_interval is PostgreSQL specific.
+CONFLICT_QUERY = PreparedStatement("reservation_conflict", """
+    SELECT id FROM reservations
+    WHERE table_id = %s
+      AND status != 'cancelled'
+      AND (%s < reservation_time + make_interval(mins => duration_minutes))
+      AND (reservation_time < %s)
+""")
+
+# Foreign keys that fail when the cached reference data is out of date
+REFERENCE_CONSTRAINTS = {"reservations_table_id_fkey"}
+
+INSERT_RESERVATION = PreparedStatement("insert_reservation", """
+    INSERT INTO reservations (table_id, customer_name, customer_phone, reservation_time, party_size, duration_minutes, status, location_id)
+    VALUES (%s, %s, %s, %s, %s, %s, 'confirmed', %s)
+    RETURNING id, table_id, customer_name, customer_phone, reservation_time, party_size, duration_minutes, status, created_at
+""")
+
 @router.get("/", response_model=List[Reservation])
 def get_reservations():
     query = """
         SELECT id, table_id, customer_name, customer_phone, reservation_time, party_size, duration_minutes, status, created_at 
         FROM reservations 
+        WHERE location_id = %s
         ORDER BY reservation_time DESC
     """
-    results = fetch_all(query)
+    results = fetch_all(query, (get_location_id(),), replica=True)
     if not results:
         return []
     return [
@@ -33,48 +56,41 @@ def get_reservations():
 
 @router.post("/", response_model=Reservation)
 def create_reservation(reservation: ReservationCreate):
-    # Check if table exists
-    table_query = "SELECT capacity FROM tables WHERE id = %s"
-    table = fetch_one(table_query, (reservation.table_id,))
+    # Check if table exists at this location
+    location_id = get_location_id()
+    table = reference_data.get(location_id).tables.get(reservation.table_id)
     if not table:
         raise HTTPException(status_code=404, detail="Table not found")
     
     # Check capacity
-    if reservation.party_size > table[0]:
+    if reservation.party_size > table.capacity:
          raise HTTPException(status_code=400, detail="Party size exceeds table capacity")
 
     # Calculate end time for the new reservation
     new_start = reservation.reservation_time
     new_end = new_start + timedelta(minutes=reservation.duration_minutes)
 
-    # Check for conflicts
-    # Overlap logic: (StartA < EndB) and (StartB < EndA)
-    conflict_query = """
-        SELECT id FROM reservations
-        WHERE table_id = %s
-          AND status != 'cancelled'
-          AND (%s < reservation_time + make_interval(mins => duration_minutes))
-          AND (reservation_time < %s)
-    """
-    # Note: make_interval is PostgreSQL specific.
-    
-    conflict = fetch_one(conflict_query, (reservation.table_id, new_start, new_end))
-    if conflict:
-        raise HTTPException(status_code=409, detail="Table is already reserved for this time slot")
+    # Conflict check and insert share one connection and transaction
+    try:
+        with UnitOfWork() as uow:
+            if uow.fetch_one(CONFLICT_QUERY, (reservation.table_id, new_start, new_end)):
+                raise HTTPException(status_code=409, detail="Table is already reserved for this time slot")
 
-    query = """
-        INSERT INTO reservations (table_id, customer_name, customer_phone, reservation_time, party_size, duration_minutes, status)
-        VALUES (%s, %s, %s, %s, %s, %s, 'confirmed')
-        RETURNING id, table_id, customer_name, customer_phone, reservation_time, party_size, duration_minutes, status, created_at
-    """
-    result = fetch_one_and_commit(query, (
-        reservation.table_id, 
-        reservation.customer_name, 
-        reservation.customer_phone, 
-        reservation.reservation_time, 
-        reservation.party_size,
-        reservation.duration_minutes
-    ))
+            result = uow.fetch_one(INSERT_RESERVATION, (
+                reservation.table_id,
+                reservation.customer_name,
+                reservation.customer_phone,
+                reservation.reservation_time,
+                reservation.party_size,
+                reservation.duration_minutes,
+                location_id
+            ))
+    except psycopg2.errors.ForeignKeyViolation as e:
+        if e.diag.constraint_name not in REFERENCE_CONSTRAINTS:
+            raise HTTPException(status_code=409, detail="Referenced data changed, please retry")
+        # Deleted after our copy of the reference data was taken
+        reference_data.invalidate(location_id)
+        raise HTTPException(status_code=404, detail="Table not found")
     
     return {
         "id": result[0],
@@ -1,34 +1,43 @@
+import psycopg2.errors
 from fastapi import APIRouter, HTTPException, Query
 from typing import List
 from datetime import datetime, timedelta
-from app.utils.db_helper import fetch_all, fetch_one, execute_query, fetch_one_and_commit
+from app.core.locations import get_location_id
+from app.utils.db_helper import PreparedStatement, fetch_all, fetch_one_and_commit
+from app.utils.reference_data import reference_data
 from app.schemas.table import Table, TableCreate
+from app.utils.cache import cache
 
 router = APIRouter(prefix="/api/tables", tags=["Tables"])
 
+# Suffixed with the location id
+TABLES_CACHE_KEY = "tables"
+
+# Tables that are NOT occupied during the requested window
+AVAILABLE_TABLES_QUERY = PreparedStatement("available_tables", """
+    SELECT t.id, t.table_number, t.capacity, t.location, t.is_active 
+    FROM tables t
+    WHERE t.location_id = %s
+    AND t.is_active = TRUE
+    AND NOT EXISTS (
+        -- Correlated, so reservations_table_id_reservation_time_idx serves it
+        SELECT 1
+        FROM reservations r
+        WHERE r.table_id = t.id
+        AND r.status != 'cancelled'
+        AND (%s < r.reservation_time + make_interval(mins => r.duration_minutes))
+        AND (r.reservation_time < %s)
+    )
+    ORDER BY t.capacity ASC, t.table_number ASC
+""")
+
 @router.get("/available", response_model=List[Table])
 def get_available_tables(
     reservation_time: datetime = Query(...),
     duration_minutes: int = Query(90)
 ):
     end_time = reservation_time + timedelta(minutes=duration_minutes)
-    
-    # Find tables that are NOT occupied during the requested window
-    query = """
-        SELECT t.id, t.table_number, t.capacity, t.location, t.is_active 
-        FROM tables t
-        WHERE t.is_active = TRUE
-        AND t.id NOT IN (
-            SELECT r.table_id 
-            FROM reservations r
-            WHERE r.status != 'cancelled'
-            AND (%s < r.reservation_time + make_interval(mins => r.duration_minutes))
-            AND (r.reservation_time < %s)
-        )
-        ORDER BY t.capacity ASC, t.table_number ASC
-    """
-    
-    results = fetch_all(query, (reservation_time, end_time))
+    results = fetch_all(AVAILABLE_TABLES_QUERY, (get_location_id(), reservation_time, end_time), replica=True)
     if not results:
         return []
         
@@ -43,12 +52,9 @@ def get_available_tables(
         for r in results
     ]
 
-@router.get("/", response_model=List[Table])
-def get_tables():
-    query = "SELECT id, table_number, capacity, location, is_active FROM tables ORDER BY table_number"
-    results = fetch_all(query)
-    if not results:
-        return []
+def _load_tables(location_id, replica=True):
+    query = "SELECT id, table_number, capacity, location, is_active FROM tables WHERE location_id = %s ORDER BY table_number"
+    results = fetch_all(query, (location_id,), replica=replica)
     return [
         {
             "id": r[0], 
@@ -60,18 +66,29 @@ def get_tables():
         for r in results
     ]
 
+@router.get("/", response_model=List[Table])
+def get_tables():
+    location_id = get_location_id()
+    return cache.get_or_load(f"{TABLES_CACHE_KEY}:{location_id}", lambda replica: _load_tables(location_id, replica))
+
 @router.post("/", response_model=Table)
 def create_table(table: TableCreate):
-    check_query = "SELECT id FROM tables WHERE table_number = %s"
-    if fetch_one(check_query, (table.table_number,)):
+    location_id = get_location_id()
+    if table.table_number in reference_data.get(location_id).table_numbers:
         raise HTTPException(status_code=400, detail="Table number already exists")
 
     query = """
-        INSERT INTO tables (table_number, capacity, location, is_active)
-        VALUES (%s, %s, %s, %s)
+        INSERT INTO tables (table_number, capacity, location, is_active, location_id)
+        VALUES (%s, %s, %s, %s, %s)
         RETURNING id, table_number, capacity, location, is_active
     """
-    result = fetch_one_and_commit(query, (table.table_number, table.capacity, table.location, table.is_active))
+    try:
+        result = fetch_one_and_commit(query, (table.table_number, table.capacity, table.location, table.is_active, location_id))
+    except psycopg2.errors.UniqueViolation:
+        # Added by another worker since our copy of the reference data was taken
+        raise HTTPException(status_code=400, detail="Table number already exists")
+    cache.invalidate(f"{TABLES_CACHE_KEY}:{location_id}")
+    reference_data.invalidate(location_id)
     
     return {
         "id": result[0],
@@ -10,3 +10,184 @@ DB_CONFIG = {
     "user": os.getenv("DB_USER"),
     "password": os.getenv("DB_PASSWORD"),
 }
+
+# Connections are pooled per database. DB_POOL_MIN are opened at startup;
+# up to DB_POOL_MAX_IDLE are kept open between requests.
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX_IDLE = int(os.getenv("DB_POOL_MAX_IDLE", "10"))
+
+# Optional read replicas as comma-separated libpq DSNs, e.g.
+# "host=replica1 dbname=restaurant_db user=app password=secret,host=replica2 ...".
+# Read-only endpoints are spread over them round-robin; writes always go to DB_CONFIG.
+DB_REPLICA_DSNS = [dsn.strip() for dsn in os.getenv("DB_REPLICA_DSNS", "").split(",") if dsn.strip()]
+# A replica that fails to connect or lags more than REPLICA_MAX_LAG_SECONDS is
+# skipped for REPLICA_RETRY_SECONDS; its lag is re-checked every REPLICA_CHECK_SECONDS.
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "10"))
+REPLICA_CONNECT_TIMEOUT = int(os.getenv("REPLICA_CONNECT_TIMEOUT", "2"))
+
+# Per-route latency histograms and per-request DB query counters (/api/metrics)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Opt-in statement fingerprinting with per-statement latency percentiles.
+# Statements slower than SLOW_QUERY_MS are logged with their parameters redacted.
+QUERY_LOG_ENABLED = os.getenv("QUERY_LOG_ENABLED", "false").lower() == "true"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+# Routes that opt into app.utils.serialization.fast_response skip the second
+# response_model validation pass. Set to false to compare against the default path.
+FAST_RESPONSES = os.getenv("FAST_RESPONSES", "true").lower() == "true"
+
+# Event loop stall detection (see app/utils/loop_monitor.py)
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "50"))
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
+
+# How long /api/health/ready reuses its last database probe, so frequent load
+# balancer checks don't each open a new connection.
+HEALTH_CACHE_SECONDS = float(os.getenv("HEALTH_CACHE_SECONDS", "2"))
+
+# In-process cache for menu, categories and tables listings. Writes through the
+# API invalidate it in the worker that handled them; other workers pick the
+# change up within CACHE_TTL_SECONDS. 0 disables caching.
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+
+# Tables and menu items used to validate orders and reservations are cached per
+# process and refreshed on database notifications. While a worker isn't
+# receiving them, it re-checks the data version every REFERENCE_VERSION_CHECK_SECONDS
+# (0 checks on every use).
+REFERENCE_VERSION_CHECK_SECONDS = float(os.getenv("REFERENCE_VERSION_CHECK_SECONDS", "5"))
+
+# Warm connections, caches and request handling before reporting ready
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+
+# Hour at which a business day starts for the end-of-day closeout, so orders
+# rung up after midnight count towards the previous evening's service.
+BUSINESS_DAY_START_HOUR = int(os.getenv("BUSINESS_DAY_START_HOUR", "4"))
+
+# Monthly partitions of orders, order_items, order_logs and payments (see
+# partitions.py): how many future months to create ahead, and how many full
+# months before the current one stay attached before being moved to
+# ARCHIVE_SCHEMA.
+PARTITION_PREMAKE_MONTHS = int(os.getenv("PARTITION_PREMAKE_MONTHS", "3"))
+PARTITION_RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", "12"))
+ARCHIVE_SCHEMA = os.getenv("ARCHIVE_SCHEMA", "archive")
+# Orders are looked up by id among those created in the last ORDER_HOT_DAYS
+# first, which only checks the latest partitions; older orders take a second
+# lookup through every partition. Listings by status and the kitchen queue
+# only cover orders this recent.
+ORDER_HOT_DAYS = float(os.getenv("ORDER_HOT_DAYS", "7"))
+
+# order_logs rows for kitchen status changes: "batched" buffers them and
+# writes them in bulk every AUDIT_LOG_FLUSH_MS or AUDIT_LOG_BATCH_SIZE rows,
+# "sync" inserts them inside the status change transaction. Payments and
+# changes to "paid" or "cancelled" always log synchronously. Batched mode can lose log rows of committed status
+# changes: those still buffered when a worker crashes, and the oldest ones
+# once more than AUDIT_LOG_MAX_BUFFERED are waiting while the database is
+# unreachable (counted as "dropped" in /api/health/ready).
+AUDIT_LOG_MODE = os.getenv("AUDIT_LOG_MODE", "batched").lower()
+AUDIT_LOG_BATCH_SIZE = int(os.getenv("AUDIT_LOG_BATCH_SIZE", "200"))
+AUDIT_LOG_FLUSH_MS = float(os.getenv("AUDIT_LOG_FLUSH_MS", "500"))
+AUDIT_LOG_MAX_BUFFERED = int(os.getenv("AUDIT_LOG_MAX_BUFFERED", "50000"))
+
+# Admission control (see app/utils/admission.py). Public and analytics clients
+# get a token bucket of ADMISSION_BURST requests refilled at
+# ADMISSION_RATE_PER_SECOND per client address (0 disables rate limiting).
+# Each route class has its own concurrency limit; staff requests may queue for
+# a slot, public ones only briefly and analytics not at all. Keep public plus
+# analytics well below the worker threadpool size (40) so staff order paths
+# always find a free thread.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_RATE_PER_SECOND = float(os.getenv("ADMISSION_RATE_PER_SECOND", "10"))
+ADMISSION_BURST = float(os.getenv("ADMISSION_BURST", "30"))
+ADMISSION_STAFF_CONCURRENCY = int(os.getenv("ADMISSION_STAFF_CONCURRENCY", "64"))
+ADMISSION_STAFF_QUEUE_MS = float(os.getenv("ADMISSION_STAFF_QUEUE_MS", "2000"))
+ADMISSION_PUBLIC_CONCURRENCY = int(os.getenv("ADMISSION_PUBLIC_CONCURRENCY", "16"))
+ADMISSION_PUBLIC_QUEUE_MS = float(os.getenv("ADMISSION_PUBLIC_QUEUE_MS", "50"))
+ADMISSION_ANALYTICS_CONCURRENCY = int(os.getenv("ADMISSION_ANALYTICS_CONCURRENCY", "4"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+# Take the client address from X-Forwarded-For (only behind a trusted proxy)
+ADMISSION_TRUST_FORWARDED = os.getenv("ADMISSION_TRUST_FORWARDED", "false").lower() == "true"
+
+# Idempotency-Key support on order submission and payment. Responses are kept
+# IDEMPOTENCY_TTL_HOURS in the idempotency_keys table, and the most recent
+# IDEMPOTENCY_CACHE_SIZE per process in memory. A retry that arrives while the
+# original is still running waits up to IDEMPOTENCY_WAIT_MS for its response.
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_WAIT_MS = float(os.getenv("IDEMPOTENCY_WAIT_MS", "2000"))
+
+# Most orders accepted by one POST /api/orders/batch (offline POS replay), and
+# how long a device may have been offline: orders taken more than
+# ORDER_BATCH_MAX_AGE_HOURS ago are rejected. Keep it far below
+# PARTITION_RETENTION_MONTHS, so replayed orders never land in an archived month.
+ORDER_BATCH_MAX_ORDERS = int(os.getenv("ORDER_BATCH_MAX_ORDERS", "500"))
+ORDER_BATCH_MAX_AGE_HOURS = float(os.getenv("ORDER_BATCH_MAX_AGE_HOURS", "72"))
+
+# Rows each stock-tracked menu item's remaining count is split over, so
+# concurrent orders for the same item rarely wait on each other's row lock
+STOCK_COUNTER_SHARDS = int(os.getenv("STOCK_COUNTER_SHARDS", "8"))
+
+# Kitchen ticket queue (see app/utils/kitchen_queue.py). KITCHEN_POLICY orders
+# tickets: "fifo" by arrival, "fire_time" by when their slowest item has to
+# start for each course to be ready on time (courses paced
+# KITCHEN_COURSE_GAP_SECONDS apart), "weighted" like fire_time but firing
+# large parties KITCHEN_GUEST_SECONDS earlier per guest beyond the first.
+KITCHEN_POLICY = os.getenv("KITCHEN_POLICY", "weighted")
+KITCHEN_COURSE_GAP_SECONDS = float(os.getenv("KITCHEN_COURSE_GAP_SECONDS", "600"))
+KITCHEN_GUEST_SECONDS = float(os.getenv("KITCHEN_GUEST_SECONDS", "60"))
+# Walk-ins have no party size on record; they count as this many guests,
+# capped by their table's capacity (most walk-ins are couples, not full tables).
+KITCHEN_WALK_IN_GUESTS = int(os.getenv("KITCHEN_WALK_IN_GUESTS", "2"))
+# An item's prep time is the median preparing-to-ready time of the orders
+# containing it over the last KITCHEN_PREP_LOOKBACK_DAYS of order_logs,
+# relearned every KITCHEN_PREP_REFRESH_MINUTES. Items seldom ordered in that
+# time get KITCHEN_DEFAULT_PREP_SECONDS.
+KITCHEN_PREP_LOOKBACK_DAYS = int(os.getenv("KITCHEN_PREP_LOOKBACK_DAYS", "14"))
+KITCHEN_PREP_REFRESH_MINUTES = float(os.getenv("KITCHEN_PREP_REFRESH_MINUTES", "60"))
+KITCHEN_DEFAULT_PREP_SECONDS = float(os.getenv("KITCHEN_DEFAULT_PREP_SECONDS", "600"))
+# Each worker updates its queue from the orders it handles, and reloads it
+# from the database every KITCHEN_RESYNC_SECONDS to take in other workers'.
+KITCHEN_RESYNC_SECONDS = float(os.getenv("KITCHEN_RESYNC_SECONDS", "30"))
+# Station and course of each menu category, as comma-separated category=value
+# pairs. Unlisted categories are a station of their own, and mains (course 2);
+# drinks are course 0.
+KITCHEN_STATIONS = {
+    category.strip(): station.strip()
+    for category, station in (
+        pair.split("=", 1) for pair in os.getenv(
+            "KITCHEN_STATIONS",
+            "Appetizers=cold,Salads=cold,Main Course=grill,Burgers & Sandwiches=grill,"
+            "Pizza & Pasta=oven,Desserts=pastry,Beverages=bar",
+        ).split(",") if pair.strip()
+    )
+}
+KITCHEN_COURSES = {
+    category.strip(): int(course)
+    for category, course in (
+        pair.split("=", 1) for pair in os.getenv(
+            "KITCHEN_COURSES", "Beverages=0,Appetizers=1,Salads=1,Desserts=3"
+        ).split(",") if pair.strip()
+    )
+}
+
+# Multi-location. Requests choose their location with the X-Location-Id header
+# (or ?location_id=), defaulting to DEFAULT_LOCATION_ID.
+DEFAULT_LOCATION_ID = int(os.getenv("DEFAULT_LOCATION_ID", "1"))
+# Extra databases for locations that don't live on the primary, as
+# semicolon-separated name=DSN pairs, e.g.
+# "eu=host=db-eu dbname=restaurant_db user=app;us=host=db-us ...".
+DB_SHARD_DSNS = dict(
+    pair.strip().split("=", 1) for pair in os.getenv("DB_SHARD_DSNS", "").split(";") if pair.strip()
+)
+# Which shard each location lives on, as comma-separated location_id=shard
+# pairs ("3=eu,4=us"); unlisted locations use the primary. SHARD_ROUTER may
+# instead name a "module:function" that maps a location id to a shard name.
+LOCATION_SHARDS = {
+    int(location): shard.strip()
+    for location, shard in (
+        pair.split("=", 1) for pair in os.getenv("LOCATION_SHARDS", "").split(",") if pair.strip()
+    )
+}
+SHARD_ROUTER = os.getenv("SHARD_ROUTER", "")
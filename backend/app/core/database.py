@@ -1,5 +1,329 @@
+import importlib
+import itertools
+import logging
+import os
+import threading
+import time
 import psycopg2
-from app.core.config import DB_CONFIG
+import psycopg2.extensions
+from app.core.config import (
+    DB_CONFIG, DB_POOL_MAX_IDLE, DB_POOL_MIN, DB_REPLICA_DSNS, DB_SHARD_DSNS, LOCATION_SHARDS, METRICS_ENABLED,
+    QUERY_LOG_ENABLED, REPLICA_CHECK_SECONDS, REPLICA_CONNECT_TIMEOUT, REPLICA_MAX_LAG_SECONDS,
+    REPLICA_RETRY_SECONDS, SHARD_ROUTER,
+)
+from app.core.locations import current_location
+from app.utils import query_log
+from app.utils.metrics import record_query
 
-def get_db_connection():
-    return psycopg2.connect(**DB_CONFIG)
+logger = logging.getLogger(__name__)
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """Cursor that reports every statement to the metrics registry and query log."""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            duration = time.perf_counter() - start
+            if METRICS_ENABLED:
+                record_query(duration, self.rowcount)
+            if QUERY_LOG_ENABLED:
+                if hasattr(query, "as_string"):
+                    query = query.as_string(self)
+                # EXECUTE of a prepared statement is logged as the statement itself
+                query = getattr(query, "original", query)
+                query_log.record(query, vars, duration, self.rowcount)
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """
+    Connection whose close() hands it back to its pool, so existing
+    `conn.close()` calls in handlers and db_helper keep working unchanged.
+    """
+    pool = None
+    # Names of the server-side prepared statements this session holds
+    prepared = None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            super().close()
+
+    def discard(self):
+        self.pool = None
+        super().close()
+
+
+# Process-wide counters reported by /api/health/ready
+connection_stats = {"opened": 0, "replica": 0, "replica_failovers": 0}
+
+
+class ConnectionPool:
+    """
+    Keeps up to DB_POOL_MAX_IDLE idle connections per database. It does not
+    cap the number of connections in use; a burst simply opens extra
+    connections, which are closed again on release.
+    """
+
+    def __init__(self, name, **connect_kwargs):
+        self.name = name
+        self.connect_kwargs = connect_kwargs
+        if METRICS_ENABLED or QUERY_LOG_ENABLED:
+            self.connect_kwargs["cursor_factory"] = InstrumentedCursor
+        self.idle = []
+        self.in_use = 0
+        self.lock = threading.Lock()
+
+    def _open(self):
+        conn = psycopg2.connect(connection_factory=PooledConnection, **self.connect_kwargs)
+        conn.pool = self
+        conn.prepared = set()
+        connection_stats["opened"] += 1
+        return conn
+
+    def acquire(self):
+        with self.lock:
+            conn = self.idle.pop() if self.idle else None
+            self.in_use += 1
+        if conn is None:
+            try:
+                conn = self._open()
+            except Exception:
+                with self.lock:
+                    self.in_use -= 1
+                raise
+        return conn
+
+    def release(self, conn):
+        with self.lock:
+            self.in_use -= 1
+        if conn.closed:
+            return
+        try:
+            # Read-only helpers never commit, so end whatever transaction is open
+            if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+        except psycopg2.Error:
+            conn.discard()
+            return
+        with self.lock:
+            if len(self.idle) < DB_POOL_MAX_IDLE:
+                self.idle.append(conn)
+                return
+        conn.discard()
+
+    def fill(self, size):
+        """Opens connections until `size` are idle."""
+        while True:
+            with self.lock:
+                if len(self.idle) >= size:
+                    return
+            conn = self._open()
+            with self.lock:
+                self.idle.append(conn)
+
+    def close_all(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.discard()
+
+    def status(self):
+        return {"in_use": self.in_use, "idle": len(self.idle)}
+
+
+# Replication delay in seconds; 0 when the replica has replayed everything it
+# received (pg_last_xact_replay_timestamp alone keeps growing on an idle primary).
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+class Replica:
+    def __init__(self, dsn):
+        params = psycopg2.extensions.parse_dsn(dsn)
+        # Safe to show in diagnostics, unlike the DSN itself
+        self.name = f"{params.get('host', 'localhost')}:{params.get('port', 5432)}/{params.get('dbname', '')}"
+        self.pool = ConnectionPool(self.name, dsn=dsn, connect_timeout=REPLICA_CONNECT_TIMEOUT)
+        self.down_until = 0.0
+        self.checked_at = 0.0
+        self.lag = None
+        self.last_error = None
+
+    def _mark_down(self, error):
+        self.last_error = error
+        self.down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+        # Pooled connections to a failed or lagging replica are not worth keeping
+        self.pool.close_all()
+
+    def connect(self):
+        """Returns a connection, re-checking lag if that is due, or None if unusable."""
+        try:
+            conn = self.pool.acquire()
+        except psycopg2.OperationalError as e:
+            self._mark_down(str(e).strip())
+            logger.warning("replica %s unavailable: %s", self.name, self.last_error)
+            return None
+
+        now = time.monotonic()
+        if now - self.checked_at >= REPLICA_CHECK_SECONDS:
+            self.checked_at = now
+            try:
+                cur = conn.cursor()
+                cur.execute(REPLICA_LAG_QUERY)
+                self.lag = float(cur.fetchone()[0])
+                cur.close()
+                conn.rollback()
+            except psycopg2.Error as e:
+                self.lag = None
+                conn.discard()
+                self.pool.release(conn)
+                self._mark_down(str(e).strip())
+                return None
+            if self.lag > REPLICA_MAX_LAG_SECONDS:
+                conn.close()
+                self._mark_down(f"replication lag {self.lag:.1f}s")
+                logger.warning("replica %s lagging by %.1fs, using primary", self.name, self.lag)
+                return None
+
+        self.last_error = None
+        return conn
+
+    def status(self):
+        return {
+            "name": self.name,
+            "healthy": time.monotonic() >= self.down_until,
+            "lag_seconds": self.lag,
+            "last_error": self.last_error,
+            "pool": self.pool.status(),
+        }
+
+
+PRIMARY_SHARD = "primary"
+
+_primary = ConnectionPool(PRIMARY_SHARD, **DB_CONFIG)
+_replicas = [Replica(dsn) for dsn in DB_REPLICA_DSNS]
+_next_replica = itertools.count()
+_shards = {name: ConnectionPool(name, dsn=dsn) for name, dsn in DB_SHARD_DSNS.items()}
+
+
+def static_shard_router(location_id):
+    """Default shard router: LOCATION_SHARDS, else the primary."""
+    return LOCATION_SHARDS.get(location_id, PRIMARY_SHARD)
+
+
+_shard_router = None
+
+
+def shard_for_location(location_id):
+    global _shard_router
+    if _shard_router is None:
+        if SHARD_ROUTER:
+            # Imported lazily so a custom router may itself import app modules
+            module, _, name = SHARD_ROUTER.partition(":")
+            _shard_router = getattr(importlib.import_module(module), name)
+        else:
+            _shard_router = static_shard_router
+    return _shard_router(location_id)
+
+
+def get_db_connection(replica=False):
+    """
+    Returns a pooled connection to the database holding the current request's
+    location; close() gives it back to the pool. For locations on the primary,
+    replica=True may return a connection to one of DB_REPLICA_DSNS instead
+    (round-robin over healthy replicas), falling back to the primary when none
+    is usable. Only pass replica=True for reads that can tolerate a little
+    replication lag. Shards in DB_SHARD_DSNS have no replicas.
+    """
+    shard = shard_for_location(current_location.get())
+    if shard != PRIMARY_SHARD:
+        pool = _shards.get(shard)
+        if pool is None:
+            raise RuntimeError(f"Location {current_location.get()} is routed to unknown shard {shard!r}")
+        return pool.acquire()
+
+    if replica and _replicas:
+        start = next(_next_replica)
+        now = time.monotonic()
+        for i in range(len(_replicas)):
+            candidate = _replicas[(start + i) % len(_replicas)]
+            if now < candidate.down_until:
+                continue
+            conn = candidate.connect()
+            if conn is not None:
+                connection_stats["replica"] += 1
+                return conn
+        connection_stats["replica_failovers"] += 1
+    return _primary.acquire()
+
+
+def open_pools():
+    """Opens DB_POOL_MIN connections to the primary, each shard and each healthy replica."""
+    _primary.fill(DB_POOL_MIN)
+    for pool in _shards.values():
+        pool.fill(DB_POOL_MIN)
+    for replica in _replicas:
+        try:
+            replica.pool.fill(DB_POOL_MIN)
+        except psycopg2.OperationalError as e:
+            replica._mark_down(str(e).strip())
+
+
+def close_pools():
+    _primary.close_all()
+    for pool in _shards.values():
+        pool.close_all()
+    for replica in _replicas:
+        replica.pool.close_all()
+
+
+def pool_status():
+    return _primary.status()
+
+
+def shard_status():
+    return {name: pool.status() for name, pool in _shards.items()}
+
+
+def replica_status():
+    return [r.status() for r in _replicas]
+
+
+def shard_names():
+    return [PRIMARY_SHARD] + list(_shards)
+
+
+def dedicated_connection(shard=PRIMARY_SHARD):
+    """
+    A new connection to `shard` outside any pool, for long-lived sessions
+    such as LISTEN. The caller closes it.
+    """
+    pool = _primary if shard == PRIMARY_SHARD else _shards[shard]
+    kwargs = {k: v for k, v in pool.connect_kwargs.items() if k != "cursor_factory"}
+    return psycopg2.connect(**kwargs)
+
+
+# Connections must never be shared across fork(). Closing them in the child
+# would terminate the parent's sessions, so the child just forgets them.
+_inherited = []
+
+
+def _forget_connections_after_fork():
+    for pool in [_primary] + list(_shards.values()) + [r.pool for r in _replicas]:
+        _inherited.extend(pool.idle)
+        pool.idle = []
+        pool.in_use = 0
+        pool.lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_connections_after_fork)
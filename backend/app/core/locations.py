@@ -0,0 +1,134 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from urllib.parse import parse_qs
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import CACHE_TTL_SECONDS, DEFAULT_LOCATION_ID
+
+LOCATION_HEADER = b"x-location-id"
+
+# Location of the request being handled. Set by LocationMiddleware and
+# carried into the threadpool with the rest of the request context.
+current_location: ContextVar[int] = ContextVar("current_location", default=DEFAULT_LOCATION_ID)
+
+
+def get_location_id() -> int:
+    return current_location.get()
+
+
+@contextmanager
+def use_location(location_id: int):
+    """Runs a block (scripts, background jobs) on behalf of a location."""
+    token = current_location.set(location_id)
+    try:
+        yield
+    finally:
+        current_location.reset(token)
+
+
+class KnownLocations:
+    """
+    Ids found in the locations table of the database each location is
+    routed to, so requests for an unknown id are turned away before they
+    create caches, reference data and channels for it. A known id stays
+    cached (locations are never deleted); an unknown one is looked up again
+    after `ttl` seconds, so locations created through other workers are
+    picked up.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.known = set()
+        # location_id -> time.monotonic() of the lookup that didn't find it
+        self.unknown = {}
+
+    def cached(self, location_id):
+        """True or False if the answer is cached, None if the database has to be asked."""
+        if location_id in self.known:
+            return True
+        checked_at = self.unknown.get(location_id)
+        if checked_at is not None and time.monotonic() - checked_at < self.ttl:
+            return False
+        return None
+
+    def check(self, location_id):
+        """Looks the location up in its database. Blocking."""
+        # Imported here: app.core.database imports this module
+        from app.utils.db_helper import fetch_one
+        with use_location(location_id):
+            found = fetch_one("SELECT 1 FROM locations WHERE id = %s", (location_id,)) is not None
+        if found:
+            self.known.add(location_id)
+            self.unknown.pop(location_id, None)
+        else:
+            self.unknown[location_id] = time.monotonic()
+        return found
+
+    def invalidate(self, location_id):
+        """Makes the next request for the location look it up again, e.g. once it has been created."""
+        self.unknown.pop(location_id, None)
+
+
+known_locations = KnownLocations(CACHE_TTL_SECONDS)
+
+
+def _requested_location(scope):
+    for name, value in scope.get("headers", ()):
+        if name == LOCATION_HEADER:
+            return value.decode("latin-1")
+    values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("location_id")
+    return values[0] if values else None
+
+
+async def _reject(scope, send, detail):
+    if scope["type"] == "websocket":
+        await send({"type": "websocket.close", "code": 1008})
+        return
+    body = f'{{"detail":"{detail}"}}'.encode()
+    await send({
+        "type": "http.response.start",
+        "status": 400,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class LocationMiddleware:
+    """
+    Resolves the location of HTTP and WebSocket requests. An explicitly
+    requested location must exist (see KnownLocations); DEFAULT_LOCATION_ID
+    is trusted, so requests without one never wait on the database here.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        requested = _requested_location(scope)
+        try:
+            location_id = DEFAULT_LOCATION_ID if requested is None else int(requested)
+            if location_id <= 0:
+                raise ValueError
+        except ValueError:
+            await _reject(scope, send, "Invalid location id")
+            return
+
+        if requested is not None and location_id != DEFAULT_LOCATION_ID:
+            known = known_locations.cached(location_id)
+            if known is None:
+                known = await run_in_threadpool(known_locations.check, location_id)
+            if not known:
+                await _reject(scope, send, "Unknown location")
+                return
+
+        token = current_location.set(location_id)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_location.reset(token)
@@ -0,0 +1,96 @@
+import asyncio
+import gc
+import logging
+import time
+from starlette.concurrency import run_in_threadpool
+from app.core.config import DEFAULT_LOCATION_ID
+from app.core.database import close_pools, open_pools
+from app.utils.reference_data import reference_data
+
+logger = logging.getLogger(__name__)
+
+# Requests issued in-process before taking traffic. They fill the menu and
+# tables caches, run the first queries on fresh connections, spin up the
+# threadpool, and exercise response validation/encoding. /openapi.json builds
+# the JSON schema of every request and response model.
+WARMUP_PATHS = ("/api/menu/categories", "/api/menu/items", "/api/tables/", "/openapi.json")
+
+state = {"ready": False, "preloaded": False, "duration_ms": None, "errors": []}
+
+
+async def _get(app, path):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [(b"host", b"warmup")], "client": ("127.0.0.1", 0),
+        "server": ("warmup", 80),
+    }
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0] if status else None
+
+
+async def _warm_requests(app):
+    errors = []
+    for path in WARMUP_PATHS:
+        try:
+            status = await _get(app, path)
+            if status != 200:
+                errors.append(f"{path}: HTTP {status}")
+        except Exception as e:
+            errors.append(f"{path}: {e}")
+    return errors
+
+
+async def warm_up(app):
+    """
+    Per-worker startup, run from the lifespan handler. The server does not
+    accept connections until it returns, and /api/health/ready reports 503
+    until then.
+    """
+    start = time.perf_counter()
+    errors = []
+    try:
+        await run_in_threadpool(open_pools)
+    except Exception as e:
+        errors.append(f"database: {e}")
+    try:
+        # The order and reservation write paths validate against this copy
+        await run_in_threadpool(reference_data.get, DEFAULT_LOCATION_ID)
+    except Exception as e:
+        errors.append(f"reference data: {e}")
+    errors += await _warm_requests(app)
+
+    state.update(ready=True, duration_ms=round((time.perf_counter() - start) * 1000, 1), errors=errors)
+    if errors:
+        logger.warning("warm-up finished with errors in %.0f ms: %s", state["duration_ms"], "; ".join(errors))
+    else:
+        logger.info("warm-up finished in %.0f ms", state["duration_ms"])
+
+
+def preload(app):
+    """
+    Shared work for pre-fork servers, run once in the master process before
+    workers are forked (see gunicorn.conf.py). Imports, caches and schemas
+    built here are shared copy-on-write by every worker; each worker then
+    opens its own connections in warm_up().
+    """
+    errors = asyncio.run(_warm_requests(app))
+    # Sockets must never be shared across fork()
+    close_pools()
+    state["preloaded"] = True
+    if errors:
+        logger.warning("preload finished with errors: %s", "; ".join(errors))
+
+    # Move everything allocated so far out of the garbage collector's reach,
+    # so collections in the workers don't write to (and un-share) those pages.
+    gc.collect()
+    gc.freeze()
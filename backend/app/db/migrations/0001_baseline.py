@@ -0,0 +1,17 @@
+"""
+The schema in app/db/schema.sql, as it stood when versioned migrations were
+introduced. It is idempotent, so databases set up with the old scripts are
+brought up to date and then recorded as migrated. Later changes go in new
+migration files, never in schema.sql.
+"""
+from app.utils.partitions import PARTITIONED_TABLES, SCHEMA_PATH, _relkind
+
+
+def up(cur):
+    legacy = [table for table in PARTITIONED_TABLES if _relkind(cur, table) == "r"]
+    if legacy:
+        raise RuntimeError(
+            f"{', '.join(legacy)} predate partitioning; run `python partitions.py migrate` first"
+        )
+    with open(SCHEMA_PATH, "r") as f:
+        cur.execute(f.read())
@@ -0,0 +1,23 @@
+"""
+Indexes for the lookups on the request path that had none:
+
+    order_items (order_id)               items of an order (get_order, get_orders)
+    order_logs (order_id)                status history of an order
+    reservations (table_id, reservation_time)
+                                         reservation conflict check
+
+orders (status, created_at) and payments (payment_time) are already covered
+by the location-leading indexes from schema.sql (orders_location_status_idx,
+payments_location_time_idx), since every query filters on location_id.
+
+Built CONCURRENTLY, so this can run against a live database.
+"""
+from app.utils.migrations import create_index_concurrently
+
+TRANSACTIONAL = False
+
+
+def up(cur):
+    create_index_concurrently(cur, "order_items", ["order_id"])
+    create_index_concurrently(cur, "order_logs", ["order_id"])
+    create_index_concurrently(cur, "reservations", ["table_id", "reservation_time"])
@@ -0,0 +1,14 @@
+-- Responses to POST /api/orders/ and POST /api/orders/{id}/pay requests sent
+-- with an Idempotency-Key header (see app/utils/idempotency.py). A row is
+-- inserted and completed in the same transaction as the order or payment.
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    location_id INT NOT NULL,
+    idempotency_key VARCHAR(255) NOT NULL,
+    request_hash CHAR(40) NOT NULL,
+    status_code SMALLINT,
+    response JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (location_id, idempotency_key)
+);
+
+CREATE INDEX IF NOT EXISTS idempotency_keys_created_at_idx ON idempotency_keys (created_at);
@@ -0,0 +1,28 @@
+-- Daily par levels for menu items whose stock is counted (see
+-- app/utils/stock.py). Items without a row here are never counted.
+-- business_date is the business day the counters were last refilled for;
+-- sold_out marks items the counters deactivated, which a refill reactivates.
+CREATE TABLE IF NOT EXISTS item_stock (
+    menu_item_id INT PRIMARY KEY REFERENCES menu_items(id) ON DELETE CASCADE,
+    location_id INT NOT NULL REFERENCES locations(id),
+    par_level INT NOT NULL CHECK (par_level >= 0),
+    business_date DATE NOT NULL,
+    sold_out BOOLEAN NOT NULL DEFAULT false
+);
+
+CREATE INDEX IF NOT EXISTS item_stock_location_idx ON item_stock (location_id);
+
+-- An item's remaining stock, split over several rows so concurrent orders
+-- decrement different rows instead of queueing on one
+CREATE TABLE IF NOT EXISTS item_stock_shards (
+    menu_item_id INT NOT NULL REFERENCES item_stock(menu_item_id) ON DELETE CASCADE,
+    shard SMALLINT NOT NULL,
+    remaining INT NOT NULL CHECK (remaining >= 0),
+    PRIMARY KEY (menu_item_id, shard)
+);
+
+-- The reference data snapshot records which items are counted
+DROP TRIGGER IF EXISTS item_stock_reference_version ON item_stock;
+CREATE TRIGGER item_stock_reference_version
+    AFTER INSERT OR DELETE ON item_stock
+    FOR EACH ROW EXECUTE FUNCTION bump_reference_version();
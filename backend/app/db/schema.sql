@@ -1,3 +1,13 @@
+-- Restaurants sharing this database. Location-scoped tables carry a
+-- location_id (added at the end of this file) and their indexes lead with it.
+CREATE TABLE IF NOT EXISTS locations (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) UNIQUE NOT NULL,
+    is_active BOOLEAN DEFAULT TRUE
+);
+
+INSERT INTO locations (name) SELECT 'Main' WHERE NOT EXISTS (SELECT 1 FROM locations);
+
 CREATE TABLE IF NOT EXISTS categories (
     id SERIAL PRIMARY KEY,
     name VARCHAR(100) UNIQUE NOT NULL,
@@ -16,7 +26,7 @@ CREATE TABLE IF NOT EXISTS menu_items (
 
 CREATE TABLE IF NOT EXISTS tables (
     id SERIAL PRIMARY KEY,
-    table_number INT UNIQUE NOT NULL,
+    table_number INT NOT NULL, -- unique per location
     capacity INT NOT NULL,
     location VARCHAR(50) DEFAULT 'main_hall',
     is_active BOOLEAN DEFAULT TRUE
@@ -34,40 +44,156 @@ CREATE TABLE IF NOT EXISTS reservations (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- orders, order_items, order_logs and payments are partitioned by month on
+-- their timestamp column. Monthly partitions are created ahead of time and
+-- old ones archived by `python partitions.py maintain`; rows that arrive
+-- before their month's partition exists land in the *_default partition and
+-- are moved out by the next run. Partitioned tables can't be the target of a
+-- foreign key on id alone, so order_id columns are not declared as FKs.
 CREATE TABLE IF NOT EXISTS orders (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     table_id INT REFERENCES tables(id),
     reservation_id INT REFERENCES reservations(id),
     status VARCHAR(20) DEFAULT 'pending', -- pending, preparing, ready, served, paid, cancelled
     total_amount NUMERIC(10,2) DEFAULT 0.00,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS orders_default PARTITION OF orders DEFAULT;
 
 CREATE TABLE IF NOT EXISTS order_items (
-    id SERIAL PRIMARY KEY,
-    order_id INT REFERENCES orders(id) ON DELETE CASCADE,
+    id SERIAL,
+    order_id INT, -- orders(id)
     menu_item_id INT REFERENCES menu_items(id),
     quantity INT NOT NULL DEFAULT 1,
     unit_price NUMERIC(10,2) NOT NULL,
     notes TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    -- Inserted in the same transaction as the order, so equal to its created_at
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS order_items_default PARTITION OF order_items DEFAULT;
 
 CREATE TABLE IF NOT EXISTS order_logs (
-    id SERIAL PRIMARY KEY,
-    order_id INT REFERENCES orders(id) ON DELETE CASCADE,
+    id SERIAL,
+    order_id INT, -- orders(id)
     old_status VARCHAR(20),
     new_status VARCHAR(20) NOT NULL,
-    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, changed_at)
+) PARTITION BY RANGE (changed_at);
+
+CREATE TABLE IF NOT EXISTS order_logs_default PARTITION OF order_logs DEFAULT;
 
 CREATE TABLE IF NOT EXISTS payments (
-    id SERIAL PRIMARY KEY,
-    order_id INT REFERENCES orders(id),
+    id SERIAL,
+    order_id INT, -- orders(id)
     amount NUMERIC(10,2) NOT NULL,
     payment_method VARCHAR(50) NOT NULL, -- cash, card, online
     transaction_id VARCHAR(100),
-    payment_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    payment_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, payment_time)
+) PARTITION BY RANGE (payment_time);
+
+CREATE TABLE IF NOT EXISTS payments_default PARTITION OF payments DEFAULT;
+
+-- End-of-day settlements written by the closeout (app/utils/closeout.py).
+-- A settled day is never rewritten; corrections belong in the next day's books.
+CREATE TABLE IF NOT EXISTS daily_settlements (
+    business_date DATE NOT NULL, -- unique per location
+    period_start TIMESTAMP NOT NULL,
+    period_end TIMESTAMP NOT NULL,
+    order_count INT NOT NULL,
+    gross_sales NUMERIC(12,2) NOT NULL,
+    payments_total NUMERIC(12,2) NOT NULL,
+    report JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE OR REPLACE FUNCTION reject_settlement_change() RETURNS trigger AS $$
+BEGIN
+    RAISE EXCEPTION 'daily_settlements rows are immutable';
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS daily_settlements_immutable ON daily_settlements;
+CREATE TRIGGER daily_settlements_immutable
+    BEFORE UPDATE OR DELETE ON daily_settlements
+    FOR EACH ROW EXECUTE FUNCTION reject_settlement_change();
+
+-- Location scoping. Rows from before multi-location support belong to the
+-- first location.
+ALTER TABLE menu_items ADD COLUMN IF NOT EXISTS location_id INT NOT NULL DEFAULT 1 REFERENCES locations(id);
+ALTER TABLE tables ADD COLUMN IF NOT EXISTS location_id INT NOT NULL DEFAULT 1 REFERENCES locations(id);
+ALTER TABLE reservations ADD COLUMN IF NOT EXISTS location_id INT NOT NULL DEFAULT 1 REFERENCES locations(id);
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS location_id INT NOT NULL DEFAULT 1 REFERENCES locations(id);
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS location_id INT NOT NULL DEFAULT 1 REFERENCES locations(id);
+ALTER TABLE daily_settlements ADD COLUMN IF NOT EXISTS location_id INT NOT NULL DEFAULT 1 REFERENCES locations(id);
+
+-- Table numbers and settlements used to be unique across the whole database
+ALTER TABLE tables DROP CONSTRAINT IF EXISTS tables_table_number_key;
+ALTER TABLE daily_settlements DROP CONSTRAINT IF EXISTS daily_settlements_pkey;
+
+CREATE UNIQUE INDEX IF NOT EXISTS tables_location_number_key ON tables (location_id, table_number);
+CREATE UNIQUE INDEX IF NOT EXISTS daily_settlements_location_date_key ON daily_settlements (location_id, business_date);
+CREATE INDEX IF NOT EXISTS menu_items_location_idx ON menu_items (location_id, category_id);
+CREATE INDEX IF NOT EXISTS reservations_location_time_idx ON reservations (location_id, reservation_time);
+CREATE INDEX IF NOT EXISTS orders_location_created_idx ON orders (location_id, created_at);
+CREATE INDEX IF NOT EXISTS orders_location_status_idx ON orders (location_id, status, created_at);
+CREATE INDEX IF NOT EXISTS payments_location_time_idx ON payments (location_id, payment_time);
+
+-- Reference data versions. Every change to a location's tables or menu items
+-- bumps its version and sends a `reference_data` notification carrying the
+-- location id ('*' for all), so workers refresh their cached copy
+-- (app/utils/reference_data.py).
+CREATE TABLE IF NOT EXISTS reference_versions (
+    location_id INT PRIMARY KEY REFERENCES locations(id),
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION bump_location_reference_version(location INT) RETURNS void AS $$
+    INSERT INTO reference_versions (location_id, version) VALUES (location, 1)
+    ON CONFLICT (location_id) DO UPDATE SET version = reference_versions.version + 1;
+    SELECT pg_notify('reference_data', location::text);
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION bump_reference_version() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM bump_location_reference_version(OLD.location_id);
+    END IF;
+    IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.location_id <> OLD.location_id) THEN
+        PERFORM bump_location_reference_version(NEW.location_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION bump_all_reference_versions() RETURNS trigger AS $$
+BEGIN
+    UPDATE reference_versions SET version = version + 1;
+    PERFORM pg_notify('reference_data', '*');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tables_reference_version ON tables;
+CREATE TRIGGER tables_reference_version
+    AFTER INSERT OR UPDATE OR DELETE ON tables
+    FOR EACH ROW EXECUTE FUNCTION bump_reference_version();
+DROP TRIGGER IF EXISTS tables_reference_truncate ON tables;
+CREATE TRIGGER tables_reference_truncate
+    AFTER TRUNCATE ON tables
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_all_reference_versions();
+
+DROP TRIGGER IF EXISTS menu_items_reference_version ON menu_items;
+CREATE TRIGGER menu_items_reference_version
+    AFTER INSERT OR UPDATE OR DELETE ON menu_items
+    FOR EACH ROW EXECUTE FUNCTION bump_reference_version();
+DROP TRIGGER IF EXISTS menu_items_reference_truncate ON menu_items;
+CREATE TRIGGER menu_items_reference_truncate
+    AFTER TRUNCATE ON menu_items
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_all_reference_versions();
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.health import router as health_router
@@ -5,13 +6,48 @@ from app.api.menu import router as menu_router
 from app.api.tables import router as tables_router
 from app.api.reservations import router as reservations_router
 from app.api.orders import router as orders_router
+from app.api.kitchen import router as kitchen_router
 from app.api.analytics import router as analytics_router
+from app.api.closeout import router as closeout_router
+from app.api.locations import router as locations_router
+from app.api.metrics import router as metrics_router
+from app.core.config import ADMISSION_ENABLED, METRICS_ENABLED, LOOP_MONITOR_ENABLED, WARMUP_ENABLED
+from app.core.database import close_pools
+from app.core.locations import LocationMiddleware
+from app.core.warmup import warm_up
+from app.utils.admission import AdmissionMiddleware
+from app.utils.audit_log import audit_log
+from app.utils.reference_data import reference_data
+from app.utils.loop_monitor import LoopMonitorMiddleware, monitor
+from app.utils.metrics import MetricsMiddleware
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if LOOP_MONITOR_ENABLED:
+        monitor.start()
+    audit_log.start()
+    reference_data.start()
+    if WARMUP_ENABLED:
+        await warm_up(app)
+    yield
+    reference_data.stop()
+    audit_log.stop()
+    if LOOP_MONITOR_ENABLED:
+        monitor.stop()
+    close_pools()
 
 app = FastAPI(
     title="Restaurant Management System",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
+# Added first so they sit inside CORS and their error responses still carry
+# CORS headers. LocationMiddleware is innermost, right in front of the routes.
+app.add_middleware(LocationMiddleware)
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],
@@ -20,12 +56,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+if LOOP_MONITOR_ENABLED:
+    app.add_middleware(LoopMonitorMiddleware)
+
 app.include_router(health_router)
 app.include_router(menu_router)
 app.include_router(tables_router)
 app.include_router(reservations_router)
 app.include_router(orders_router)
+app.include_router(kitchen_router)
 app.include_router(analytics_router)
+app.include_router(closeout_router)
+app.include_router(locations_router)
+app.include_router(metrics_router)
 
 @app.get("/")
 def root():
@@ -0,0 +1,39 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from datetime import datetime
+
+class KitchenLine(BaseModel):
+    menu_item_id: int
+    name: str
+    quantity: int
+    notes: Optional[str] = None
+    station: str
+    course: int
+    prep_seconds: float
+    # When the line should go on
+    fire_at: datetime
+
+class KitchenTicket(BaseModel):
+    order_id: int
+    table_id: int
+    status: str
+    guests: int
+    created_at: datetime
+    fire_at: datetime
+    items: List[KitchenLine]
+
+class KitchenQueueResponse(BaseModel):
+    policy: str
+    tickets: List[KitchenTicket]
+
+class StationLine(BaseModel):
+    order_id: int
+    table_id: int
+    menu_item_id: int
+    name: str
+    quantity: int
+    notes: Optional[str] = None
+    fire_at: datetime
+
+class KitchenStationsResponse(BaseModel):
+    stations: Dict[str, List[StationLine]]
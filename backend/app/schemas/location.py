@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from typing import Optional
+
+class LocationBase(BaseModel):
+    name: str
+    is_active: Optional[bool] = True
+
+class LocationCreate(LocationBase):
+    pass
+
+class Location(LocationBase):
+    id: int
+
+    class Config:
+        from_attributes = True
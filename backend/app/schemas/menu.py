@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 
 class CategoryBase(BaseModel):
@@ -34,3 +34,15 @@ class MenuItem(MenuItemBase):
 class MenuResponse(BaseModel):
     categories: List[Category]
     items: List[MenuItem]
+
+class StockLevel(BaseModel):
+    menu_item_id: int
+    name: str
+    par_level: int
+    remaining: int
+    is_active: bool
+    sold_out: bool
+
+class StockUpdate(BaseModel):
+    # None stops counting the item's stock
+    par_level: Optional[int] = Field(None, ge=0)
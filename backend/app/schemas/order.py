@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
+from app.core.config import ORDER_BATCH_MAX_ORDERS
 
 class OrderItemBase(BaseModel):
     menu_item_id: int
@@ -26,6 +27,27 @@ class OrderBase(BaseModel):
 class OrderCreate(OrderBase):
     items: List[OrderItemCreate]
 
+class OfflineOrderCreate(OrderCreate):
+    # Generated by the POS; also the order's Idempotency-Key
+    client_order_id: str = Field(min_length=1, max_length=255)
+    # When the order was taken on the device
+    created_at: datetime
+
+class OrderBatch(BaseModel):
+    orders: List[OfflineOrderCreate] = Field(min_length=1, max_length=ORDER_BATCH_MAX_ORDERS)
+
+class OrderBatchResult(BaseModel):
+    client_order_id: str
+    status: str # created, duplicate, rejected
+    order_id: Optional[int] = None
+    error: Optional[str] = None
+
+class OrderBatchResponse(BaseModel):
+    created: int
+    duplicates: int
+    rejected: int
+    results: List[OrderBatchResult]
+
 class OrderUpdateStatus(BaseModel):
     status: str
 
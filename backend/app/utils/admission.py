@@ -0,0 +1,224 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Dict, Tuple
+
+from app.core.config import (
+    ADMISSION_ANALYTICS_CONCURRENCY, ADMISSION_BURST, ADMISSION_PUBLIC_CONCURRENCY, ADMISSION_PUBLIC_QUEUE_MS,
+    ADMISSION_RATE_PER_SECOND, ADMISSION_RETRY_AFTER_SECONDS, ADMISSION_STAFF_CONCURRENCY, ADMISSION_STAFF_QUEUE_MS,
+    ADMISSION_TRUST_FORWARDED,
+)
+
+# First match wins: (route class, path prefix, methods or None for any).
+# Anything not listed (docs, "/") is not subject to admission control.
+ROUTE_CLASSES = [
+    (None, "/api/health", None),
+    (None, "/api/metrics", None),
+    ("analytics", "/api/analytics", None),
+    ("analytics", "/api/closeout", None),
+    ("public", "/api/menu", {"GET", "HEAD"}),
+    ("public", "/api/tables", {"GET", "HEAD"}),
+    ("public", "/api/reservations", None),
+    ("staff", "/api/", None),
+]
+
+# Classes whose clients get a per-client token bucket. Staff terminals often
+# share one address, so they are only bounded by concurrency.
+RATE_LIMITED_CLASSES = {"public", "analytics"}
+
+# Buckets idle for this long have refilled completely and can be dropped
+BUCKET_IDLE_SECONDS = ADMISSION_BURST / ADMISSION_RATE_PER_SECOND if ADMISSION_RATE_PER_SECOND > 0 else 60
+MAX_BUCKETS = 10000
+
+
+def classify(method, path):
+    for route_class, prefix, methods in ROUTE_CLASSES:
+        if path.startswith(prefix) and (methods is None or method in methods):
+            return route_class
+    return None
+
+
+class ConcurrencyLimit:
+    """
+    Caps the requests of one route class in flight at once. Requests that
+    find it full may wait up to their queue timeout for a slot, which is
+    handed over directly on release. Only used from the event loop thread.
+    """
+
+    def __init__(self, limit: int, queue_timeout: float):
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiters = deque()
+
+    async def acquire(self) -> bool:
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return True
+        if self.queue_timeout <= 0:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            # The slot may have been handed over just as the wait timed out
+            return waiter.done() and not waiter.cancelled()
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+            try:
+                self.waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def release(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class TokenBuckets:
+    """Per-client token buckets refilled at `rate` tokens/s up to `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.buckets: Dict[Tuple[str, str], list] = {}
+
+    def take(self, key) -> float:
+        """Takes a token; returns 0 if admitted, else seconds until one is available."""
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= MAX_BUCKETS:
+                self._prune(now)
+            bucket = self.buckets[key] = [self.burst, now]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0.0
+        bucket[0] = tokens
+        return (1 - tokens) / self.rate
+
+    def _prune(self, now):
+        idle = [k for k, (_, seen) in self.buckets.items() if now - seen >= BUCKET_IDLE_SECONDS]
+        for key in idle:
+            del self.buckets[key]
+
+
+class Admission:
+    def __init__(self):
+        self.limits = {
+            "staff": ConcurrencyLimit(ADMISSION_STAFF_CONCURRENCY, ADMISSION_STAFF_QUEUE_MS / 1000),
+            "public": ConcurrencyLimit(ADMISSION_PUBLIC_CONCURRENCY, ADMISSION_PUBLIC_QUEUE_MS / 1000),
+            "analytics": ConcurrencyLimit(ADMISSION_ANALYTICS_CONCURRENCY, 0),
+        }
+        self.buckets = TokenBuckets(ADMISSION_RATE_PER_SECOND, ADMISSION_BURST)
+        self.admitted: Dict[str, int] = {name: 0 for name in self.limits}
+        # (route class, reason) -> count
+        self.shed: Dict[Tuple[str, str], int] = {}
+
+    def record_shed(self, route_class, reason):
+        key = (route_class, reason)
+        self.shed[key] = self.shed.get(key, 0) + 1
+
+    def snapshot(self):
+        return {
+            name: {
+                "in_flight": limit.active,
+                "queued": len(limit.waiters),
+                "limit": limit.limit,
+                "admitted": self.admitted[name],
+                "shed": {reason: n for (c, reason), n in sorted(self.shed.items()) if c == name},
+            }
+            for name, limit in self.limits.items()
+        }
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP http_requests_in_flight Requests being handled, by admission class.",
+            "# TYPE http_requests_in_flight gauge",
+        ]
+        for name, limit in self.limits.items():
+            lines.append(f'http_requests_in_flight{{class="{name}"}} {limit.active}')
+        lines.append("# HELP http_requests_shed_total Requests rejected by admission control.")
+        lines.append("# TYPE http_requests_shed_total counter")
+        for (name, reason), count in sorted(self.shed.items()):
+            lines.append(f'http_requests_shed_total{{class="{name}",reason="{reason}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+admission = Admission()
+
+
+def _client_address(scope):
+    if ADMISSION_TRUST_FORWARDED:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+async def _reject(send, status, retry_after, detail):
+    body = ('{"detail":"%s"}' % detail).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """
+    Admission control in front of the routers. Public and analytics clients
+    are rate limited per address (429), and each route class has its own
+    concurrency limit (503 when full), so a flood of public traffic can't
+    take the worker threads and DB connections staff order paths need.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route_class = classify(scope["method"], scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        if route_class in RATE_LIMITED_CLASSES and ADMISSION_RATE_PER_SECOND > 0:
+            wait = admission.buckets.take((route_class, _client_address(scope)))
+            if wait:
+                admission.record_shed(route_class, "rate_limited")
+                await _reject(send, 429, wait, "Too many requests")
+                return
+
+        limit = admission.limits[route_class]
+        if not await limit.acquire():
+            admission.record_shed(route_class, "overloaded")
+            await _reject(send, 503, ADMISSION_RETRY_AFTER_SECONDS, "Server busy, please retry")
+            return
+        admission.admitted[route_class] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.release()
@@ -0,0 +1,155 @@
+import io
+import logging
+import threading
+from itertools import groupby
+
+from app.core.config import AUDIT_LOG_BATCH_SIZE, AUDIT_LOG_FLUSH_MS, AUDIT_LOG_MAX_BUFFERED, AUDIT_LOG_MODE
+from app.core.database import get_db_connection
+from app.core.locations import get_location_id, use_location
+
+logger = logging.getLogger(__name__)
+
+INSERT_LOG_QUERY = """
+    INSERT INTO order_logs (order_id, old_status, new_status)
+    VALUES (%s, %s, %s)
+"""
+
+LOG_COLUMNS = ("order_id", "old_status", "new_status", "changed_at")
+
+# Transitions that move money or void an order: always logged in their own
+# transaction, never buffered where a crash or the buffer cap could drop them
+SYNC_STATUSES = ("paid", "cancelled")
+
+
+def _copy_field(value):
+    return "\\N" if value is None else str(value)
+
+
+class AuditLogWriter:
+    """
+    Writes order_logs rows. write() inserts inside the caller's transaction,
+    so the log row commits or rolls back with the status change (used for
+    SYNC_STATUSES, and for every change in "sync" mode). enqueue() buffers a committed transition, and a background
+    thread COPYs the buffer into order_logs once it holds `batch_size` rows
+    or every `interval` seconds, keeping that insert off the request path.
+    Rows that fail to flush are kept for the next attempt, up to
+    `max_buffered`; beyond that the oldest are dropped and counted. stop()
+    flushes whatever is still buffered.
+    """
+
+    def __init__(self, mode: str, batch_size: int, interval: float, max_buffered: int):
+        self.batched = mode == "batched"
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_buffered = max_buffered
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.flushed = 0
+        self.flush_errors = 0
+        self.dropped = 0
+        self._dropped_logged = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def deferred(self, new_status):
+        """Whether a change to `new_status` is logged with enqueue() after it commits, rather than write()."""
+        return self.batched and new_status not in SYNC_STATUSES
+
+    def write(self, cur, order_id, old_status, new_status):
+        cur.execute(INSERT_LOG_QUERY, (order_id, old_status, new_status))
+
+    def enqueue(self, order_id, old_status, new_status, changed_at):
+        """Buffers a transition that has already been committed."""
+        location_id = get_location_id()
+        with self.lock:
+            self.buffer.append((location_id, (order_id, old_status, new_status, changed_at)))
+            self._trim()
+            full = len(self.buffer) >= self.batch_size
+        if self._thread is None:
+            # Not started (scripts, benchmarks): nothing would flush later
+            self.flush()
+        elif full:
+            self._wake.set()
+
+    def start(self):
+        if not self.batched or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-log", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def _trim(self):
+        # Called with the lock held
+        excess = len(self.buffer) - self.max_buffered
+        if excess > 0:
+            del self.buffer[:excess]
+            self.dropped += excess
+
+    def flush(self):
+        with self.lock:
+            entries, self.buffer = self.buffer, []
+            dropped, self._dropped_logged = self.dropped - self._dropped_logged, self.dropped
+        if dropped:
+            logger.error("dropped %d order_logs rows: more than %d waiting to be written", dropped, self.max_buffered)
+        flushed = 0
+        # Each location's rows go to the database that location lives on
+        for location_id, group in groupby(sorted(entries, key=lambda e: e[0]), key=lambda e: e[0]):
+            rows = [row for _, row in group]
+            with use_location(location_id):
+                flushed += self._copy(location_id, rows)
+        return flushed
+
+    def _copy(self, location_id, rows):
+        data = io.StringIO()
+        for row in rows:
+            data.write("\t".join(_copy_field(v) for v in row) + "\n")
+        data.seek(0)
+
+        conn = None
+        try:
+            # Inside the try: during an outage connecting is what fails
+            conn = get_db_connection()
+            with conn.cursor() as cur:
+                cur.copy_from(data, "order_logs", columns=LOG_COLUMNS)
+            conn.commit()
+        except Exception as e:
+            # Keep the rows, in order, for the next attempt. Closing the
+            # connection hands it back to the pool, which rolls it back.
+            with self.lock:
+                self.buffer[:0] = [(location_id, row) for row in rows]
+                self._trim()
+            self.flush_errors += 1
+            logger.error("failed to flush %d order_logs rows: %s", len(rows), e)
+            return 0
+        finally:
+            if conn is not None:
+                conn.close()
+        self.flushed += len(rows)
+        return len(rows)
+
+    def status(self):
+        return {
+            "mode": "batched" if self.batched else "sync",
+            "buffered": len(self.buffer),
+            "flushed": self.flushed,
+            "flush_errors": self.flush_errors,
+            "dropped": self.dropped,
+        }
+
+
+audit_log = AuditLogWriter(AUDIT_LOG_MODE, AUDIT_LOG_BATCH_SIZE, AUDIT_LOG_FLUSH_MS / 1000, AUDIT_LOG_MAX_BUFFERED)
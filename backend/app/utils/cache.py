@@ -0,0 +1,57 @@
+import time
+from app.core.config import CACHE_TTL_SECONDS, REPLICA_MAX_LAG_SECONDS
+
+
+class TTLCache:
+    """
+    Small per-process cache for read-mostly listings. Values are shared between
+    requests, so callers must treat them as read-only.
+
+    Loaders take a `replica` flag and read from a replica when it is true.
+    For `primary_seconds` after a key is invalidated (by a write) it is false,
+    so a lagging replica can't put the rows from before the write back in
+    the cache for another `ttl`.
+    """
+
+    def __init__(self, ttl, primary_seconds):
+        self.ttl = ttl
+        self.primary_seconds = primary_seconds
+        self.entries = {}
+        # key -> until when its reloads read from the primary
+        self.invalidated = {}
+
+    def get_or_load(self, key, loader):
+        now = time.monotonic()
+        if self.ttl <= 0:
+            return loader(self._replica(key, now))
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        value = loader(self._replica(key, now))
+        self.entries[key] = (now + self.ttl, value)
+        return value
+
+    def _replica(self, key, now):
+        until = self.invalidated.get(key)
+        if until is None:
+            return True
+        if until <= now:
+            del self.invalidated[key]
+            return True
+        return False
+
+    def invalidate(self, *keys):
+        until = time.monotonic() + self.primary_seconds
+        for key in keys:
+            self.entries.pop(key, None)
+            self.invalidated[key] = until
+
+    def clear(self):
+        self.entries.clear()
+
+    def keys(self):
+        return list(self.entries)
+
+
+# A replica lagging more than REPLICA_MAX_LAG_SECONDS is no longer read from
+cache = TTLCache(CACHE_TTL_SECONDS, REPLICA_MAX_LAG_SECONDS)
@@ -0,0 +1,267 @@
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from app.core.config import BUSINESS_DAY_START_HOUR
+from app.core.database import get_db_connection
+from app.core.locations import get_location_id
+from app.utils.db_helper import fetch_one
+
+# How many order rows the server-side cursor hands over per round trip
+CLOSEOUT_FETCH_SIZE = 2000
+
+# One row per order the location opened during the business day, with the
+# payments received for it during the day summed per method and its
+# cancellation/serve times taken from its order_logs. Payments and logs can't
+# predate their order, so both are bounded by period_start; the logs are looked
+# up per order, through order_logs (order_id), as order_logs has no location.
+CLOSEOUT_QUERY = """
+    SELECT o.id, o.table_id, o.status, o.total_amount, o.created_at,
+           p.methods, p.amounts, p.counts, l.cancelled_at, l.served_at
+    FROM orders o
+    LEFT JOIN (
+        SELECT order_id, array_agg(payment_method) AS methods,
+               array_agg(amount) AS amounts, array_agg(payments) AS counts
+        FROM (
+            SELECT order_id, payment_method, SUM(amount) AS amount, COUNT(*) AS payments
+            FROM payments
+            WHERE location_id = %(location)s AND payment_time >= %(start)s AND payment_time < %(end)s
+            GROUP BY order_id, payment_method
+        ) per_method
+        GROUP BY order_id
+    ) p ON p.order_id = o.id
+    LEFT JOIN LATERAL (
+        SELECT MAX(changed_at) FILTER (WHERE new_status = 'cancelled') AS cancelled_at,
+               MAX(changed_at) FILTER (WHERE new_status = 'served') AS served_at
+        FROM order_logs
+        WHERE order_id = o.id AND changed_at >= %(start)s
+    ) l ON true
+    WHERE o.location_id = %(location)s AND o.created_at >= %(start)s AND o.created_at < %(end)s
+    ORDER BY o.id
+"""
+
+# Payments received during the business day for orders of earlier days, e.g.
+# a tab settled after closing time. They belong to the day the money came in,
+# as the order's own day may already be settled.
+LATE_PAYMENTS_QUERY = """
+    SELECT p.order_id, o.created_at, o.status, p.payment_method, p.amount, p.payment_time
+    FROM payments p
+    JOIN orders o ON o.id = p.order_id AND o.created_at < %(start)s
+    WHERE p.location_id = %(location)s AND p.payment_time >= %(start)s AND p.payment_time < %(end)s
+    ORDER BY p.payment_time, p.id
+"""
+
+INSERT_SETTLEMENT_QUERY = """
+    INSERT INTO daily_settlements
+        (location_id, business_date, period_start, period_end, order_count, gross_sales, payments_total, report)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (location_id, business_date) DO NOTHING
+    RETURNING created_at
+"""
+
+SETTLEMENT_QUERY = "SELECT report, created_at FROM daily_settlements WHERE location_id = %s AND business_date = %s"
+
+
+def business_period(business_date: date):
+    start = datetime.combine(business_date, time(hour=BUSINESS_DAY_START_HOUR))
+    return start, start + timedelta(days=1)
+
+
+def business_date_of(moment: datetime) -> date:
+    """The business day a point in time counts towards."""
+    return (moment - timedelta(hours=BUSINESS_DAY_START_HOUR)).date()
+
+
+def last_closed_business_date(now: datetime = None) -> date:
+    """The most recent business day that has fully ended."""
+    return business_date_of(now or datetime.now()) - timedelta(days=1)
+
+
+class _Bucket:
+    """Count and amount of a group of orders, plus the orders themselves."""
+
+    def __init__(self, keep_orders=True):
+        self.count = 0
+        self.amount = Decimal("0")
+        self.orders = [] if keep_orders else None
+
+    def add(self, amount, order=None):
+        self.count += 1
+        self.amount += amount
+        if self.orders is not None and order is not None:
+            self.orders.append(order)
+
+    def as_dict(self):
+        result = {"count": self.count, "amount": float(self.amount)}
+        if self.orders is not None:
+            result["orders"] = self.orders
+        return result
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+class Closeout:
+    """Accumulates the end-of-day report one order row at a time."""
+
+    def __init__(self, location_id: int, business_date: date):
+        self.location_id = location_id
+        self.business_date = business_date
+        self.period_start, self.period_end = business_period(business_date)
+        self.order_count = 0
+        self.by_status = {}
+        self.gross_sales = Decimal("0")
+        self.payments_total = Decimal("0")
+        self.by_method = {}
+        self.unpaid = _Bucket()
+        self.served_unpaid = _Bucket()
+        self.cancellations = _Bucket()
+        self.refunds_due = Decimal("0")
+        self.overpayments = _Bucket()
+        self.underpayments = _Bucket()
+        self.late_payments = _Bucket()
+
+    def add(self, row):
+        order_id, table_id, status, total, created_at, methods, amounts, counts, cancelled_at, served_at = row
+        total = total or Decimal("0")
+        self.order_count += 1
+        self.by_status[status] = self.by_status.get(status, 0) + 1
+
+        paid = Decimal("0")
+        for method, amount, count in zip(methods or (), amounts or (), counts or ()):
+            bucket = self.by_method.setdefault(method, _Bucket(keep_orders=False))
+            bucket.count += count
+            bucket.amount += amount
+            paid += amount
+        self.payments_total += paid
+
+        if status == "cancelled":
+            self.cancellations.add(total, {
+                "id": order_id, "table_id": table_id, "total_amount": float(total),
+                "paid": float(paid), "cancelled_at": _iso(cancelled_at),
+            })
+            # Money taken for an order that was then cancelled has to go back
+            self.refunds_due += paid
+            return
+
+        self.gross_sales += total
+        order = {"id": order_id, "table_id": table_id, "status": status, "total_amount": float(total)}
+        if paid == 0 and status != "paid":
+            order["created_at"] = _iso(created_at)
+            self.unpaid.add(total, order)
+            if status == "served" or served_at is not None:
+                self.served_unpaid.add(total, dict(order, served_at=_iso(served_at)))
+        elif paid != total:
+            difference = paid - total
+            order.update(paid=float(paid), difference=float(difference))
+            if difference > 0:
+                self.overpayments.add(difference, order)
+            else:
+                self.underpayments.add(-difference, order)
+
+    def add_late_payment(self, row):
+        order_id, created_at, status, method, amount, paid_at = row
+        bucket = self.by_method.setdefault(method, _Bucket(keep_orders=False))
+        bucket.count += 1
+        bucket.amount += amount
+        self.payments_total += amount
+        self.late_payments.add(amount, {
+            "id": order_id, "status": status, "business_date": business_date_of(created_at).isoformat(),
+            "payment_method": method, "amount": float(amount), "paid_at": _iso(paid_at),
+        })
+
+    def report(self):
+        cancellations = self.cancellations.as_dict()
+        cancellations["refunds_due"] = float(self.refunds_due)
+        return {
+            "location_id": self.location_id,
+            "business_date": self.business_date.isoformat(),
+            "period_start": self.period_start.isoformat(),
+            "period_end": self.period_end.isoformat(),
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "order_count": self.order_count,
+            "orders_by_status": dict(sorted(self.by_status.items())),
+            "gross_sales": float(self.gross_sales),
+            "payments_total": float(self.payments_total),
+            "payments_by_method": {m: b.as_dict() for m, b in sorted(self.by_method.items())},
+            "unpaid": self.unpaid.as_dict(),
+            "served_unpaid": self.served_unpaid.as_dict(),
+            "cancellations": cancellations,
+            "overpayments": self.overpayments.as_dict(),
+            "underpayments": self.underpayments.as_dict(),
+            "late_payments": self.late_payments.as_dict(),
+        }
+
+
+def _run(conn, closeout: Closeout):
+    params = {"location": closeout.location_id, "start": closeout.period_start, "end": closeout.period_end}
+    # Named cursor: rows are streamed from the server instead of loaded at once
+    cur = conn.cursor(name="closeout")
+    cur.itersize = CLOSEOUT_FETCH_SIZE
+    try:
+        cur.execute(CLOSEOUT_QUERY, params)
+        for row in cur:
+            closeout.add(row)
+    finally:
+        cur.close()
+    with conn.cursor() as cur:
+        cur.execute(LATE_PAYMENTS_QUERY, params)
+        for row in cur:
+            closeout.add_late_payment(row)
+
+
+def preview(business_date: date, replica=True):
+    """Computes the report for any day, including one still in progress, without storing it."""
+    closeout = Closeout(get_location_id(), business_date)
+    conn = get_db_connection(replica=replica)
+    try:
+        _run(conn, closeout)
+        return closeout.report()
+    finally:
+        conn.close()
+
+
+def settle(business_date: date):
+    """
+    Computes the report for a finished business day and stores it in
+    daily_settlements. Returns (record, created); created is False when the
+    day had already been settled, in which case the stored record is returned
+    unchanged.
+    """
+    closeout = Closeout(get_location_id(), business_date)
+    if closeout.period_end > datetime.now():
+        raise ValueError(f"Business day {business_date} has not ended yet")
+
+    conn = get_db_connection()
+    try:
+        # The report and the stored totals come from one consistent snapshot
+        with conn.cursor() as cur:
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        _run(conn, closeout)
+
+        report = closeout.report()
+        with conn.cursor() as cur:
+            cur.execute(INSERT_SETTLEMENT_QUERY, (
+                closeout.location_id, business_date, closeout.period_start, closeout.period_end, closeout.order_count,
+                closeout.gross_sales, closeout.payments_total, json.dumps(report),
+            ))
+            created = cur.fetchone()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if created is None:
+        return get_settlement(business_date), False
+    return dict(report, settled_at=created[0].isoformat()), True
+
+
+def get_settlement(business_date: date):
+    row = fetch_one(SETTLEMENT_QUERY, (get_location_id(), business_date))
+    if not row:
+        return None
+    report, settled_at = row
+    return dict(report, settled_at=settled_at.isoformat())
@@ -1,21 +1,80 @@
+import re
+from contextlib import contextmanager
+
 from app.core.database import get_db_connection
 
-def fetch_one(query, params=None):
-    conn = get_db_connection()
+_PLACEHOLDER = re.compile(r"%%|%s")
+
+
+class _Execute(str):
+    """EXECUTE text that carries the statement it runs, for the query log."""
+
+    def __new__(cls, text, original):
+        self = super().__new__(cls, text)
+        self.original = original
+        return self
+
+
+class PreparedStatement:
+    """
+    A hot query that is prepared server-side (PREPARE) the first time each
+    pooled connection runs it and executed by name from then on, so Postgres
+    parses and plans it once per connection instead of on every request.
+    Written with %s placeholders like any other query; every db_helper
+    function and UnitOfWork accepts one in place of the query string.
+    Names are global to the session, so each statement needs its own.
+    """
+
+    def __init__(self, name, query):
+        self.name = name
+        self.query = query
+        count = 0
+
+        def number(match):
+            nonlocal count
+            if match.group() == "%%":
+                return "%"
+            count += 1
+            return f"${count}"
+
+        self.prepare_sql = f"PREPARE {name} AS {_PLACEHOLDER.sub(number, query)}"
+        args = f" ({', '.join(['%s'] * count)})" if count else ""
+        self.execute_sql = _Execute(f"EXECUTE {name}{args}", query)
+
+
+def _execute(cur, query, params):
+    if isinstance(query, PreparedStatement):
+        # Connections outside the pools (or without one) just run the text
+        prepared = getattr(cur.connection, "prepared", None)
+        if prepared is None:
+            query = query.query
+        else:
+            # PREPARE isn't undone by a rollback, so a statement stays
+            # prepared for as long as its connection lives
+            if query.name not in prepared:
+                cur.execute(query.prepare_sql)
+                prepared.add(query.name)
+            cur.execute(query.execute_sql, params or ())
+            return
+    cur.execute(query, params or ())
+
+
+def fetch_one(query, params=None, replica=False):
+    conn = get_db_connection(replica=replica)
     cur = conn.cursor()
     try:
-        cur.execute(query, params or ())
+        _execute(cur, query, params)
         result = cur.fetchone()
         return result
     finally:
         cur.close()
         conn.close()
 
-def fetch_all(query, params=None):
-    conn = get_db_connection()
+def fetch_all(query, params=None, replica=False):
+    conn = get_db_connection(replica=replica)
     cur = conn.cursor()
     try:
-        cur.execute(query, params or ())
+        _execute(cur, query, params)
         result = cur.fetchall()
         return result
     finally:
@@ -26,7 +85,7 @@ def fetch_one_and_commit(query, params=None):
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute(query, params or ())
+        _execute(cur, query, params)
         result = cur.fetchone()
         conn.commit()
         return result
@@ -41,7 +100,7 @@ def execute_query(query, params=None):
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute(query, params or ())
+        _execute(cur, query, params)
         conn.commit()
         return True
     except Exception as e:
@@ -50,3 +109,66 @@ def execute_query(query, params=None):
     finally:
         cur.close()
         conn.close()
+
+
+class UnitOfWork:
+    """
+    One connection and one transaction for an operation that takes several
+    statements:
+
+        with UnitOfWork() as uow:
+            row = uow.fetch_one(...)
+            uow.execute(...)
+
+    Commits when the block exits normally and rolls back when it raises
+    (HTTPException included). savepoint() blocks nest inside it: an exception
+    rolls back to the savepoint and propagates, and the outer transaction
+    stays usable if the caller catches it. `cur` is exposed for helpers that
+    take a cursor, such as audit_log.write().
+    """
+
+    def __init__(self, replica=False):
+        self.replica = replica
+        self.conn = None
+        self.cur = None
+        self._savepoints = 0
+
+    def __enter__(self):
+        self.conn = get_db_connection(replica=self.replica)
+        self.cur = self.conn.cursor()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.cur.close()
+            self.conn.close()
+        return False
+
+    def execute(self, query, params=None):
+        _execute(self.cur, query, params)
+        return self.cur.rowcount
+
+    def fetch_one(self, query, params=None):
+        _execute(self.cur, query, params)
+        return self.cur.fetchone()
+
+    def fetch_all(self, query, params=None):
+        _execute(self.cur, query, params)
+        return self.cur.fetchall()
+
+    @contextmanager
+    def savepoint(self):
+        self._savepoints += 1
+        name = f"uow_{self._savepoints}"
+        self.cur.execute(f"SAVEPOINT {name}")
+        try:
+            yield self
+        except Exception:
+            self.cur.execute(f"ROLLBACK TO SAVEPOINT {name}")
+            raise
+        self.cur.execute(f"RELEASE SAVEPOINT {name}")
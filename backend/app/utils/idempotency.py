@@ -0,0 +1,286 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Annotated, Optional
+
+import psycopg2.errors
+from fastapi import Header, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from psycopg2.extras import Json
+
+from app.core.config import IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL_HOURS, IDEMPOTENCY_WAIT_MS
+from app.core.locations import get_location_id, use_location
+from app.utils.db_helper import PreparedStatement, execute_query
+
+logger = logging.getLogger(__name__)
+
+# Handler parameter for the optional Idempotency-Key request header
+IdempotencyKey = Annotated[Optional[str], Header(alias="Idempotency-Key", max_length=255)]
+
+# Set on responses that repeat an earlier request's result
+REPLAY_HEADER = "Idempotent-Replayed"
+# Expired keys are deleted by a request that finds a purge due, at most this often per process
+PURGE_INTERVAL_SECONDS = 3600
+
+# An expired key may be reused for a new request. Otherwise this inserts
+# nothing, after waiting for a transaction that is still inserting the same key.
+CLAIM_KEY = PreparedStatement("claim_idempotency_key", """
+    INSERT INTO idempotency_keys (location_id, idempotency_key, request_hash)
+    VALUES (%s, %s, %s)
+    ON CONFLICT (location_id, idempotency_key) DO UPDATE
+        SET request_hash = EXCLUDED.request_hash, status_code = NULL, response = NULL,
+            created_at = CURRENT_TIMESTAMP
+        WHERE idempotency_keys.created_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+    RETURNING 1
+""")
+
+STORED_RESPONSE = PreparedStatement("idempotency_response", """
+    SELECT request_hash, status_code, response FROM idempotency_keys
+    WHERE location_id = %s AND idempotency_key = %s
+""")
+
+SAVE_RESPONSE = PreparedStatement("save_idempotency_response", """
+    UPDATE idempotency_keys SET status_code = %s, response = %s
+    WHERE location_id = %s AND idempotency_key = %s
+""")
+
+# Bulk forms for batches. Keys are claimed in sorted order, so two batches
+# that share keys wait for each other instead of deadlocking.
+CLAIM_KEYS = """
+    INSERT INTO idempotency_keys (location_id, idempotency_key, request_hash)
+    SELECT %s, k.key, k.hash FROM unnest(%s::varchar[], %s::char(40)[]) AS k(key, hash) ORDER BY k.key
+    ON CONFLICT (location_id, idempotency_key) DO UPDATE
+        SET request_hash = EXCLUDED.request_hash, status_code = NULL, response = NULL,
+            created_at = CURRENT_TIMESTAMP
+        WHERE idempotency_keys.created_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+    RETURNING idempotency_key
+"""
+
+STORED_RESPONSES = """
+    SELECT idempotency_key, request_hash, status_code, response FROM idempotency_keys
+    WHERE location_id = %s AND idempotency_key = ANY(%s)
+"""
+
+SAVE_RESPONSES = """
+    UPDATE idempotency_keys k SET status_code = 200, response = r.response
+    FROM unnest(%s::varchar[], %s::jsonb[]) AS r(key, response)
+    WHERE k.location_id = %s AND k.idempotency_key = r.key
+"""
+
+RELEASE_KEYS = "DELETE FROM idempotency_keys WHERE location_id = %s AND idempotency_key = ANY(%s)"
+
+PURGE_EXPIRED = "DELETE FROM idempotency_keys WHERE created_at < CURRENT_TIMESTAMP - make_interval(secs => %s)"
+
+
+def _mismatch():
+    return HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+
+
+def _in_progress():
+    return HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress",
+                         headers={"Retry-After": "1"})
+
+
+class Claim:
+    """
+    One request's use of an idempotency key. Without a key every method is a
+    no-op, so handlers need only one code path.
+    """
+
+    def __init__(self, store, location_id=None, key=None, request_hash=None):
+        self.store = store
+        self.location_id = location_id
+        self.key = key
+        self.request_hash = request_hash
+        # Set when an earlier request's response is to be returned instead
+        self.response = None
+        # (status_code, body) once save() has run
+        self.result = None
+
+    def take(self, uow):
+        """
+        Inserts the key in `uow`'s transaction, so it commits or rolls back
+        with the operation it guards. A request with the same key that is still
+        running in another process holds the row, so this waits (up to
+        IDEMPOTENCY_WAIT_MS) for that transaction to end, so handlers call it
+        from the threadpool. Returns False when this request should go ahead,
+        True when `response` now holds the stored response to return.
+        """
+        if self.key is None:
+            return False
+        with self.store._waiting(uow):
+            claimed = uow.fetch_one(CLAIM_KEY, (self.location_id, self.key, self.request_hash, self.store.ttl_seconds))
+        if claimed:
+            return False
+
+        request_hash, status_code, body = uow.fetch_one(STORED_RESPONSE, (self.location_id, self.key))
+        if request_hash != self.request_hash:
+            raise _mismatch()
+        self.store.remember((self.location_id, self.key), request_hash, status_code, body)
+        self.response = self.store.replay(status_code, body)
+        return True
+
+    def save(self, uow, body, status_code=200):
+        """Stores the response in `uow`'s transaction, before it commits."""
+        if self.key is None:
+            return
+        body = jsonable_encoder(body)
+        uow.execute(SAVE_RESPONSE, (status_code, Json(body), self.location_id, self.key))
+        self.result = (status_code, body)
+
+
+class IdempotencyStore:
+    """
+    Idempotency-Key support for POST endpoints whose retries must not repeat
+    the work, such as order submission and payment. The first request with a
+    key runs; its response is stored in the idempotency_keys table in the
+    same transaction as the work, and kept in memory (LRU, `cache_size`
+    entries) for `ttl_seconds`. A repeat gets the stored response back with
+    an Idempotent-Replayed header. A repeat that arrives while the first is
+    still running waits for it: on an asyncio future within this process,
+    on the key's row lock across processes. Only successful responses are
+    stored, so a request that failed can simply be retried. Reusing a key
+    with a different request body is rejected with 422.
+    """
+
+    def __init__(self, ttl_seconds: float, cache_size: int, wait_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.cache_size = cache_size
+        self.wait_seconds = wait_seconds
+        # (location_id, key) -> (expires_at, request_hash, status_code, body)
+        self.responses = OrderedDict()
+        # (location_id, key) -> future resolved when that request finishes
+        self.in_flight = {}
+        self.replays = 0
+        self._purged_at = time.monotonic()
+
+    @asynccontextmanager
+    async def request(self, key, scope, payload):
+        """
+        Wraps one handler run for `key` (None when the client sent no
+        Idempotency-Key header). `scope` and `payload` identify the request,
+        e.g. "create_order" and the request body, and must match on a repeat.
+        """
+        if key is None:
+            yield Claim(self)
+            return
+
+        location_id = get_location_id()
+        ident = (location_id, key)
+        request_hash = self.request_hash(scope, payload)
+        while ident in self.in_flight:
+            try:
+                await asyncio.wait_for(asyncio.shield(self.in_flight[ident]), self.wait_seconds)
+            except asyncio.TimeoutError:
+                raise _in_progress()
+
+        claim = Claim(self, location_id, key, request_hash)
+        claim.response = self._cached(ident, request_hash)
+        if claim.response is not None:
+            yield claim
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[ident] = future
+        try:
+            yield claim
+        finally:
+            del self.in_flight[ident]
+            future.set_result(None)
+        # Waiters resume only after this, so they find the response cached
+        if claim.result is not None:
+            self.remember(ident, request_hash, *claim.result)
+        self._purge_if_due(location_id)
+
+    def request_hash(self, scope, payload):
+        return hashlib.sha1(json.dumps([scope, jsonable_encoder(payload)], sort_keys=True).encode()).hexdigest()
+
+    @contextmanager
+    def _waiting(self, uow):
+        # Bounds the wait for another transaction holding the same key
+        uow.execute(f"SET LOCAL lock_timeout = '{int(self.wait_seconds * 1000)}ms'")
+        try:
+            yield
+        except psycopg2.errors.LockNotAvailable:
+            raise _in_progress()
+        uow.execute("SET LOCAL lock_timeout = DEFAULT")
+
+    def claim_many(self, uow, location_id, hashes):
+        """
+        Claim.take() for a batch: takes every key of {key: request_hash} that
+        is free in `uow`'s transaction. Returns the set of keys claimed and,
+        for the others, {key: (request_hash, status_code, body)} as stored by
+        the request that used the key before.
+        """
+        keys = list(hashes)
+        with self._waiting(uow):
+            rows = uow.fetch_all(CLAIM_KEYS, (location_id, keys, [hashes[k] for k in keys], self.ttl_seconds))
+        claimed = {r[0] for r in rows}
+        taken = [k for k in keys if k not in claimed]
+        stored = {}
+        if taken:
+            for key, request_hash, status_code, body in uow.fetch_all(STORED_RESPONSES, (location_id, taken)):
+                stored[key] = (request_hash, status_code, body)
+        return claimed, stored
+
+    def save_many(self, uow, location_id, responses):
+        """Claim.save() for a batch of {key: body}, all with status 200. Returns the encoded bodies."""
+        bodies = {key: jsonable_encoder(body) for key, body in responses.items()}
+        uow.execute(SAVE_RESPONSES, (list(bodies), [Json(b) for b in bodies.values()], location_id))
+        return bodies
+
+    def release_many(self, uow, location_id, keys):
+        """Gives up claimed keys whose requests failed, so they can be retried."""
+        if keys:
+            uow.execute(RELEASE_KEYS, (location_id, list(keys)))
+
+    def _cached(self, ident, request_hash):
+        entry = self.responses.get(ident)
+        if entry is None:
+            return None
+        expires_at, stored_hash, status_code, body = entry
+        if expires_at <= time.monotonic():
+            del self.responses[ident]
+            return None
+        if stored_hash != request_hash:
+            raise _mismatch()
+        self.responses.move_to_end(ident)
+        return self.replay(status_code, body)
+
+    def remember(self, ident, request_hash, status_code, body):
+        self.responses[ident] = (time.monotonic() + self.ttl_seconds, request_hash, status_code, body)
+        self.responses.move_to_end(ident)
+        while len(self.responses) > self.cache_size:
+            self.responses.popitem(last=False)
+
+    def replay(self, status_code, body):
+        self.replays += 1
+        return JSONResponse(body, status_code=status_code, headers={REPLAY_HEADER: "true"})
+
+    def _purge_if_due(self, location_id):
+        now = time.monotonic()
+        if now - self._purged_at < PURGE_INTERVAL_SECONDS:
+            return
+        self._purged_at = now
+        # A delete of any size: in a thread of its own, off the event loop
+        threading.Thread(target=self._purge, args=(location_id,), name="idempotency-purge", daemon=True).start()
+
+    def _purge(self, location_id):
+        try:
+            # On the database of the location whose request found the purge due
+            with use_location(location_id):
+                execute_query(PURGE_EXPIRED, (self.ttl_seconds,))
+        except Exception as e:
+            logger.warning("idempotency: purging expired keys failed: %s", e)
+
+    def status(self):
+        return {"cached": len(self.responses), "in_flight": len(self.in_flight), "replays": self.replays}
+
+
+idempotency = IdempotencyStore(IDEMPOTENCY_TTL_HOURS * 3600, IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_WAIT_MS / 1000)
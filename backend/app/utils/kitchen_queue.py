@@ -0,0 +1,432 @@
+import logging
+import random
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from itertools import groupby, islice
+
+from app.core.config import (
+    KITCHEN_COURSE_GAP_SECONDS, KITCHEN_COURSES, KITCHEN_DEFAULT_PREP_SECONDS, KITCHEN_GUEST_SECONDS,
+    KITCHEN_POLICY, KITCHEN_PREP_LOOKBACK_DAYS, KITCHEN_PREP_REFRESH_MINUTES, KITCHEN_RESYNC_SECONDS,
+    KITCHEN_STATIONS, KITCHEN_WALK_IN_GUESTS, ORDER_HOT_DAYS,
+)
+from app.utils.db_helper import UnitOfWork
+from app.utils.reference_data import reference_data
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("fifo", "fire_time", "weighted")
+# Orders the kitchen still has to work on; any other status takes a ticket off the queue
+ACTIVE_STATUSES = ("pending", "preparing")
+MAIN_COURSE = 2
+DEFAULT_STATION = "kitchen"
+# Items ordered fewer times than this in the lookback keep the default prep time
+MIN_PREP_SAMPLES = 5
+
+# Orders of the last ORDER_HOT_DAYS only (and not past tomorrow), so just the
+# latest partitions of orders and order_items are read
+ACTIVE_ORDERS = """
+    SELECT o.id, o.table_id, o.status, o.created_at, r.party_size,
+           oi.menu_item_id, m.name, oi.quantity, oi.notes
+    FROM orders o
+    JOIN order_items oi ON oi.order_id = o.id AND oi.created_at >= o.created_at
+        AND oi.created_at >= LOCALTIMESTAMP - make_interval(secs => %(hot_seconds)s)
+        AND oi.created_at < LOCALTIMESTAMP + interval '1 day'
+    JOIN menu_items m ON m.id = oi.menu_item_id
+    LEFT JOIN reservations r ON r.id = o.reservation_id
+    WHERE o.location_id = %(location_id)s AND o.status IN ('pending', 'preparing')
+      AND o.created_at >= LOCALTIMESTAMP - make_interval(secs => %(hot_seconds)s)
+      AND o.created_at < LOCALTIMESTAMP + interval '1 day'
+    ORDER BY o.id, oi.id
+"""
+
+MENU_CATEGORIES = """
+    SELECT m.id, c.name FROM menu_items m LEFT JOIN categories c ON c.id = m.category_id
+    WHERE m.location_id = %s
+"""
+
+# Orders created in [since, until) with their preparing-to-ready time. Every
+# range is on a partition key, so only the partitions of that window are read.
+PREP_TIMES = """
+    WITH cooked AS (
+        SELECT o.id, o.created_at,
+               EXTRACT(EPOCH FROM MAX(l.changed_at) FILTER (WHERE l.new_status = 'ready')
+                                - MAX(l.changed_at) FILTER (WHERE l.new_status = 'preparing')) AS seconds
+        FROM orders o
+        JOIN order_logs l ON l.order_id = o.id AND l.changed_at >= %s AND l.changed_at < %s + interval '1 day'
+        WHERE o.location_id = %s AND o.created_at >= %s AND o.created_at < %s
+        GROUP BY o.id, o.created_at
+    )
+    SELECT oi.menu_item_id, percentile_cont(0.5) WITHIN GROUP (ORDER BY c.seconds)
+    FROM cooked c
+    JOIN order_items oi ON oi.order_id = c.id AND oi.created_at = c.created_at
+        AND oi.created_at >= %s AND oi.created_at < %s
+    WHERE c.seconds > 0
+    GROUP BY oi.menu_item_id
+    HAVING COUNT(*) >= %s
+"""
+
+ItemProfile = namedtuple("ItemProfile", "station course prep_seconds")
+# fire_at: when the line should go on, in epoch seconds
+Line = namedtuple("Line", "menu_item_id name quantity notes station course prep_seconds fire_at")
+
+
+def learn_prep_times(location_id, since, until):
+    """
+    {menu_item_id: seconds}: the median time from preparing to ready of the
+    location's orders created in [since, until) that contain the item. The
+    slowest item of an order sets its time, so this overstates the quick
+    items that are mostly ordered with slow ones.
+    """
+    with UnitOfWork(replica=True) as uow:
+        rows = uow.fetch_all(PREP_TIMES, (since, until, location_id, since, until, since, until, MIN_PREP_SAMPLES))
+    return {menu_item_id: float(seconds) for menu_item_id, seconds in rows}
+
+
+def item_profiles(categories, prep_times, default_prep_seconds):
+    """{menu_item_id: ItemProfile} from (menu_item_id, category name) rows."""
+    profiles = {}
+    for menu_item_id, category in categories:
+        profiles[menu_item_id] = ItemProfile(
+            KITCHEN_STATIONS.get(category, category or DEFAULT_STATION),
+            KITCHEN_COURSES.get(category, MAIN_COURSE),
+            prep_times.get(menu_item_id, default_prep_seconds),
+        )
+    return profiles
+
+
+class _Node:
+    __slots__ = ("value", "next")
+
+    def __init__(self, value, level):
+        self.value = value
+        self.next = [None] * level
+
+
+class SortedList:
+    """
+    Skip list of distinct, comparable values. add() and remove() take
+    O(log n) expected time; iterating yields the values in order, so the
+    first k cost O(k) however long the list is.
+    """
+
+    MAX_LEVEL = 32
+
+    def __init__(self):
+        self.head = _Node(None, self.MAX_LEVEL)
+        self.level = 1
+        self.size = 0
+        self._random = random.Random(0)
+
+    def _path(self, value):
+        # The last node before `value` on every level
+        path = [self.head] * self.MAX_LEVEL
+        node = self.head
+        for level in range(self.level - 1, -1, -1):
+            while node.next[level] is not None and node.next[level].value < value:
+                node = node.next[level]
+            path[level] = node
+        return path
+
+    def add(self, value):
+        path = self._path(value)
+        level = 1
+        while level < self.MAX_LEVEL and self._random.random() < 0.5:
+            level += 1
+        self.level = max(self.level, level)
+        node = _Node(value, level)
+        for i in range(level):
+            node.next[i] = path[i].next[i]
+            path[i].next[i] = node
+        self.size += 1
+
+    def remove(self, value):
+        path = self._path(value)
+        node = path[0].next[0]
+        if node is None or node.value != value:
+            raise ValueError(f"{value!r} not in list")
+        for i in range(len(node.next)):
+            path[i].next[i] = node.next[i]
+        while self.level > 1 and self.head.next[self.level - 1] is None:
+            self.level -= 1
+        self.size -= 1
+
+    def first(self):
+        node = self.head.next[0]
+        return None if node is None else node.value
+
+    def __iter__(self):
+        node = self.head.next[0]
+        while node is not None:
+            yield node.value
+            node = node.next[0]
+
+    def __len__(self):
+        return self.size
+
+
+class Ticket:
+    __slots__ = ("order_id", "table_id", "status", "created_at", "guests", "lines", "key")
+
+    @property
+    def fire_at(self):
+        return self.key[0]
+
+
+class KitchenQueue:
+    """
+    One location's active tickets, in the order the kitchen should work
+    them, plus each station's next-up list: the lines of pending tickets at
+    that station, in the order to fire them. A ticket's place is fixed when
+    it arrives, as a point in time rather than a score that changes with
+    age: the time its first line has to go on (see plan()). Older tickets
+    reach the front as newer ones queue behind them, so nothing has to be
+    re-sorted as time passes; adding a ticket, changing its status and
+    removing it each cost O(log n) per line.
+    """
+
+    def __init__(self, policy=KITCHEN_POLICY, profiles=None, default_prep_seconds=KITCHEN_DEFAULT_PREP_SECONDS,
+                 course_gap=KITCHEN_COURSE_GAP_SECONDS, guest_seconds=KITCHEN_GUEST_SECONDS):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown kitchen policy {policy!r}, expected one of {', '.join(POLICIES)}")
+        self.policy = policy
+        self.profiles = profiles or {}
+        self.default_profile = ItemProfile(DEFAULT_STATION, MAIN_COURSE, default_prep_seconds)
+        self.course_gap = course_gap
+        self.guest_seconds = guest_seconds
+        self.tickets = {}
+        # (fire_at, order_id)
+        self.queue = SortedList()
+        # station -> (fire_at, order_id, line index)
+        self.stations = {}
+
+    def plan(self, created_at, guests, items):
+        """
+        Lines for (menu_item_id, name, quantity, notes) items, each with the
+        time it should go on. Under "fifo" that is the order's arrival.
+        Otherwise the order's courses are due one course gap apart, starting
+        on arrival, and each line fires its prep time before its course is
+        due, so a course's dishes finish together; "weighted" fires large
+        parties a little earlier still.
+        """
+        created = created_at.timestamp()
+        profiles = [self.profiles.get(item[0], self.default_profile) for item in items]
+        courses = sorted({profile.course for profile in profiles})
+        lines = []
+        for (menu_item_id, name, quantity, notes), profile in zip(items, profiles):
+            if self.policy == "fifo":
+                fire_at = created
+            else:
+                fire_at = created + courses.index(profile.course) * self.course_gap - profile.prep_seconds
+                if self.policy == "weighted":
+                    fire_at -= self.guest_seconds * max(guests - 1, 0)
+            lines.append(Line(menu_item_id, name, quantity, notes, profile.station, profile.course,
+                              profile.prep_seconds, fire_at))
+        return lines
+
+    def add(self, order_id, table_id, status, created_at, guests, items):
+        """Queues an order, replacing its ticket if it is already queued."""
+        if order_id in self.tickets:
+            self.remove(order_id)
+        if status not in ACTIVE_STATUSES or not items:
+            return
+        ticket = Ticket()
+        ticket.order_id = order_id
+        ticket.table_id = table_id
+        ticket.status = status
+        ticket.created_at = created_at
+        ticket.guests = guests
+        ticket.lines = self.plan(created_at, guests, items)
+        ticket.key = (min(line.fire_at for line in ticket.lines), order_id)
+        self.tickets[order_id] = ticket
+        self.queue.add(ticket.key)
+        if status == "pending":
+            self._add_lines(ticket)
+
+    def set_status(self, order_id, status):
+        ticket = self.tickets.get(order_id)
+        if ticket is None or ticket.status == status:
+            return
+        if status not in ACTIVE_STATUSES:
+            self.remove(order_id)
+            return
+        if ticket.status == "pending":
+            self._remove_lines(ticket)
+        ticket.status = status
+        if status == "pending":
+            self._add_lines(ticket)
+
+    def remove(self, order_id):
+        ticket = self.tickets.pop(order_id, None)
+        if ticket is None:
+            return
+        self.queue.remove(ticket.key)
+        if ticket.status == "pending":
+            self._remove_lines(ticket)
+
+    def _add_lines(self, ticket):
+        for index, line in enumerate(ticket.lines):
+            self.stations.setdefault(line.station, SortedList()).add((line.fire_at, ticket.order_id, index))
+
+    def _remove_lines(self, ticket):
+        for index, line in enumerate(ticket.lines):
+            station = self.stations[line.station]
+            station.remove((line.fire_at, ticket.order_id, index))
+            if not station:
+                del self.stations[line.station]
+
+    def first(self):
+        key = self.queue.first()
+        return None if key is None else self.tickets[key[1]]
+
+    def ordered(self, limit=None):
+        """The first `limit` tickets, in the order to work them."""
+        return [self.tickets[order_id] for _, order_id in islice(self.queue, limit)]
+
+    def next_up(self, limit):
+        """{station: [(ticket, line)]}, the first `limit` lines to fire at each station."""
+        return {
+            station: [(self.tickets[order_id], self.tickets[order_id].lines[index])
+                      for _, order_id, index in islice(lines, limit)]
+            for station, lines in sorted(self.stations.items())
+        }
+
+    def __len__(self):
+        return len(self.tickets)
+
+
+def _walk_in_guests(location_id, table_id):
+    # Without a reservation the party size isn't known; a full table would
+    # fire every walk-in at a large table as early as a booked party
+    table = reference_data.get(location_id).tables.get(table_id)
+    return min(KITCHEN_WALK_IN_GUESTS, table.capacity) if table else KITCHEN_WALK_IN_GUESTS
+
+
+class KitchenBoard:
+    """
+    The KitchenQueue of every location this process serves. Orders created
+    and status changes made by this process update its queues as they
+    happen; a queue older than `resync_seconds` is reloaded from the
+    database on its next read, to take in those made by other workers. Prep
+    times are relearned from order_logs every `prep_refresh_seconds`.
+    """
+
+    def __init__(self, policy, resync_seconds, prep_refresh_seconds, lookback_days):
+        self.policy = policy
+        self.resync_seconds = resync_seconds
+        self.prep_refresh_seconds = prep_refresh_seconds
+        self.lookback_days = lookback_days
+        self.queues = {}
+        self.loaded_at = {}
+        # location_id -> (learned_at, {menu_item_id: seconds})
+        self.prep_times = {}
+        # location_id -> event lists of the loads in progress, replayed on
+        # the queue each builds so no event is lost while it reads
+        self.loading = {}
+        self.lock = threading.Lock()
+        self.events = 0
+        self.loads = 0
+
+    def queue(self, location_id, limit=None):
+        queue = self._current(location_id)
+        with self.lock:
+            return queue.policy, queue.ordered(limit)
+
+    def next_up(self, location_id, limit):
+        queue = self._current(location_id)
+        with self.lock:
+            return queue.next_up(limit)
+
+    def fire_at(self, location_id, order_id):
+        """
+        The datetime a queued order's ticket fires, i.e. its place in the
+        queue; None when it isn't queued (any more), or its location hasn't
+        been loaded by this process.
+        """
+        with self.lock:
+            queue = self.queues.get(location_id)
+            ticket = queue.tickets.get(order_id) if queue is not None else None
+            return datetime.fromtimestamp(ticket.fire_at) if ticket is not None else None
+
+    def order_created(self, location_id, order, party_size=None):
+        """Queues a new Order; party_size is its reservation's, if it has one."""
+        guests = party_size or _walk_in_guests(location_id, order.table_id)
+        items = [(i.menu_item_id, i.menu_item_name, i.quantity, i.notes) for i in order.items]
+        self._apply(location_id, lambda queue: queue.add(
+            order.id, order.table_id, order.status, order.created_at, guests, items
+        ))
+
+    def status_changed(self, location_id, order_id, status):
+        self._apply(location_id, lambda queue: queue.set_status(order_id, status))
+
+    def _apply(self, location_id, event):
+        with self.lock:
+            self.events += 1
+            for journal in self.loading.get(location_id, ()):
+                journal.append(event)
+            queue = self.queues.get(location_id)
+            # A location nobody has asked for yet is loaded with this order on first use
+            if queue is not None:
+                event(queue)
+
+    def _current(self, location_id):
+        with self.lock:
+            queue = self.queues.get(location_id)
+            if queue is not None and (
+                time.monotonic() - self.loaded_at[location_id] < self.resync_seconds or self.loading.get(location_id)
+            ):
+                return queue
+            journal = []
+            self.loading.setdefault(location_id, []).append(journal)
+        try:
+            queue = self._load(location_id)
+        finally:
+            with self.lock:
+                self.loading[location_id].remove(journal)
+                if not self.loading[location_id]:
+                    del self.loading[location_id]
+        with self.lock:
+            for event in journal:
+                event(queue)
+            self.queues[location_id] = queue
+            self.loaded_at[location_id] = time.monotonic()
+            self.loads += 1
+        return queue
+
+    def _load(self, location_id):
+        with UnitOfWork() as uow:
+            categories = uow.fetch_all(MENU_CATEGORIES, (location_id,))
+            rows = uow.fetch_all(ACTIVE_ORDERS, {"location_id": location_id, "hot_seconds": ORDER_HOT_DAYS * 86400})
+        queue = KitchenQueue(self.policy, item_profiles(categories, self._prep_times(location_id),
+                                                        KITCHEN_DEFAULT_PREP_SECONDS))
+        for (order_id, table_id, status, created_at, party_size), items in groupby(rows, key=lambda r: r[:5]):
+            queue.add(order_id, table_id, status, created_at, party_size or _walk_in_guests(location_id, table_id),
+                      [r[5:] for r in items])
+        return queue
+
+    def _prep_times(self, location_id):
+        learned_at, prep_times = self.prep_times.get(location_id, (None, {}))
+        now = time.monotonic()
+        if learned_at is not None and now - learned_at < self.prep_refresh_seconds:
+            return prep_times
+        until = datetime.now()
+        try:
+            prep_times = learn_prep_times(location_id, until - timedelta(days=self.lookback_days), until)
+        except Exception as e:
+            # Keep the previous estimates; try again next refresh
+            logger.warning("kitchen queue: learning prep times failed: %s", e)
+        self.prep_times[location_id] = (now, prep_times)
+        return prep_times
+
+    def status(self):
+        return {
+            "policy": self.policy,
+            "tickets": {location_id: len(queue) for location_id, queue in self.queues.items()},
+            "events": self.events,
+            "loads": self.loads,
+        }
+
+
+kitchen = KitchenBoard(KITCHEN_POLICY, KITCHEN_RESYNC_SECONDS, KITCHEN_PREP_REFRESH_MINUTES * 60,
+                       KITCHEN_PREP_LOOKBACK_DAYS)
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict
+
+from app.core.config import LOOP_LAG_THRESHOLD_MS, LOOP_MONITOR_INTERVAL_MS
+from app.utils.metrics import LATENCY_BUCKETS, Histogram
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LoopMonitor:
+    """
+    Detects event loop stalls, i.e. blocking calls made from async handlers.
+
+    A heartbeat coroutine wakes up every `interval` seconds and records how late
+    it was. A watchdog thread notices when the heartbeat is overdue while the
+    stall is still in progress and samples the loop thread's stack, which lets
+    the stall be attributed to the route whose endpoint is on that stack.
+    """
+
+    def __init__(self, interval: float, threshold: float, history: int = 50):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls = deque(maxlen=history)
+        self.stalls_by_route: Dict[str, int] = {}
+        self.lag = Histogram(LATENCY_BUCKETS)
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        # id(scope) -> scope for HTTP requests currently being handled
+        self.inflight: Dict[int, dict] = {}
+        self._beat = time.monotonic()
+        self._sample = None
+        self._loop_thread = None
+        self._task = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        threading.Thread(target=self._watchdog, name="loop-monitor", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._beat = now
+            lag = max(0.0, now - expected)
+            self.last_lag = lag
+            self.lag.observe(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+            sample, self._sample = self._sample, None
+            if lag >= self.threshold:
+                self._record(lag, sample)
+
+    def _watchdog(self):
+        while not self._stop.wait(self.interval):
+            overdue = time.monotonic() - self._beat - self.interval
+            if overdue >= self.threshold and self._sample is None:
+                self._sample = self._sample_stack()
+
+    def _sample_stack(self):
+        frame = sys._current_frames().get(self._loop_thread)
+        endpoints = {}
+        for scope in list(self.inflight.values()):
+            route = scope.get("route")
+            endpoint = getattr(route, "endpoint", None)
+            if endpoint is not None:
+                endpoints[endpoint.__code__] = route.path
+
+        route = None
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            if route is None and code in endpoints:
+                route = endpoints[code]
+            if code.co_filename.startswith(APP_DIR):
+                stack.append(f"{os.path.relpath(code.co_filename, APP_DIR)}:{frame.f_lineno} in {code.co_name}")
+            frame = frame.f_back
+        return {"route": route, "stack": stack}
+
+    def _inflight_routes(self):
+        routes = (getattr(s.get("route"), "path", None) for s in list(self.inflight.values()))
+        return sorted({r for r in routes if r})
+
+    def _record(self, lag, sample):
+        route = (sample or {}).get("route") or "unknown"
+        stall = {
+            "at": datetime.now().isoformat(timespec="milliseconds"),
+            "duration_ms": round(lag * 1000, 1),
+            "route": route,
+            "inflight_routes": self._inflight_routes(),
+            "stack": (sample or {}).get("stack", []),
+        }
+        self.stalls.append(stall)
+        self.stalls_by_route[route] = self.stalls_by_route.get(route, 0) + 1
+        logger.warning("event loop blocked for %.0f ms in %s", lag * 1000, route)
+
+    def snapshot(self):
+        return {
+            "lag_ms": round(self.last_lag * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "stall_threshold_ms": round(self.threshold * 1000, 2),
+            "stalls_total": sum(self.stalls_by_route.values()),
+            "recent_stalls": list(self.stalls),
+        }
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP event_loop_lag_seconds Lateness of the event loop heartbeat.",
+            "# TYPE event_loop_lag_seconds histogram",
+        ]
+        cumulative = 0
+        for bound, count in zip(self.lag.buckets, self.lag.counts):
+            cumulative += count
+            lines.append(f'event_loop_lag_seconds_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'event_loop_lag_seconds_bucket{{le="+Inf"}} {self.lag.count}')
+        lines.append(f"event_loop_lag_seconds_sum {self.lag.sum}")
+        lines.append(f"event_loop_lag_seconds_count {self.lag.count}")
+        lines.append("# HELP event_loop_stalls_total Event loop stalls over the threshold, by blocking route.")
+        lines.append("# TYPE event_loop_stalls_total counter")
+        for route, count in sorted(self.stalls_by_route.items()):
+            lines.append(f'event_loop_stalls_total{{route="{route}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+class LoopMonitorMiddleware:
+    """Keeps track of in-flight requests so stalls can be attributed to a route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        key = id(scope)
+        monitor.inflight[key] = scope
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            monitor.inflight.pop(key, None)
+
+
+monitor = LoopMonitor(LOOP_MONITOR_INTERVAL_MS / 1000, LOOP_LAG_THRESHOLD_MS / 1000)
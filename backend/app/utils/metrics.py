@@ -0,0 +1,182 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+# Bucket bounds are upper bounds; an implicit +Inf bucket follows the last one.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestStats:
+    """DB work done on behalf of a single request."""
+    __slots__ = ("queries", "rows", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+        self.db_time = 0.0
+
+
+class RouteMetrics:
+    __slots__ = ("latency", "queries", "db_time", "rows", "responses")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.db_time = Histogram(LATENCY_BUCKETS)
+        self.rows = 0
+        self.responses: Dict[int, int] = {}
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+# Keyed by (method, route template). Only ever mutated from the event loop
+# thread (in the middleware), so no locking is needed.
+_routes: Dict[Tuple[str, str], RouteMetrics] = {}
+
+# Queries issued outside of any HTTP request (startup, scripts, websockets).
+# Background threads (audit log, stock refills, warmup) all add to it, so
+# it is guarded by a lock; a request's stats are only touched by the thread
+# running it at the time.
+_background = RequestStats()
+_background_lock = threading.Lock()
+
+
+def _add(stats, duration, rows):
+    stats.queries += 1
+    stats.rows += rows if rows > 0 else 0
+    stats.db_time += duration
+
+
+def record_query(duration, rows):
+    """Called by the DB layer after every statement."""
+    stats = _current_request.get()
+    if stats is not None:
+        _add(stats, duration, rows)
+        return
+    with _background_lock:
+        _add(_background, duration, rows)
+
+
+def observe_request(method, route, status, duration, stats: RequestStats):
+    key = (method, route)
+    metrics = _routes.get(key)
+    if metrics is None:
+        metrics = _routes[key] = RouteMetrics()
+    metrics.latency.observe(duration)
+    metrics.queries.observe(stats.queries)
+    metrics.db_time.observe(stats.db_time)
+    metrics.rows += stats.rows
+    metrics.responses[status] = metrics.responses.get(status, 0) + 1
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording latency and DB usage per route template.
+    Kept off BaseHTTPMiddleware so the per-request overhead stays at a couple
+    of perf_counter calls and a dict lookup.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        status_holder = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            _current_request.reset(token)
+            # The router stores the matched route on the scope, which gives us
+            # the path template rather than the raw (high-cardinality) path.
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or UNMATCHED_ROUTE
+            observe_request(scope["method"], route_path, status_holder[0], duration, stats)
+
+
+def _labels(**labels):
+    return ",".join(f'{k}="{v}"' for k, v in labels.items())
+
+
+def _render_histogram(lines, name, labels, histogram: Histogram):
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+def render_prometheus() -> str:
+    lines = []
+    items = sorted(_routes.items())
+
+    lines.append("# HELP http_request_duration_seconds Request latency by route.")
+    lines.append("# TYPE http_request_duration_seconds histogram")
+    for (method, route), metrics in items:
+        _render_histogram(lines, "http_request_duration_seconds", _labels(method=method, route=route), metrics.latency)
+
+    lines.append("# HELP http_requests_total Responses by route and status code.")
+    lines.append("# TYPE http_requests_total counter")
+    for (method, route), metrics in items:
+        for status, count in sorted(metrics.responses.items()):
+            lines.append(f"http_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}")
+
+    lines.append("# HELP db_queries_per_request Number of SQL statements executed per request.")
+    lines.append("# TYPE db_queries_per_request histogram")
+    for (method, route), metrics in items:
+        _render_histogram(lines, "db_queries_per_request", _labels(method=method, route=route), metrics.queries)
+
+    lines.append("# HELP db_time_per_request_seconds Time spent in SQL statements per request.")
+    lines.append("# TYPE db_time_per_request_seconds histogram")
+    for (method, route), metrics in items:
+        _render_histogram(lines, "db_time_per_request_seconds", _labels(method=method, route=route), metrics.db_time)
+
+    lines.append("# HELP db_rows_total Rows returned or affected by SQL statements.")
+    lines.append("# TYPE db_rows_total counter")
+    for (method, route), metrics in items:
+        lines.append(f"db_rows_total{{{_labels(method=method, route=route)}}} {metrics.rows}")
+
+    with _background_lock:
+        background_queries, background_time = _background.queries, _background.db_time
+    lines.append("# HELP db_background_queries_total SQL statements executed outside HTTP requests.")
+    lines.append("# TYPE db_background_queries_total counter")
+    lines.append(f"db_background_queries_total {background_queries}")
+    lines.append("# HELP db_background_time_seconds_total Time spent in SQL statements outside HTTP requests.")
+    lines.append("# TYPE db_background_time_seconds_total counter")
+    lines.append(f"db_background_time_seconds_total {background_time}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,211 @@
+import hashlib
+import importlib.util
+import logging
+import os
+import re
+import time
+
+from app.core.database import PRIMARY_SHARD, dedicated_connection
+from app.utils.partitions import LOCK_TIMEOUT, _relkind
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "db", "migrations")
+MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.(sql|py)$")
+
+# Held for the whole run, so two deploys can't migrate the same database at once
+ADVISORY_LOCK_KEY = 4_107_041
+
+CREATE_MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version VARCHAR(4) PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        checksum VARCHAR(40) NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        duration_ms NUMERIC(12,1) NOT NULL
+    )
+"""
+
+
+class Migration:
+    """
+    One file in app/db/migrations, named NNNN_description.sql or .py. SQL
+    files run as one transaction. Python files define up(cur) and run in a
+    transaction too, unless they set TRANSACTIONAL = False (needed for
+    CREATE INDEX CONCURRENTLY); those run in autocommit mode and must be safe
+    to re-run after a failure part way through.
+    """
+
+    def __init__(self, path):
+        match = MIGRATION_FILE.match(os.path.basename(path))
+        self.version, self.name, self.kind = match[1], match[2], match[3]
+        self.path = path
+        with open(path, "rb") as f:
+            self.checksum = hashlib.sha1(f.read()).hexdigest()
+        self._module = None
+
+    @property
+    def module(self):
+        if self._module is None:
+            spec = importlib.util.spec_from_file_location(f"migration_{self.version}", self.path)
+            self._module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(self._module)
+        return self._module
+
+    @property
+    def transactional(self):
+        return self.kind == "sql" or getattr(self.module, "TRANSACTIONAL", True)
+
+    def run(self, cur):
+        if self.kind == "sql":
+            with open(self.path, "r") as f:
+                cur.execute(f.read())
+        else:
+            self.module.up(cur)
+
+    def __str__(self):
+        return f"{self.version}_{self.name}"
+
+
+def discover():
+    migrations = [
+        Migration(os.path.join(MIGRATIONS_DIR, name))
+        for name in sorted(os.listdir(MIGRATIONS_DIR))
+        if MIGRATION_FILE.match(name)
+    ]
+    versions = [m.version for m in migrations]
+    duplicates = {v for v in versions if versions.count(v) > 1}
+    if duplicates:
+        raise RuntimeError(f"Duplicate migration versions: {', '.join(sorted(duplicates))}")
+    return migrations
+
+
+def _applied(cur):
+    cur.execute("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version")
+    return {row[0]: row for row in cur.fetchall()}
+
+
+def migrate(shard=PRIMARY_SHARD, target=None):
+    """
+    Applies every migration not yet recorded in schema_migrations, in version
+    order, up to and including `target`. Stops at the first failure; earlier
+    migrations stay applied. Returns the names of the migrations applied.
+    """
+    conn = dedicated_connection(shard)
+    conn.autocommit = True
+    cur = conn.cursor()
+    done = []
+    try:
+        cur.execute("SELECT pg_advisory_lock(%s)", (ADVISORY_LOCK_KEY,))
+        cur.execute(CREATE_MIGRATIONS_TABLE)
+        applied = _applied(cur)
+        for migration in discover():
+            if migration.version in applied or (target and migration.version > target):
+                continue
+            logger.info("migrations: applying %s on %s", migration, shard)
+            start = time.perf_counter()
+            if migration.transactional:
+                conn.autocommit = False
+                try:
+                    migration.run(cur)
+                    _record(cur, migration, start)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    conn.autocommit = True
+            else:
+                migration.run(cur)
+                _record(cur, migration, start)
+            done.append(str(migration))
+    finally:
+        if not conn.closed:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_KEY,))
+        cur.close()
+        conn.close()
+    return done
+
+
+def _record(cur, migration, start):
+    cur.execute(
+        "INSERT INTO schema_migrations (version, name, checksum, duration_ms) VALUES (%s, %s, %s, %s)",
+        (migration.version, migration.name, migration.checksum, round((time.perf_counter() - start) * 1000, 1)),
+    )
+
+
+def status(shard=PRIMARY_SHARD):
+    """Every known migration with its state: applied, pending, or modified since it was applied."""
+    conn = dedicated_connection(shard)
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT to_regclass('schema_migrations')")
+        applied = _applied(cur) if cur.fetchone()[0] else {}
+    finally:
+        cur.close()
+        conn.close()
+
+    rows = []
+    for migration in discover():
+        row = applied.pop(migration.version, None)
+        if row is None:
+            state = "pending"
+        elif row[2] != migration.checksum:
+            state = "modified"
+        else:
+            state = "applied"
+        rows.append({"version": migration.version, "name": migration.name, "state": state,
+                     "applied_at": row[3].isoformat(timespec="seconds") if row else None})
+    # Recorded in the database but no longer in the tree
+    for version, name, _, applied_at in applied.values():
+        rows.append({"version": version, "name": name, "state": "missing",
+                     "applied_at": applied_at.isoformat(timespec="seconds")})
+    return sorted(rows, key=lambda r: r["version"])
+
+
+def _build_index(cur, name, table, columns):
+    cur.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (name,))
+    row = cur.fetchone()
+    if row and row[0]:
+        return
+    if row:
+        # Left invalid by an earlier build that failed or was interrupted
+        cur.execute(f"DROP INDEX CONCURRENTLY {name}")
+    cur.execute(f"CREATE INDEX CONCURRENTLY {name} ON {table} ({columns})")
+
+
+def create_index_concurrently(cur, table, columns):
+    """
+    Builds {table}_{columns}_idx without blocking writes. Postgres can't build
+    an index CONCURRENTLY on a partitioned table, so for those the index is
+    created ON ONLY the parent (instant, initially invalid), each partition's
+    index is built concurrently and attached, and the parent index becomes
+    valid once all are. Partitions created later get the index automatically
+    when they are attached. Needs an autocommit connection; safe to re-run.
+    """
+    suffix = "_".join(columns) + "_idx"
+    name = f"{table}_{suffix}"
+    column_list = ", ".join(columns)
+    if _relkind(cur, table) != "p":
+        _build_index(cur, name, table, column_list)
+        return
+
+    cur.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {table} ({column_list})")
+    cur.execute("RESET lock_timeout")
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname
+    """, (table,))
+    for (partition,) in cur.fetchall():
+        cur.execute("""
+            SELECT 1 FROM pg_inherits i JOIN pg_index x ON x.indexrelid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s) AND x.indrelid = to_regclass(%s)
+        """, (name, partition))
+        if cur.fetchone():
+            continue
+        child = f"{partition}_{suffix}"
+        _build_index(cur, child, partition, column_list)
+        cur.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+        cur.execute(f"ALTER INDEX {name} ATTACH PARTITION {child}")
+        cur.execute("RESET lock_timeout")
@@ -0,0 +1,225 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import psycopg2.errors
+from fastapi import HTTPException
+
+from app.core.config import ORDER_BATCH_MAX_AGE_HOURS
+from app.schemas.order import Order, OrderBatch, OrderBatchResult, OrderCreate, OrderItem
+from app.utils.closeout import business_date_of
+from app.utils.db_helper import UnitOfWork
+from app.utils.idempotency import idempotency
+from app.utils.kitchen_queue import kitchen
+from app.utils.reference_data import reference_data
+from app.utils.stock import stock
+
+# How far ahead of the server's clock a device's timestamp may be
+CLOCK_SKEW = timedelta(minutes=5)
+MAX_AGE = timedelta(hours=ORDER_BATCH_MAX_AGE_HOURS)
+
+RESERVE_ORDER_IDS = "SELECT nextval(pg_get_serial_sequence('orders', 'id')) FROM generate_series(1, %s)"
+
+KNOWN_RESERVATIONS = "SELECT id, party_size FROM reservations WHERE location_id = %s AND id = ANY(%s)"
+
+SETTLED_DATES = "SELECT business_date FROM daily_settlements WHERE location_id = %s AND business_date = ANY(%s)"
+
+INSERT_ORDERS = """
+    INSERT INTO orders (id, table_id, reservation_id, total_amount, status, location_id, created_at)
+    SELECT o.id, o.table_id, o.reservation_id, o.total_amount, 'pending', %s, o.created_at
+    FROM unnest(%s::int[], %s::int[], %s::int[], %s::numeric[], %s::timestamp[])
+        AS o(id, table_id, reservation_id, total_amount, created_at)
+    RETURNING id, updated_at
+"""
+
+# Items share their order's created_at, so they land in the same month's partition
+INSERT_ORDER_ITEMS = """
+    INSERT INTO order_items (order_id, menu_item_id, quantity, unit_price, notes, created_at)
+    SELECT * FROM unnest(%s::int[], %s::int[], %s::int[], %s::numeric[], %s::text[], %s::timestamp[])
+"""
+
+
+def _local(moment: datetime) -> datetime:
+    # Columns hold naive local time, like CURRENT_TIMESTAMP
+    return moment.astimezone().replace(tzinfo=None) if moment.tzinfo else moment
+
+
+class _Pending:
+    """One submitted order on its way through the batch."""
+
+    def __init__(self, order):
+        self.order = order
+        self.key = order.client_order_id
+        self.created_at = _local(order.created_at)
+        self.request_hash = idempotency.request_hash("create_order", OrderCreate(
+            table_id=order.table_id, reservation_id=order.reservation_id, items=order.items,
+        ))
+        self.total_amount = 0
+        self.items = []
+        self.counted = defaultdict(int)
+        self.error = None
+
+
+def _price(pending, reference, now):
+    order = pending.order
+    if pending.created_at > now + CLOCK_SKEW:
+        return "created_at is in the future"
+    if pending.created_at < now - MAX_AGE:
+        return f"created_at is more than {ORDER_BATCH_MAX_AGE_HOURS:g} hours ago"
+    if order.table_id not in reference.tables:
+        return "Table not found"
+    for item in order.items:
+        menu_item = reference.menu_items.get(item.menu_item_id)
+        if not menu_item:
+            return f"Menu item {item.menu_item_id} not found"
+        price = float(menu_item.price)
+        pending.total_amount += price * item.quantity
+        pending.items.append((item, price, menu_item.name))
+        if menu_item.stock_counted:
+            pending.counted[item.menu_item_id] += item.quantity
+    return None
+
+
+def ingest(batch: OrderBatch, location_id: int):
+    """
+    Creates the orders of an offline replay in one transaction. Each order's
+    client_order_id is its Idempotency-Key, shared with POST /api/orders/, so
+    an order that already reached the server (in an earlier batch, or as a
+    single request that timed out on the device) is reported as a duplicate
+    rather than created again. Orders are validated and priced against the
+    reference data as a set, with one query per check instead of one per
+    order, and inserted with one statement per table. Returns a result for
+    every submitted order, in submission order, the Orders created (already
+    queued in the kitchen), and the menu items that may have sold out (for
+    stock.sell_out()). The orders were
+    taken while offline, so they use up whatever stock is left but are never
+    rejected for lack of it.
+    """
+    now = datetime.now()
+    reference = reference_data.get(location_id)
+    submitted = [_Pending(order) for order in batch.orders]
+    # A client_order_id repeated within the batch is resolved by its first occurrence
+    first = {}
+    for pending in submitted:
+        first.setdefault(pending.key, pending)
+    unique = list(first.values())
+    for pending in unique:
+        pending.error = _price(pending, reference, now)
+
+    created = {}
+    bodies = {}
+    duplicates = {}
+    emptied = []
+    try:
+        with UnitOfWork() as uow:
+            claimed, stored = idempotency.claim_many(uow, location_id, {p.key: p.request_hash for p in unique})
+            for pending in unique:
+                if pending.key in stored:
+                    request_hash, _, body = stored[pending.key]
+                    if request_hash != pending.request_hash:
+                        pending.error = "client_order_id was already used for a different order"
+                    elif not (body and body.get("id")):
+                        # Claimed by a request that stored no order (yet), so there is nothing to point to
+                        pending.error = "client_order_id is already in use by another request, please resend it"
+                    else:
+                        # Already created, even if it wouldn't validate any more
+                        pending.error = None
+                        duplicates[pending.key] = body["id"]
+
+            candidates = [p for p in unique if p.key in claimed and p.error is None]
+            reservation_ids = list({p.order.reservation_id for p in candidates if p.order.reservation_id})
+            # reservation id -> party size
+            known = dict(uow.fetch_all(KNOWN_RESERVATIONS, (location_id, reservation_ids))) \
+                if reservation_ids else {}
+            dates = list({business_date_of(p.created_at) for p in candidates})
+            settled = {r[0] for r in uow.fetch_all(SETTLED_DATES, (location_id, dates))} if dates else set()
+            for pending in candidates:
+                if pending.order.reservation_id and pending.order.reservation_id not in known:
+                    pending.error = "Reservation not found"
+                elif business_date_of(pending.created_at) in settled:
+                    pending.error = "Business day already closed out"
+
+            # Failures aren't stored, so the device may correct and resend them
+            idempotency.release_many(uow, location_id, [p.key for p in unique if p.key in claimed and p.error])
+            accepted = [p for p in candidates if p.error is None]
+            if accepted:
+                created = _insert(uow, accepted, location_id)
+                counted = defaultdict(int)
+                for pending in accepted:
+                    for menu_item_id, quantity in pending.counted.items():
+                        counted[menu_item_id] += quantity
+                emptied = stock.take(uow, counted, partial=True)
+                bodies = idempotency.save_many(uow, location_id, created)
+    except psycopg2.errors.ForeignKeyViolation:
+        # A table or menu item was deleted after our copy of the reference data was taken
+        reference_data.invalidate(location_id)
+        raise HTTPException(status_code=409, detail="Tables or menu items changed during the batch, please resend it")
+
+    for key, body in bodies.items():
+        idempotency.remember((location_id, key), first[key].request_hash, 200, body)
+    for order in created.values():
+        kitchen.order_created(location_id, order, known.get(order.reservation_id))
+
+    results = []
+    for pending in submitted:
+        key = pending.key
+        owner = first[key]
+        if pending.request_hash != owner.request_hash:
+            result = OrderBatchResult(client_order_id=key, status="rejected",
+                                      error="client_order_id was already used for a different order")
+        elif owner.error is not None:
+            result = OrderBatchResult(client_order_id=key, status="rejected", error=owner.error)
+        elif key in created:
+            result = OrderBatchResult(client_order_id=key, status="created" if owner is pending else "duplicate",
+                                      order_id=created[key].id)
+        else:
+            result = OrderBatchResult(client_order_id=key, status="duplicate", order_id=duplicates[key])
+        results.append(result)
+    return results, list(created.values()), emptied
+
+
+def _insert(uow, accepted, location_id):
+    ids = [r[0] for r in uow.fetch_all(RESERVE_ORDER_IDS, (len(accepted),))]
+    rows = uow.fetch_all(INSERT_ORDERS, (
+        location_id,
+        ids,
+        [p.order.table_id for p in accepted],
+        [p.order.reservation_id for p in accepted],
+        [p.total_amount for p in accepted],
+        [p.created_at for p in accepted],
+    ))
+    updated_at = dict(rows)
+
+    items = [(order_id, p, item, price) for order_id, p in zip(ids, accepted) for item, price, _ in p.items]
+    if items:
+        uow.execute(INSERT_ORDER_ITEMS, (
+            [order_id for order_id, _, _, _ in items],
+            [item.menu_item_id for _, _, item, _ in items],
+            [item.quantity for _, _, item, _ in items],
+            [price for _, _, _, price in items],
+            [item.notes for _, _, item, _ in items],
+            [p.created_at for _, p, _, _ in items],
+        ))
+
+    created = {}
+    for order_id, pending in zip(ids, accepted):
+        created[pending.key] = Order(
+            id=order_id,
+            table_id=pending.order.table_id,
+            reservation_id=pending.order.reservation_id,
+            status='pending',
+            total_amount=pending.total_amount,
+            created_at=pending.created_at,
+            updated_at=updated_at[order_id],
+            items=[
+                OrderItem(
+                    id=0,
+                    order_id=order_id,
+                    menu_item_id=item.menu_item_id,
+                    quantity=item.quantity,
+                    unit_price=price,
+                    notes=item.notes,
+                    menu_item_name=name
+                ) for item, price, name in pending.items
+            ]
+        )
+    return created
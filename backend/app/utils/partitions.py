@@ -0,0 +1,285 @@
+import logging
+import os
+import re
+from datetime import date
+
+import psycopg2
+
+from app.core.config import ARCHIVE_SCHEMA, PARTITION_PREMAKE_MONTHS, PARTITION_RETENTION_MONTHS
+from app.core.database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "db", "schema.sql")
+
+# Partitioned table -> the timestamp column it is partitioned on
+PARTITIONED_TABLES = {
+    "orders": "created_at",
+    "order_items": "created_at",
+    "order_logs": "changed_at",
+    "payments": "payment_time",
+}
+
+# Partition DDL needs a brief exclusive lock on the parent. Give up rather
+# than queue behind a long-running query and block the service behind us.
+LOCK_TIMEOUT = "5s"
+
+PARTITION_SUFFIX = re.compile(r"_(\d{4})_(\d{2})$")
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    years, index = divmod(month.month - 1 + count, 12)
+    return date(month.year + years, index + 1, 1)
+
+
+def partition_name(table, month: date):
+    return f"{table}_{month:%Y_%m}"
+
+
+def _relkind(cur, table):
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _attached_months(cur, table):
+    """Monthly partitions currently attached to `table`, as {month: name}."""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+    """, (table,))
+    months = {}
+    for (name,) in cur.fetchall():
+        match = PARTITION_SUFFIX.search(name)
+        if match and name == partition_name(table, date(int(match[1]), int(match[2]), 1)):
+            months[date(int(match[1]), int(match[2]), 1)] = name
+    return months
+
+
+def _months_in(cur, table, source):
+    key = PARTITIONED_TABLES[table]
+    cur.execute(f"SELECT DISTINCT date_trunc('month', {key})::date FROM {source} WHERE {key} IS NOT NULL")
+    return {row[0] for row in cur.fetchall()}
+
+
+def _create_partition(cur, table, month):
+    """
+    Creates and attaches the partition for `month`, first moving any rows for
+    that month out of the default partition (attaching would fail otherwise).
+    """
+    key = PARTITIONED_TABLES[table]
+    name = partition_name(table, month)
+    start, end = month, add_months(month, 1)
+    cur.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+    cur.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM {table}_default WHERE {key} >= %s AND {key} < %s RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """, (start, end))
+    cur.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", (start, end))
+
+
+def _archive_partition(cur, table, name):
+    """
+    Detaches `name` and moves it to ARCHIVE_SCHEMA. If that month was already
+    archived (rows for it arrived later and recreated the partition), its
+    rows are added to the archived table instead. Returns the action taken.
+    """
+    cur.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+    cur.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+    archived = f"{ARCHIVE_SCHEMA}.{name}"
+    cur.execute("SELECT to_regclass(%s)", (archived,))
+    if cur.fetchone()[0] is None:
+        cur.execute(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}")
+        return f"archived {name} to {archived}"
+
+    # The archived copy has the columns the table had back then
+    cur.execute("""
+        SELECT string_agg(column_name, ', ' ORDER BY ordinal_position)
+        FROM information_schema.columns
+        WHERE table_schema = %s AND table_name = %s
+          AND column_name IN (
+              SELECT column_name FROM information_schema.columns
+              WHERE table_schema = current_schema() AND table_name = %s
+          )
+    """, (ARCHIVE_SCHEMA, name, name))
+    columns = cur.fetchone()[0]
+    cur.execute(f"SELECT COUNT(*) FROM {name}")
+    total = cur.fetchone()[0]
+    # Rows already in the archive (same primary key) are kept as archived
+    cur.execute(f"INSERT INTO {archived} ({columns}) SELECT {columns} FROM {name} ON CONFLICT DO NOTHING")
+    merged = cur.rowcount
+    cur.execute(f"DROP TABLE {name}")
+    return f"merged {merged} rows of {name} into {archived} ({total - merged} already archived)"
+
+
+def maintain(today: date = None):
+    """
+    Creates partitions for the current month and the next
+    PARTITION_PREMAKE_MONTHS months, plus any month that has rows waiting in a
+    default partition, then detaches partitions older than
+    PARTITION_RETENTION_MONTHS full months and moves them to ARCHIVE_SCHEMA.
+    Every partition is handled in its own short transaction. Returns a list
+    of the actions taken; a partition that can't be archived is reported as
+    "failed ..." and left attached for the next run.
+    """
+    current = month_start(today or date.today())
+    wanted = {add_months(current, n) for n in range(PARTITION_PREMAKE_MONTHS + 1)}
+    cutoff = add_months(current, -PARTITION_RETENTION_MONTHS)
+    actions = []
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+        conn.commit()
+        for table in PARTITIONED_TABLES:
+            if _relkind(cur, table) != "p":
+                raise RuntimeError(f"{table} is not partitioned; run `python partitions.py migrate` first")
+            attached = _attached_months(cur, table)
+            missing = (wanted | _months_in(cur, table, f"{table}_default")) - set(attached)
+            conn.commit()
+
+            for month in sorted(missing):
+                _create_partition(cur, table, month)
+                conn.commit()
+                attached[month] = partition_name(table, month)
+                actions.append(f"created {attached[month]}")
+
+            for month, name in sorted(attached.items()):
+                if month < cutoff:
+                    try:
+                        actions.append(_archive_partition(cur, table, name))
+                        conn.commit()
+                    except psycopg2.Error as e:
+                        conn.rollback()
+                        actions.append(f"failed to archive {name}: {str(e).strip()}")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+    for action in actions:
+        if action.startswith("failed"):
+            logger.error("partitions: %s", action)
+        else:
+            logger.info("partitions: %s", action)
+    return actions
+
+
+def ensure_partitions(first: date, last: date):
+    """
+    Creates any missing monthly partitions of every partitioned table from
+    the month of `first` through the month of `last`, e.g. ahead of a bulk
+    load of historical rows. Returns a list of the actions taken.
+    """
+    months = []
+    month = month_start(first)
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    actions = []
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        for table in PARTITIONED_TABLES:
+            attached = _attached_months(cur, table)
+            conn.commit()
+            for month in months:
+                if month not in attached:
+                    _create_partition(cur, table, month)
+                    conn.commit()
+                    actions.append(f"created {partition_name(table, month)}")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+    for action in actions:
+        logger.info("partitions: %s", action)
+    return actions
+
+
+def migrate(today: date = None):
+    """
+    One-off conversion of databases created before partitioning. The plain
+    tables are renamed, schema.sql creates the partitioned ones, the rows are
+    copied into monthly partitions and the old tables are dropped, all in a
+    single transaction that holds an exclusive lock on the four tables for
+    the duration of the copy. Tables that are already partitioned are left
+    alone. Finishes with a regular maintain() run.
+    """
+    actions = []
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        legacy = [t for t in PARTITIONED_TABLES if _relkind(cur, t) == "r"]
+        if legacy:
+            cur.execute(f"LOCK TABLE {', '.join(legacy)} IN ACCESS EXCLUSIVE MODE")
+            for table in legacy:
+                cur.execute(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned")
+                # Free the constraint names (orders_pkey, ..._fkey) for the new tables
+                cur.execute("SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s)", (f"{table}_unpartitioned",))
+                for (name,) in cur.fetchall():
+                    cur.execute(f"ALTER TABLE {table}_unpartitioned RENAME CONSTRAINT {name} TO {name}_unpartitioned")
+                # ...and the names of plain indexes, which schema.sql creates with IF NOT EXISTS
+                cur.execute("""
+                    SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE i.indrelid = to_regclass(%s) AND c.relname NOT LIKE '%%\\_unpartitioned'
+                """, (f"{table}_unpartitioned",))
+                for (name,) in cur.fetchall():
+                    cur.execute(f"ALTER INDEX {name} RENAME TO {name}_unpartitioned")
+
+            with open(SCHEMA_PATH, "r") as f:
+                cur.execute(f.read())
+
+            for table in legacy:
+                for month in sorted(_months_in(cur, table, f"{table}_unpartitioned")):
+                    _create_partition(cur, table, month)
+                cur.execute("""
+                    SELECT string_agg(column_name, ', ' ORDER BY ordinal_position)
+                    FROM information_schema.columns
+                    WHERE table_schema = current_schema() AND table_name = %s
+                      AND column_name IN (
+                          SELECT column_name FROM information_schema.columns
+                          WHERE table_schema = current_schema() AND table_name = %s
+                      )
+                """, (table, f"{table}_unpartitioned"))
+                columns = cur.fetchone()[0]
+                cur.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_unpartitioned")
+                actions.append(f"copied {cur.rowcount} rows into partitioned {table}")
+
+                cur.execute("SELECT pg_get_serial_sequence(%s, 'id')", (table,))
+                sequence = cur.fetchone()[0]
+                cur.execute(f"SELECT setval(%s, COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)", (sequence,))
+
+            cur.execute(f"DROP TABLE {', '.join(t + '_unpartitioned' for t in legacy)} CASCADE")
+
+            # schema.sql had to pick new sequence names while the old ones existed
+            for table in legacy:
+                cur.execute("SELECT pg_get_serial_sequence(%s, 'id')", (table,))
+                sequence = cur.fetchone()[0]
+                if sequence.split(".")[-1] != f"{table}_id_seq":
+                    cur.execute(f"ALTER SEQUENCE {sequence} RENAME TO {table}_id_seq")
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+    return actions + maintain(today)
@@ -0,0 +1,68 @@
+import psycopg2
+
+from app.core.database import get_db_connection
+from app.utils import query_log
+
+# Scanning a table this small sequentially is as cheap as an index lookup
+SEQ_SCAN_MIN_ROWS = 1000
+
+# EXPLAIN without ANALYZE plans these without running them
+EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+
+def _seq_scans(plan):
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", ()):
+        found += _seq_scans(child)
+    return found
+
+
+def _plan(cur, query, params, min_rows):
+    cur.execute("EXPLAIN (FORMAT JSON) " + query, params or ())
+    relations = sorted(set(_seq_scans(cur.fetchone()[0][0]["Plan"])))
+    if not relations:
+        return []
+    cur.execute("""
+        SELECT relname, reltuples::bigint FROM pg_class
+        WHERE relname = ANY(%s) AND reltuples >= %s
+        ORDER BY reltuples DESC
+    """, (relations, min_rows))
+    return [{"table": name, "rows": rows} for name, rows in cur.fetchall()]
+
+
+def find_seq_scans(min_rows=SEQ_SCAN_MIN_ROWS):
+    """
+    Plans the most recent call of every statement in the query log with its
+    real parameters and returns those whose plan reads a table of at least
+    `min_rows` rows (by planner statistics) with a sequential scan, i.e.
+    that no index serves. Partitions are reported individually.
+
+    Each statement is planned in its own savepoint: one that no longer
+    plans (a dropped table, a partition detached since it was logged) is
+    reported with an "error" instead of its scans and the rest still run.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    report = []
+    try:
+        for fid, statement, query, params in query_log.samples():
+            if not query.lstrip().upper().startswith(EXPLAINABLE):
+                continue
+            cur.execute("SAVEPOINT plan_check")
+            try:
+                large = _plan(cur, query, params, min_rows)
+            except psycopg2.Error as e:
+                cur.execute("ROLLBACK TO SAVEPOINT plan_check")
+                report.append({"id": fid, "statement": statement, "error": str(e).strip()})
+                continue
+            cur.execute("RELEASE SAVEPOINT plan_check")
+            if large:
+                report.append({"id": fid, "statement": statement, "seq_scans": large})
+    finally:
+        # Nothing was executed, but leave no transaction behind either
+        conn.rollback()
+        cur.close()
+        conn.close()
+    return report
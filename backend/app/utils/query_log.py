@@ -0,0 +1,148 @@
+import hashlib
+import logging
+import re
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from app.core.config import SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+
+# Latencies kept per fingerprint for percentile estimates.
+SAMPLE_SIZE = 512
+# Dynamically built statements (e.g. update_menu_item) could otherwise grow
+# the table without bound.
+MAX_FINGERPRINTS = 1000
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"%\(\w+\)s|%s")
+_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql: str) -> str:
+    """
+    Normalizes a statement so calls that differ only in literal values or
+    parameters aggregate together:
+    "WHERE status = 'paid' AND id IN (1, 2)" -> "WHERE status = ? AND id IN (?)"
+    """
+    text = _COMMENTS.sub(" ", sql)
+    text = _STRINGS.sub("?", text)
+    text = _PLACEHOLDERS.sub("?", text)
+    text = _NUMBERS.sub("?", text)
+    text = _IN_LISTS.sub("(?)", text)
+    return _WHITESPACE.sub(" ", text).strip().rstrip(";")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint_id(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def redact(params):
+    """Replaces parameter values with their type names before logging."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {k: f"<{type(v).__name__}>" for k, v in params.items()}
+    return [f"<{type(v).__name__}>" for v in params]
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    return ordered[int(round(pct / 100 * (len(ordered) - 1)))]
+
+
+class QueryStats:
+    __slots__ = ("id", "statement", "calls", "total", "max", "rows", "samples", "sample_query", "sample_params")
+
+    def __init__(self, statement):
+        self.id = fingerprint_id(statement)
+        self.statement = statement
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+        # Most recent concrete call, kept in memory only so EXPLAIN ANALYZE can
+        # be run on demand. Never logged or returned by the API.
+        self.sample_query = None
+        self.sample_params = None
+
+    def to_dict(self):
+        ordered = sorted(self.samples)
+        return {
+            "id": self.id,
+            "statement": self.statement,
+            "calls": self.calls,
+            "rows": self.rows,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total / self.calls * 1000, 3) if self.calls else 0.0,
+            "p50_ms": round(_percentile(ordered, 50) * 1000, 3),
+            "p95_ms": round(_percentile(ordered, 95) * 1000, 3),
+            "p99_ms": round(_percentile(ordered, 99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+_lock = threading.Lock()
+_stats: Dict[str, QueryStats] = {}
+
+
+def record(query: str, params, duration: float, rows: int):
+    """Called by the DB layer after every statement when the query log is enabled."""
+    if isinstance(query, bytes):
+        query = query.decode()
+    statement = fingerprint(query)
+    with _lock:
+        stats = _stats.get(statement)
+        if stats is None:
+            if len(_stats) >= MAX_FINGERPRINTS:
+                return
+            stats = _stats[statement] = QueryStats(statement)
+        stats.calls += 1
+        stats.total += duration
+        stats.rows += rows if rows > 0 else 0
+        if duration > stats.max:
+            stats.max = duration
+        stats.samples.append(duration)
+        stats.sample_query = query
+        stats.sample_params = params
+
+    if duration * 1000 >= SLOW_QUERY_MS:
+        logger.warning(
+            "slow query %s took %.1f ms: %s params=%s",
+            stats.id, duration * 1000, statement, redact(params),
+        )
+
+
+def snapshot():
+    with _lock:
+        rows = [stats.to_dict() for stats in _stats.values()]
+    return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+
+def get_sample(fid: str) -> Optional[Tuple[str, object]]:
+    """Returns the most recent (query, params) recorded for a fingerprint id."""
+    with _lock:
+        for stats in _stats.values():
+            if stats.id == fid:
+                return stats.sample_query, stats.sample_params
+    return None
+
+
+def samples():
+    """(fingerprint id, statement, query, params) of the most recent call of every fingerprint."""
+    with _lock:
+        return [(s.id, s.statement, s.sample_query, s.sample_params) for s in _stats.values()]
+
+
+def reset():
+    with _lock:
+        _stats.clear()
@@ -0,0 +1,199 @@
+import logging
+import select
+import threading
+import time
+from collections import namedtuple
+
+import psycopg2
+
+from app.core.config import REFERENCE_VERSION_CHECK_SECONDS
+from app.core.database import dedicated_connection, get_db_connection, shard_for_location, shard_names
+from app.core.locations import use_location
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "reference_data"
+# How often the listener wakes up to notice stop() or retry a lost connection
+LISTEN_POLL_SECONDS = 1.0
+LISTEN_RETRY_SECONDS = 5.0
+
+VERSION_QUERY = "SELECT version FROM reference_versions WHERE location_id = %s"
+TABLES_QUERY = "SELECT id, table_number, capacity, is_active FROM tables WHERE location_id = %s"
+MENU_ITEMS_QUERY = """
+    SELECT m.id, m.name, m.price, m.is_active, s.menu_item_id IS NOT NULL
+    FROM menu_items m LEFT JOIN item_stock s ON s.menu_item_id = m.id
+    WHERE m.location_id = %s
+"""
+
+TableRef = namedtuple("TableRef", "id table_number capacity is_active")
+# stock_counted: the item has a par level (app/utils/stock.py)
+MenuItemRef = namedtuple("MenuItemRef", "id name price is_active stock_counted")
+
+
+class Snapshot:
+    """One location's tables and menu items as of `version`. Read-only."""
+
+    def __init__(self, version, tables, menu_items):
+        self.version = version
+        self.tables = {t.id: t for t in tables}
+        self.table_numbers = {t.table_number: t.id for t in tables}
+        self.menu_items = {m.id: m for m in menu_items}
+        self.checked_at = time.monotonic()
+
+
+class ReferenceData:
+    """
+    Per-process copy of the tables and menu items the order and reservation
+    write paths validate against, so submitting an order needs no reads.
+    Triggers bump a per-location version and NOTIFY on every change (see
+    schema.sql). A background thread LISTENs on each database and drops the
+    snapshots of changed locations. For a database it isn't listening to
+    (thread not started, connection lost), get() compares the stored version
+    with the database every `check_interval` seconds instead.
+    """
+
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self.snapshots = {}
+        self.lock = threading.Lock()
+        # Bumped by every invalidation, so a load that raced one isn't stored
+        self.generation = 0
+        self.listening = set()
+        self.loads = 0
+        self.notifications = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, location_id) -> Snapshot:
+        snapshot = self.snapshots.get(location_id)
+        if snapshot is None or not self._is_current(location_id, snapshot):
+            snapshot = self._load(location_id)
+        return snapshot
+
+    def invalidate(self, location_id=None):
+        """Drops one location's snapshot, or every snapshot when location_id is None."""
+        with self.lock:
+            self.generation += 1
+            if location_id is None:
+                self.snapshots.clear()
+            else:
+                self.snapshots.pop(location_id, None)
+
+    def _is_current(self, location_id, snapshot):
+        if shard_for_location(location_id) in self.listening:
+            return True
+        now = time.monotonic()
+        if now - snapshot.checked_at < self.check_interval:
+            return True
+        with use_location(location_id):
+            conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute(VERSION_QUERY, (location_id,))
+            row = cur.fetchone()
+        finally:
+            cur.close()
+            conn.close()
+        if (row[0] if row else 0) != snapshot.version:
+            return False
+        snapshot.checked_at = now
+        return True
+
+    def _load(self, location_id):
+        generation = self.generation
+        with use_location(location_id):
+            conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            # Version first: data committed in between only makes the snapshot
+            # newer than its version, which costs a reload, never a stale read
+            cur.execute(VERSION_QUERY, (location_id,))
+            row = cur.fetchone()
+            cur.execute(TABLES_QUERY, (location_id,))
+            tables = [TableRef(*r) for r in cur.fetchall()]
+            cur.execute(MENU_ITEMS_QUERY, (location_id,))
+            menu_items = [MenuItemRef(*r) for r in cur.fetchall()]
+        finally:
+            cur.close()
+            conn.close()
+
+        snapshot = Snapshot(row[0] if row else 0, tables, menu_items)
+        with self.lock:
+            self.loads += 1
+            if self.generation == generation:
+                self.snapshots[location_id] = snapshot
+        return snapshot
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="reference-data", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _listen(self, shard):
+        conn = dedicated_connection(shard)
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute(f"LISTEN {CHANNEL}")
+        cur.close()
+        self.listening.add(shard)
+        # Anything that changed while we weren't listening went unnoticed
+        self.invalidate()
+        return conn
+
+    def _run(self):
+        connections = {}
+        retry_at = {}
+        while not self._stop.is_set():
+            now = time.monotonic()
+            for shard in shard_names():
+                if shard in connections or now < retry_at.get(shard, 0):
+                    continue
+                try:
+                    connections[shard] = self._listen(shard)
+                except psycopg2.Error as e:
+                    retry_at[shard] = now + LISTEN_RETRY_SECONDS
+                    logger.warning("reference data: cannot listen on %s: %s", shard, str(e).strip())
+
+            if not connections:
+                self._stop.wait(LISTEN_POLL_SECONDS)
+                continue
+            ready, _, _ = select.select(list(connections.values()), [], [], LISTEN_POLL_SECONDS)
+            for shard, conn in list(connections.items()):
+                if conn not in ready:
+                    continue
+                try:
+                    conn.poll()
+                except psycopg2.Error as e:
+                    self.listening.discard(shard)
+                    del connections[shard]
+                    retry_at[shard] = time.monotonic() + LISTEN_RETRY_SECONDS
+                    logger.warning("reference data: lost listener on %s: %s", shard, str(e).strip())
+                    conn.close()
+                    continue
+                while conn.notifies:
+                    payload = conn.notifies.pop(0).payload
+                    self.notifications += 1
+                    self.invalidate(None if payload == "*" else int(payload))
+
+        self.listening.clear()
+        for conn in connections.values():
+            conn.close()
+
+    def status(self):
+        return {
+            "locations": sorted(self.snapshots),
+            "listening": sorted(self.listening),
+            "loads": self.loads,
+            "notifications": self.notifications,
+        }
+
+
+reference_data = ReferenceData(REFERENCE_VERSION_CHECK_SECONDS)
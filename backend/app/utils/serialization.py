@@ -0,0 +1,71 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+from app.core.config import FAST_RESPONSES
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+
+def _default(value):
+    # Mirrors pydantic's JSON mode for the types our rows contain, so the
+    # output is byte-identical to a response_model round trip.
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
+    # Same settings as starlette's JSONResponse.render
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+class MsgPackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content) -> bytes:
+        return msgpack.packb(content, default=_default, use_bin_type=True)
+
+
+def fast_response(content, request: Request = None):
+    """
+    Renders already JSON-shaped data (dicts built straight from DB rows, in
+    response_model field order) without a second pass through response_model
+    validation and jsonable_encoder.
+
+    Clients sending "Accept: application/msgpack" get MessagePack when the
+    msgpack package is installed. With FAST_RESPONSES disabled the content is
+    returned as-is and FastAPI validates and encodes it as usual.
+    """
+    if not FAST_RESPONSES:
+        return content
+    if msgpack is not None and request is not None and MSGPACK_MEDIA_TYPE in request.headers.get("accept", ""):
+        return MsgPackResponse(content)
+    return FastJSONResponse(content)
@@ -0,0 +1,295 @@
+from datetime import datetime
+
+from app.core.config import STOCK_COUNTER_SHARDS
+from app.utils.closeout import business_date_of
+from app.utils.db_helper import PreparedStatement, UnitOfWork
+
+# Takes the quantity from one shard that has enough and isn't locked by
+# another open order, so concurrent orders for an item don't queue on a row.
+# Picked once in a materialized CTE: as a subquery in FROM the planner may
+# rescan it per shard row, picking (and decrementing) a different one each time
+TAKE_FROM_SHARD = PreparedStatement("take_stock", """
+    WITH free AS MATERIALIZED (
+        SELECT menu_item_id, shard FROM item_stock_shards
+        WHERE menu_item_id = %s AND remaining >= %s
+        ORDER BY random() LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE item_stock_shards s SET remaining = s.remaining - %s
+    FROM free
+    WHERE s.menu_item_id = free.menu_item_id AND s.shard = free.shard
+    RETURNING s.remaining
+""")
+
+LOCK_SHARDS = "SELECT shard, remaining FROM item_stock_shards WHERE menu_item_id = %s ORDER BY shard FOR UPDATE"
+
+ITEM_COUNTED = "SELECT 1 FROM item_stock WHERE menu_item_id = %s"
+
+SET_SHARDS = """
+    UPDATE item_stock_shards s SET remaining = n.remaining
+    FROM unnest(%s::smallint[], %s::int[]) AS n(shard, remaining)
+    WHERE s.menu_item_id = %s AND s.shard = n.shard
+"""
+
+# Deactivates the listed items that are counted, active and out of stock
+SELL_OUT = """
+    WITH sold_out AS (
+        UPDATE menu_items m SET is_active = false
+        WHERE m.id IN (SELECT menu_item_id FROM item_stock WHERE menu_item_id = ANY(%s))
+          AND m.is_active
+          AND NOT EXISTS (SELECT 1 FROM item_stock_shards h WHERE h.menu_item_id = m.id AND h.remaining > 0)
+        RETURNING m.id
+    )
+    UPDATE item_stock s SET sold_out = true FROM sold_out WHERE s.menu_item_id = sold_out.id
+    RETURNING s.menu_item_id
+"""
+
+# Counters last filled before `business_date`; the row locks make a
+# concurrent refill of the same items wait, then skip them
+DUE_FOR_REFILL = """
+    UPDATE item_stock SET business_date = %s
+    WHERE location_id = %s AND business_date < %s
+    RETURNING menu_item_id, par_level, sold_out
+"""
+
+REFILL_ITEMS = """
+    UPDATE item_stock SET business_date = %s
+    WHERE location_id = %s AND (%s::int[] IS NULL OR menu_item_id = ANY(%s))
+    RETURNING menu_item_id, par_level, sold_out
+"""
+
+SET_PAR_LEVEL = """
+    INSERT INTO item_stock (menu_item_id, location_id, par_level, business_date)
+    SELECT id, location_id, %s, %s FROM menu_items WHERE id = %s AND location_id = %s
+    ON CONFLICT (menu_item_id) DO UPDATE SET par_level = EXCLUDED.par_level
+    RETURNING menu_item_id
+"""
+
+STOP_COUNTING = """
+    DELETE FROM item_stock WHERE menu_item_id = %s AND location_id = %s
+    RETURNING menu_item_id, par_level, sold_out
+"""
+
+# Locked in the order orders take them, before they are refilled
+LOCK_ITEM_SHARDS = """
+    SELECT 1 FROM item_stock_shards WHERE menu_item_id = ANY(%s) ORDER BY menu_item_id, shard FOR UPDATE
+"""
+
+# Refilled in place: an order waiting on a shard's lock then reads the new
+# count, where a deleted and reinserted row would just vanish from its view
+FILL_SHARDS = """
+    INSERT INTO item_stock_shards (menu_item_id, shard, remaining)
+    SELECT * FROM unnest(%s::int[], %s::smallint[], %s::int[])
+    ON CONFLICT (menu_item_id, shard) DO UPDATE SET remaining = EXCLUDED.remaining
+"""
+
+# Left over from a larger STOCK_COUNTER_SHARDS
+DELETE_EXTRA_SHARDS = "DELETE FROM item_stock_shards WHERE menu_item_id = ANY(%s) AND shard >= %s"
+
+CLEAR_SOLD_OUT = "UPDATE item_stock SET sold_out = false WHERE menu_item_id = ANY(%s)"
+
+REACTIVATE = "UPDATE menu_items SET is_active = true WHERE id = ANY(%s) AND NOT is_active RETURNING id"
+
+STOCK_LEVELS = """
+    SELECT s.menu_item_id, m.name, s.par_level, COALESCE(SUM(h.remaining), 0)::int, m.is_active, s.sold_out
+    FROM item_stock s
+    JOIN menu_items m ON m.id = s.menu_item_id
+    LEFT JOIN item_stock_shards h ON h.menu_item_id = s.menu_item_id
+    WHERE s.location_id = %s AND (%s::int IS NULL OR s.menu_item_id = %s)
+    GROUP BY s.menu_item_id, m.name, m.is_active
+    ORDER BY m.name
+"""
+
+
+class OutOfStock(Exception):
+    """Raised by StockCounters.take() when an item has less left than ordered."""
+
+    def __init__(self, menu_item_id, available):
+        super().__init__(menu_item_id, available)
+        self.menu_item_id = menu_item_id
+        self.available = available
+
+
+def _split(quantity, shards):
+    base, extra = divmod(quantity, shards)
+    return [base + (1 if shard < extra else 0) for shard in range(shards)]
+
+
+def _availability(menu_item_id, is_active, remaining):
+    return {"menu_item_id": menu_item_id, "is_active": is_active, "remaining": remaining}
+
+
+class StockCounters:
+    """
+    Stock counts for menu items given a daily par level (86-ing). Each
+    counted item's remaining stock is split over `shards` rows of
+    item_stock_shards. An order takes its quantity from one shard, picked at
+    random among those not locked by another open order, in the order's own
+    transaction, so the stock is only spent if the order commits and busy
+    items don't serialize submissions. Only when no single free shard has
+    enough does the order lock all of the item's shards and take from
+    several; if they hold too little in total the order is rejected. An item
+    whose stock runs out is deactivated, and reactivated when its counters
+    are refilled: on the first order of each business day, or on demand.
+    Functions that change availability return it as
+    {"menu_item_id", "is_active", "remaining"} dicts for the caller to
+    publish (see app/api/menu.py publish_availability).
+    """
+
+    def __init__(self, shards: int):
+        self.shards = shards
+        # location_id -> business date its counters were last checked for a refill
+        self.refilled = {}
+        self.taken = 0
+        self.spread = 0
+        self.rejected = 0
+        self.sold_out = 0
+
+    def take(self, uow, quantities, partial=False):
+        """
+        Takes {menu_item_id: quantity} of counted items in `uow`'s
+        transaction. Raises OutOfStock when an item has less left, unless
+        `partial`, which takes whatever is left instead (for orders that
+        were already served). Returns the ids of items that may now be sold
+        out, to pass to sell_out() once the transaction has committed.
+        """
+        emptied = []
+        # In id order, so two orders never wait on each other's shards in a cycle
+        for menu_item_id in sorted(quantities):
+            quantity = quantities[menu_item_id]
+            row = uow.fetch_one(TAKE_FROM_SHARD, (menu_item_id, quantity, quantity))
+            if row:
+                remaining = row[0]
+            else:
+                remaining = self._take_spread(uow, menu_item_id, quantity, partial)
+            self.taken += 1
+            if remaining == 0:
+                emptied.append(menu_item_id)
+        return emptied
+
+    def _take_spread(self, uow, menu_item_id, quantity, partial):
+        rows = uow.fetch_all(LOCK_SHARDS, (menu_item_id,))
+        if not rows:
+            if uow.fetch_one(ITEM_COUNTED, (menu_item_id,)):
+                # Counters are only ever refilled in place, so this would sell the item uncounted
+                raise RuntimeError(f"Menu item {menu_item_id} has a par level but no stock counters")
+            # No longer counted
+            return None
+        self.spread += 1
+        available = sum(remaining for _, remaining in rows)
+        if available < quantity:
+            if not partial:
+                self.rejected += 1
+                raise OutOfStock(menu_item_id, available)
+            quantity = available
+        left = quantity
+        shards, remaining = [], []
+        for shard, count in rows:
+            used = min(count, left)
+            left -= used
+            shards.append(shard)
+            remaining.append(count - used)
+        uow.execute(SET_SHARDS, (shards, remaining, menu_item_id))
+        return available - quantity
+
+    def sell_out(self, menu_item_ids):
+        """
+        Deactivates those of the items take() returned that have no stock
+        left. Runs after the orders that took the stock have committed: of
+        two orders emptying an item's last shards concurrently, the one that
+        commits last sees both shards empty.
+        """
+        if not menu_item_ids:
+            return []
+        with UnitOfWork() as uow:
+            rows = uow.fetch_all(SELL_OUT, (list(menu_item_ids),))
+        self.sold_out += len(rows)
+        return [_availability(r[0], False, 0) for r in rows]
+
+    def refill_due(self, location_id, now=None):
+        """Whether refill_if_due() has work to do; a dict lookup, so callers on the event loop can check first."""
+        return self.refilled.get(location_id) != business_date_of(now or datetime.now())
+
+    def refill_if_due(self, location_id, now=None):
+        """
+        Refills the location's counters to par on the first call of each
+        business day. Afterwards a dict lookup, until the day changes.
+        """
+        today = business_date_of(now or datetime.now())
+        if self.refilled.get(location_id) == today:
+            return []
+        with UnitOfWork() as uow:
+            changes = self._fill(uow, uow.fetch_all(DUE_FOR_REFILL, (today, location_id, today)))
+        self.refilled[location_id] = today
+        return changes
+
+    def refill(self, location_id, menu_item_ids=None):
+        """Refills counters to par now (all of the location's, or the listed items'), e.g. after a delivery."""
+        today = business_date_of(datetime.now())
+        with UnitOfWork() as uow:
+            return self._fill(uow, uow.fetch_all(REFILL_ITEMS, (today, location_id, menu_item_ids, menu_item_ids)))
+
+    def set_par_level(self, location_id, menu_item_id, par_level):
+        """
+        Starts or stops counting an item (par_level None), refilling its
+        counter to the new par level. Returns None for an unknown item,
+        otherwise the availability changes.
+        """
+        with UnitOfWork() as uow:
+            if par_level is None:
+                row = uow.fetch_one(STOP_COUNTING, (menu_item_id, location_id))
+                if row is None:
+                    return None
+                # No longer counted, so no longer sold out
+                return self._restock(uow, [row[0]] if row[2] else [], {})
+            today = business_date_of(datetime.now())
+            if uow.fetch_one(SET_PAR_LEVEL, (par_level, today, menu_item_id, location_id)) is None:
+                return None
+            return self._fill(uow, uow.fetch_all(REFILL_ITEMS, (today, location_id, [menu_item_id], [menu_item_id])))
+
+    def _fill(self, uow, rows):
+        # rows: (menu_item_id, par_level, sold_out)
+        if not rows:
+            return []
+        rows = sorted(rows)
+        ids = [r[0] for r in rows]
+        uow.execute(LOCK_ITEM_SHARDS, (ids,))
+        items, shards, counts = [], [], []
+        for menu_item_id, par_level, _ in rows:
+            for shard, count in enumerate(_split(par_level, self.shards)):
+                items.append(menu_item_id)
+                shards.append(shard)
+                counts.append(count)
+        uow.execute(FILL_SHARDS, (items, shards, counts))
+        uow.execute(DELETE_EXTRA_SHARDS, (ids, self.shards))
+
+        par_levels = {r[0]: r[1] for r in rows}
+        changes = self._restock(uow, [r[0] for r in rows if r[2] and r[1] > 0], par_levels)
+        empty = [r[0] for r in rows if r[1] == 0]
+        if empty:
+            changes += [_availability(r[0], False, 0) for r in uow.fetch_all(SELL_OUT, (empty,))]
+        return changes
+
+    def _restock(self, uow, menu_item_ids, par_levels):
+        if not menu_item_ids:
+            return []
+        uow.execute(CLEAR_SOLD_OUT, (menu_item_ids,))
+        rows = uow.fetch_all(REACTIVATE, (menu_item_ids,))
+        return [_availability(r[0], True, par_levels.get(r[0])) for r in rows]
+
+    def levels(self, location_id, menu_item_id=None):
+        """(menu_item_id, name, par_level, remaining, is_active, sold_out) of the location's counted items."""
+        with UnitOfWork() as uow:
+            return uow.fetch_all(STOCK_LEVELS, (location_id, menu_item_id, menu_item_id))
+
+    def status(self):
+        return {
+            "shards": self.shards,
+            "taken": self.taken,
+            "spread": self.spread,
+            "rejected": self.rejected,
+            "sold_out": self.sold_out,
+        }
+
+
+stock = StockCounters(STOCK_COUNTER_SHARDS)
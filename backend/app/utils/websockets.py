@@ -1,19 +1,32 @@
-from typing import List
+from typing import Dict, List
 from fastapi import WebSocket
+from app.core.locations import get_location_id
 
 class ConnectionManager:
+    """
+    WebSocket clients grouped into one channel per location, so a location's
+    kitchen displays only receive that location's events.
+    """
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.channels: Dict[int, List[WebSocket]] = {}
 
-    async def connect(self, websocket: WebSocket):
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return [ws for channel in self.channels.values() for ws in channel]
+
+    async def connect(self, websocket: WebSocket, location_id: int = None):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.channels.setdefault(location_id or get_location_id(), []).append(websocket)
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+    def disconnect(self, websocket: WebSocket, location_id: int = None):
+        location_id = location_id or get_location_id()
+        channel = self.channels.get(location_id, [])
+        channel.remove(websocket)
+        if not channel:
+            self.channels.pop(location_id, None)
 
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
+    async def broadcast(self, message: dict, location_id: int = None):
+        for connection in list(self.channels.get(location_id or get_location_id(), ())):
             try:
                 await connection.send_json(message)
             except Exception:
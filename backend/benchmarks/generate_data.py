@@ -0,0 +1,525 @@
+"""
+Synthetic data generator.
+
+Fills a location with menu items, tables, reservations and order history at
+production-like volumes, so get_orders, analytics, availability and the
+closeout can be measured against realistic data:
+
+    menu items   categories with their own price ranges; a few discontinued
+    tables       2/4/6/8 seats over several areas
+    reservations fixed non-overlapping seatings, busier on weekend evenings,
+                 reaching --future-days past --end
+    orders       lunch and dinner peaks, weekly and seasonal swings, slow
+                 growth; items drawn from a Zipf-like popularity curve
+    order_items, order_logs, payments
+                 full kitchen lifecycle per order, cancellations, split
+                 bills and a few unpaid orders; the newest --open-orders
+                 orders are still in progress
+
+Rows are generated and COPYed in parallel chunks of whole days, one database
+connection per worker. Every day is generated from its own seed, so the same
+--seed, --end and volumes always produce the same rows regardless of
+--workers and --chunk-size. Orders and reservations get consecutive ids in
+time order; ids of order items, logs and payments follow load order.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.generate_data --scale small
+    python -m benchmarks.generate_data --scale production --end 2026-10-01 --reset
+    python -m benchmarks.generate_data --orders 5000000 --days 365 --workers 16 --location 2
+
+Without --reset the generated rows are added next to the existing ones.
+--reset empties menu items, tables, reservations and the order tables for
+every location in the target database first. Run it against a database that
+isn't serving traffic: ids are reserved up front and the load commits with
+synchronous_commit off.
+"""
+import argparse
+import io
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from psycopg2.extras import execute_values
+
+from app.core.config import DEFAULT_LOCATION_ID, PARTITION_RETENTION_MONTHS
+from app.core.database import get_db_connection
+from app.core.locations import use_location
+from app.utils.partitions import add_months, ensure_partitions, month_start
+
+SCALES = {
+    "small": {"tables": 12, "menu_items": 60, "orders": 20_000, "days": 60, "reservation_days": 180},
+    "medium": {"tables": 30, "menu_items": 200, "orders": 300_000, "days": 180, "reservation_days": 365},
+    "production": {"tables": 50, "menu_items": 500, "orders": 2_000_000, "days": 365, "reservation_days": 1095},
+}
+
+# name, share of the menu, price range, dish adjectives, dish nouns
+CATEGORIES = [
+    ("Appetizers", 0.15, (7, 16),
+     ["Crispy", "Smoked", "Spicy", "Garlic", "Stuffed", "Glazed", "Grilled", "Honey"],
+     ["Calamari", "Wings", "Shrimp", "Mushrooms", "Dumplings", "Sliders", "Croquettes", "Nachos"]),
+    ("Salads", 0.10, (9, 17),
+     ["Classic", "Greek", "Harvest", "Roasted", "Citrus", "Garden", "Warm", "Asian"],
+     ["Caesar", "Cobb", "Quinoa Bowl", "Beet Salad", "Kale Salad", "Spinach Salad", "Chopped Salad", "Nicoise"]),
+    ("Main Course", 0.25, (18, 45),
+     ["Grilled", "Pan-Seared", "Braised", "Roasted", "Blackened", "Herb-Crusted", "Slow-Cooked", "Char-Grilled"],
+     ["Ribeye", "Salmon", "Chicken", "Short Rib", "Pork Chop", "Sea Bass", "Lamb Shank", "Duck Breast"]),
+    ("Burgers & Sandwiches", 0.12, (12, 20),
+     ["Classic", "Bacon", "Mushroom Swiss", "BBQ", "Crispy", "Spicy", "Smash", "Pulled"],
+     ["Burger", "Cheeseburger", "Chicken Sandwich", "Club", "Melt", "Wrap", "Pork Sandwich", "Veggie Burger"]),
+    ("Pizza & Pasta", 0.15, (14, 24),
+     ["Margherita", "Pepperoni", "Truffle", "Four Cheese", "Pesto", "Arrabbiata", "Carbonara", "Primavera"],
+     ["Pizza", "Flatbread", "Fettuccine", "Penne", "Linguine", "Rigatoni", "Gnocchi", "Lasagna"]),
+    ("Desserts", 0.08, (6, 12),
+     ["Chocolate", "Vanilla", "Salted Caramel", "Lemon", "Berry", "Espresso", "Pistachio", "Coconut"],
+     ["Cheesecake", "Lava Cake", "Tiramisu", "Tart", "Sundae", "Panna Cotta", "Brownie", "Creme Brulee"]),
+    ("Beverages", 0.15, (2.5, 9),
+     ["Craft", "Iced", "Fresh", "Sparkling", "House", "Frozen", "Hot", "Mint"],
+     ["Lemonade", "Tea", "Coffee", "Soda", "Juice", "Smoothie", "Latte", "Spritzer"]),
+]
+
+# Share of menu items that were discontinued halfway through the history
+DISCONTINUED_SHARE = 0.05
+# Popularity of the n-th most popular item is proportional to 1 / n**ZIPF_EXPONENT
+ZIPF_EXPONENT = 1.1
+
+TABLE_CAPACITIES = [(2, 0.3), (4, 0.45), (6, 0.15), (8, 0.1)]
+TABLE_AREAS = [("main_hall", 0.55), ("terrace", 0.2), ("bar", 0.15), ("private_room", 0.1)]
+
+# Orders per day relative to the weekly average, Monday first
+WEEKDAY_WEIGHTS = [0.75, 0.8, 0.9, 1.0, 1.35, 1.5, 1.1]
+# Busiest in early summer, quietest in early winter
+SEASONAL_AMPLITUDE = 0.12
+# Daily volume at the start of the history relative to its end
+GROWTH_START = 0.85
+# Day-to-day noise (sigma of a log-normal factor)
+DAILY_NOISE = 0.12
+
+# (peak hour, spread in hours, share of the day's orders)
+SERVICE_PEAKS = [(12.75, 0.9, 0.35), (19.5, 1.4, 0.65)]
+OPEN_HOUR, CLOSE_HOUR = 11.0, 23.5
+
+# Minutes between kitchen steps: (low, high)
+PREPARING_AFTER = (1, 6)
+READY_AFTER = (8, 30)
+SERVED_AFTER = (1, 6)
+PAID_AFTER = (20, 80)
+CANCEL_RATE = 0.03
+UNPAID_RATE = 0.01
+SPLIT_BILL_RATE = 0.12
+PAYMENT_METHODS = [("card", 0.65), ("cash", 0.25), ("online", 0.10)]
+OPEN_STATUSES = ["pending", "preparing", "ready", "served"]
+
+# Seatings per table and day, 90 minutes each so they never overlap
+SEATINGS = [((12, 0), 0.4), ((17, 30), 0.8), ((19, 15), 1.0), ((21, 0), 0.5)]
+RESERVATION_MINUTES = 90
+RESERVATION_CANCEL_RATE = 0.08
+FIRST_NAMES = ["Alex", "Sam", "Jordan", "Taylor", "Morgan", "Casey", "Riley", "Jamie", "Avery", "Quinn",
+               "Maria", "David", "Aisha", "Chen", "Lucas", "Sofia", "Omar", "Emma", "Noah", "Priya"]
+LAST_NAMES = ["Smith", "Garcia", "Chen", "Patel", "Kim", "Nguyen", "Muller", "Rossi", "Silva", "Johnson",
+              "Brown", "Lopez", "Khan", "Ivanova", "Tanaka", "Dubois", "Cohen", "Novak", "Okafor", "Larsen"]
+
+ORDER_COLUMNS = ("id", "table_id", "status", "total_amount", "created_at", "updated_at", "location_id")
+ITEM_COLUMNS = ("order_id", "menu_item_id", "quantity", "unit_price", "created_at")
+LOG_COLUMNS = ("order_id", "old_status", "new_status", "changed_at")
+PAYMENT_COLUMNS = ("order_id", "amount", "payment_method", "transaction_id", "payment_time", "location_id")
+RESERVATION_COLUMNS = ("id", "table_id", "customer_name", "customer_phone", "reservation_time", "party_size",
+                       "duration_minutes", "status", "created_at", "location_id")
+
+# Truncated by --reset; categories are shared and only ever added to
+RESET_TABLES = ["order_items", "order_logs", "payments", "orders", "reservations", "tables", "menu_items"]
+
+
+def day_rng(seed, kind, day):
+    return random.Random(f"{seed}:{kind}:{day.isoformat()}")
+
+
+def weighted(rng, choices):
+    return rng.choices([c for c, _ in choices], weights=[w for _, w in choices])[0]
+
+
+def money(cents):
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
+def copy_field(value):
+    return "\\N" if value is None else str(value)
+
+
+class Buffer:
+    """Rows for one table, in COPY text format."""
+
+    def __init__(self, table, columns):
+        self.table = table
+        self.columns = columns
+        self.data = io.StringIO()
+        self.rows = 0
+
+    def add(self, *values):
+        self.data.write("\t".join(map(copy_field, values)))
+        self.data.write("\n")
+        self.rows += 1
+
+    def copy(self, cur):
+        self.data.seek(0)
+        cur.copy_from(self.data, self.table, columns=self.columns)
+
+
+def daily_order_counts(seed, days, total):
+    """Splits `total` orders over `days` by weekday, season, growth and noise."""
+    rng = random.Random(f"{seed}:volume")
+    weights = []
+    for index, day in enumerate(days):
+        season = 1 + SEASONAL_AMPLITUDE * math.sin(2 * math.pi * (day.timetuple().tm_yday - 80) / 365)
+        growth = GROWTH_START + (1 - GROWTH_START) * index / max(1, len(days) - 1)
+        weights.append(WEEKDAY_WEIGHTS[day.weekday()] * season * growth * rng.lognormvariate(0, DAILY_NOISE))
+    scale = total / sum(weights)
+    counts = [int(w * scale) for w in weights]
+    # Hand the rounding remainder to the days that lost the most to it
+    by_remainder = sorted(range(len(days)), key=lambda i: counts[i] - weights[i] * scale)
+    for i in by_remainder[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+def order_time(rng, day):
+    while True:
+        hour, spread, _ = rng.choices(SERVICE_PEAKS, weights=[p[2] for p in SERVICE_PEAKS])[0]
+        hours = rng.gauss(hour, spread)
+        if OPEN_HOUR <= hours < CLOSE_HOUR:
+            return datetime.combine(day, datetime.min.time()) + timedelta(hours=hours)
+
+
+def after(rng, moment, minutes):
+    return moment + timedelta(minutes=rng.uniform(*minutes))
+
+
+# Set in each worker by init_worker
+ctx = None
+
+
+def init_worker(context):
+    global ctx
+    ctx = context
+
+
+def generate_orders(rng, day, count, first_id, open_from, buffers):
+    orders, items, logs, payments = buffers
+    menu = ctx["menu"] if day >= ctx["discontinued_after"] else ctx["full_menu"]
+    menu_ids, prices, cum_weights = menu
+    tables = ctx["tables"]
+    location_id = ctx["location_id"]
+
+    for offset, created_at in enumerate(sorted(order_time(rng, day) for _ in range(count))):
+        order_id = first_id + offset
+        table_id, capacity = rng.choice(tables)
+        party = rng.randint(max(1, capacity - 3), capacity)
+
+        lines = {}
+        for index in rng.choices(range(len(menu_ids)), cum_weights=cum_weights, k=party + rng.randint(0, party)):
+            lines[index] = lines.get(index, 0) + 1
+        total = 0
+        for index, quantity in lines.items():
+            total += prices[index] * quantity
+            items.add(order_id, menu_ids[index], quantity, money(prices[index]), created_at)
+
+        # The newest orders are still being worked on: the newer, the earlier the step
+        if order_id >= open_from:
+            steps = OPEN_STATUSES[:len(OPEN_STATUSES) - (order_id - open_from) * len(OPEN_STATUSES) // ctx["open_orders"]]
+        elif rng.random() < CANCEL_RATE:
+            steps = rng.choice([["pending"], ["pending", "preparing"]]) + ["cancelled"]
+        elif rng.random() < UNPAID_RATE:
+            steps = OPEN_STATUSES
+        else:
+            steps = OPEN_STATUSES + ["paid"]
+
+        moment = created_at
+        for old, new in zip(steps, steps[1:]):
+            if new == "cancelled":
+                moment = after(rng, moment, (1, 15))
+            else:
+                moment = after(rng, moment, {
+                    "preparing": PREPARING_AFTER, "ready": READY_AFTER, "served": SERVED_AFTER, "paid": PAID_AFTER,
+                }[new])
+            logs.add(order_id, old, new, moment)
+
+        if steps[-1] == "paid":
+            shares = rng.randint(2, min(4, party)) if party > 1 and rng.random() < SPLIT_BILL_RATE else 1
+            share = total // shares
+            for n in range(shares):
+                method = weighted(rng, PAYMENT_METHODS)
+                transaction_id = None if method == "cash" else f"txn_{rng.getrandbits(48):012x}"
+                amount = share if n < shares - 1 else total - share * (shares - 1)
+                payments.add(order_id, money(amount), method, transaction_id, moment, location_id)
+
+        orders.add(order_id, table_id, steps[-1], money(total), created_at, moment, location_id)
+
+
+def booked_seatings(seed, day, tables, fill):
+    """(table, seating) pairs reserved on `day`, in reservation id order."""
+    rng = day_rng(seed, "seatings", day)
+    fill *= WEEKDAY_WEIGHTS[day.weekday()]
+    return [
+        (table, seating)
+        for table in tables
+        for seating in SEATINGS
+        if rng.random() < fill * seating[1]
+    ]
+
+
+def generate_reservations(rng, day, first_id, buffer):
+    location_id = ctx["location_id"]
+    seatings = booked_seatings(ctx["seed"], day, ctx["tables"], ctx["reservation_fill"])
+    for reservation_id, ((table_id, capacity), ((hour, minute), _)) in enumerate(seatings, first_id):
+        at = datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=minute)
+        cancelled = rng.random() < RESERVATION_CANCEL_RATE
+        buffer.add(
+            reservation_id, table_id,
+            f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", f"+1-555-{rng.randint(0, 9999999):07d}",
+            at, rng.randint(max(1, capacity - 3), capacity), RESERVATION_MINUTES,
+            "cancelled" if cancelled else "confirmed",
+            at - timedelta(hours=rng.uniform(1, 24 * 21)), location_id,
+        )
+
+
+def load_chunk(task):
+    """Generates and COPYs one chunk of days. Runs in a worker process."""
+    kind, days = task
+    started = time.perf_counter()
+    if kind == "orders":
+        buffers = (
+            Buffer("orders", ORDER_COLUMNS), Buffer("order_items", ITEM_COLUMNS),
+            Buffer("order_logs", LOG_COLUMNS), Buffer("payments", PAYMENT_COLUMNS),
+        )
+        for day, count, first_id in days:
+            generate_orders(day_rng(ctx["seed"], kind, day), day, count, first_id, ctx["open_from"], buffers)
+    else:
+        buffers = (Buffer("reservations", RESERVATION_COLUMNS),)
+        for day, first_id in days:
+            generate_reservations(day_rng(ctx["seed"], kind, day), day, first_id, buffers[0])
+
+    with use_location(ctx["location_id"]):
+        conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Losing the tail of a bulk load to a crash is fine; it is rerun anyway
+        cur.execute("SET LOCAL synchronous_commit = off")
+        for buffer in buffers:
+            buffer.copy(cur)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    return {buffer.table: buffer.rows for buffer in buffers}, time.perf_counter() - started
+
+
+def reserve_ids(cur, table, count):
+    """Takes `count` consecutive ids from the table's sequence; returns the first."""
+    cur.execute("SELECT pg_get_serial_sequence(%s, 'id')", (table,))
+    sequence = cur.fetchone()[0]
+    cur.execute(f"SELECT GREATEST(nextval(%s), (SELECT COALESCE(MAX(id), 0) + 1 FROM {table}))", (sequence,))
+    first = cur.fetchone()[0]
+    if count:
+        cur.execute("SELECT setval(%s, %s)", (sequence, first + count - 1))
+    return first
+
+
+def create_menu(cur, rng, location_id, count):
+    cur.execute("SELECT COALESCE(MAX(display_order), 0) FROM categories")
+    next_order = cur.fetchone()[0] + 1
+    category_ids = {}
+    for name, *_ in CATEGORIES:
+        cur.execute("SELECT id FROM categories WHERE name = %s", (name,))
+        row = cur.fetchone()
+        if row is None:
+            cur.execute("INSERT INTO categories (name, display_order) VALUES (%s, %s) RETURNING id", (name, next_order))
+            row = cur.fetchone()
+            next_order += 1
+        category_ids[name] = row[0]
+
+    rows = []
+    for name, share, (low, high), adjectives, nouns in CATEGORIES:
+        dishes = [f"{a} {n}" for a in adjectives for n in nouns]
+        rng.shuffle(dishes)
+        for i in range(max(1, round(count * share))):
+            dish = dishes[i % len(dishes)]
+            if i >= len(dishes):
+                dish += f" No. {i // len(dishes) + 1}"
+            # Menu prices end in .49 or .99
+            cents = max(99, round(rng.uniform(low, high) * 2) * 50 - 1)
+            active = rng.random() >= DISCONTINUED_SHARE
+            rows.append((category_ids[name], dish, f"House {dish.lower()}.", money(cents), active, location_id, cents))
+
+    ids = execute_values(cur, """
+        INSERT INTO menu_items (category_id, name, description, price, is_active, location_id)
+        VALUES %s RETURNING id
+    """, [row[:6] for row in rows], page_size=len(rows), fetch=True)
+
+    # Popularity ranks are unrelated to category or price
+    ranked = [(item_id, row[6], row[4]) for (item_id,), row in zip(ids, rows)]
+    rng.shuffle(ranked)
+    return ranked
+
+
+def create_tables(cur, rng, location_id, count):
+    cur.execute("SELECT COALESCE(MAX(table_number), 0) FROM tables WHERE location_id = %s", (location_id,))
+    first_number = cur.fetchone()[0] + 1
+    rows = [
+        (first_number + i, weighted(rng, TABLE_CAPACITIES), weighted(rng, TABLE_AREAS), location_id)
+        for i in range(count)
+    ]
+    ids = execute_values(cur, """
+        INSERT INTO tables (table_number, capacity, location, location_id)
+        VALUES %s RETURNING id
+    """, rows, page_size=len(rows), fetch=True)
+    return [(table_id, row[1]) for (table_id,), row in zip(ids, rows)]
+
+
+def popularity(items):
+    """(menu item ids, prices in cents, cumulative weights) in popularity order."""
+    cum_weights, running = [], 0.0
+    for rank in range(len(items)):
+        running += 1 / (rank + 1) ** ZIPF_EXPONENT
+        cum_weights.append(running)
+    return [i[0] for i in items], [i[1] for i in items], cum_weights
+
+
+def chunk_days(entries, counts, chunk_size):
+    """Groups consecutive days into chunks of about `chunk_size` rows."""
+    chunks, current, size = [], [], 0
+    for entry, count in zip(entries, counts):
+        current.append(entry)
+        size += count
+        if size >= chunk_size:
+            chunks.append(current)
+            current, size = [], 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic restaurant data")
+    parser.add_argument("--scale", choices=list(SCALES), default="small",
+                        help="preset volumes; the options below override them")
+    parser.add_argument("--tables", type=int)
+    parser.add_argument("--menu-items", type=int)
+    parser.add_argument("--orders", type=int, help="orders over the whole history")
+    parser.add_argument("--days", type=int, help="days of order history")
+    parser.add_argument("--reservation-days", type=int, help="days of reservation history")
+    parser.add_argument("--future-days", type=int, default=60, help="days of upcoming reservations")
+    parser.add_argument("--reservation-fill", type=float, default=0.35,
+                        help="share of an average day's seatings that are reserved")
+    parser.add_argument("--open-orders", type=int, default=40, help="newest orders left in progress")
+    parser.add_argument("--end", type=date.fromisoformat, default=date.today(),
+                        help="first day after the history (default: today); pin it for comparable runs")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--location", type=int, default=DEFAULT_LOCATION_ID, help="location id")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="orders or reservations per COPY chunk")
+    parser.add_argument("--reset", action="store_true",
+                        help="empty the generated tables first, for every location in the database")
+    args = parser.parse_args()
+    for key, value in SCALES[args.scale].items():
+        if getattr(args, key) is None:
+            setattr(args, key, value)
+
+    days = [args.end - timedelta(days=n) for n in range(args.days, 0, -1)]
+    reservation_days = [args.end - timedelta(days=n) for n in range(args.reservation_days, -args.future_days, -1)]
+    counts = daily_order_counts(args.seed, days, args.orders)
+    rng = random.Random(f"{args.seed}:reference")
+    started = time.perf_counter()
+
+    if month_start(days[0]) < add_months(month_start(args.end), -PARTITION_RETENTION_MONTHS):
+        print(f"Note: orders older than {PARTITION_RETENTION_MONTHS} months will be archived "
+              f"by the next `partitions.py maintain`.")
+
+    with use_location(args.location):
+        # Payments and logs of the last evening can fall on --end itself
+        for action in ensure_partitions(days[0], args.end):
+            print(action)
+
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            if args.reset:
+                cur.execute(f"TRUNCATE {', '.join(RESET_TABLES)} RESTART IDENTITY CASCADE")
+            menu = create_menu(cur, rng, args.location, args.menu_items)
+            tables = create_tables(cur, rng, args.location, args.tables)
+            reservation_counts = [
+                len(booked_seatings(args.seed, day, tables, args.reservation_fill)) for day in reservation_days
+            ]
+            first_order = reserve_ids(cur, "orders", args.orders)
+            first_reservation = reserve_ids(cur, "reservations", sum(reservation_counts))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+    print(f"Created {len(menu)} menu items and {len(tables)} tables for location {args.location}")
+
+    context = {
+        "seed": args.seed,
+        "location_id": args.location,
+        "tables": tables,
+        "full_menu": popularity(menu),
+        "menu": popularity([item for item in menu if item[2]]),
+        "discontinued_after": days[len(days) // 2],
+        "open_orders": max(1, args.open_orders),
+        "open_from": first_order + args.orders - args.open_orders,
+        "reservation_fill": args.reservation_fill,
+    }
+
+    # Each day's first id follows from the days before it, not from the chunking
+    order_entries, next_id = [], first_order
+    for day, count in zip(days, counts):
+        order_entries.append((day, count, next_id))
+        next_id += count
+    reservation_entries, next_id = [], first_reservation
+    for day, count in zip(reservation_days, reservation_counts):
+        reservation_entries.append((day, next_id))
+        next_id += count
+
+    tasks = [("orders", chunk) for chunk in chunk_days(order_entries, counts, args.chunk_size)]
+    tasks += [("reservations", chunk) for chunk in chunk_days(reservation_entries, reservation_counts, args.chunk_size)]
+
+    totals = {}
+    with multiprocessing.Pool(args.workers, initializer=init_worker, initargs=(context,)) as pool:
+        for done, (rows, elapsed) in enumerate(pool.imap_unordered(load_chunk, tasks), 1):
+            for table, n in rows.items():
+                totals[table] = totals.get(table, 0) + n
+            print(f"\r  {done}/{len(tasks)} chunks, {sum(totals.values()):,} rows", end="", flush=True)
+    print()
+
+    with use_location(args.location):
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            # Fresh planner statistics, so the first benchmark run isn't planned blind
+            cur.execute(f"ANALYZE {', '.join(RESET_TABLES)}")
+            conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+
+    elapsed = time.perf_counter() - started
+    for table, n in sorted(totals.items()):
+        print(f"  {table:<14} {n:>12,}")
+    print(f"Loaded {sum(totals.values()):,} rows in {elapsed:.1f}s "
+          f"({sum(totals.values()) / elapsed:,.0f} rows/s, {args.workers} workers)")
+
+
+if __name__ == "__main__":
+    main()
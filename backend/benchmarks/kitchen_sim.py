@@ -0,0 +1,211 @@
+"""
+Kitchen ticket queue simulator.
+
+Replays a window of a location's real orders (arrival times, tables and
+items from orders/order_items, time in preparation from order_logs) through
+a simulated kitchen working --cooks tickets at a time, once per queue policy
+(see app/utils/kitchen_queue.py). Whenever a cook is free they start the
+ticket at the front of the KitchenQueue, and it takes as long as it took for
+real. Prep times are learned from the order_logs before the window, as the
+server would have known them. Reports the ticket time (arrival to ready) per
+policy, overall and for large tables, next to what actually happened.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.kitchen_sim --days 7
+    python -m benchmarks.kitchen_sim --until 2026-10-01 --cooks 6 --policies fifo weighted
+
+Without --cooks, the kitchen works as many tickets at once as were really
+in preparation at the --capacity-quantile of arrivals (0.9 by default), so
+it falls behind at the peaks. With more cooks nothing ever waits and every
+policy gives the same times.
+"""
+import argparse
+import heapq
+import math
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.core.config import (  # noqa: E402
+    DEFAULT_LOCATION_ID, KITCHEN_COURSE_GAP_SECONDS, KITCHEN_DEFAULT_PREP_SECONDS, KITCHEN_GUEST_SECONDS,
+    KITCHEN_PREP_LOOKBACK_DAYS, KITCHEN_WALK_IN_GUESTS,
+)
+from app.core.locations import use_location  # noqa: E402
+from app.utils.db_helper import UnitOfWork  # noqa: E402
+from app.utils.kitchen_queue import (  # noqa: E402
+    MENU_CATEGORIES, POLICIES, KitchenQueue, item_profiles, learn_prep_times,
+)
+
+LARGE_TABLE = 6
+
+# Same shape as the PREP_TIMES query: every range is on a partition key.
+# Guests are the reservation's party size, or KITCHEN_WALK_IN_GUESTS (at most
+# a full table) for walk-ins, as in the app.
+ORDERS = """
+    SELECT o.id, o.table_id, COALESCE(r.party_size, LEAST(t.capacity, %s)), o.created_at,
+           MAX(l.changed_at) FILTER (WHERE l.new_status = 'preparing'),
+           MAX(l.changed_at) FILTER (WHERE l.new_status = 'ready')
+    FROM orders o
+    JOIN tables t ON t.id = o.table_id
+    LEFT JOIN reservations r ON r.id = o.reservation_id
+    JOIN order_logs l ON l.order_id = o.id AND l.changed_at >= %s AND l.changed_at < %s + interval '1 day'
+    WHERE o.location_id = %s AND o.created_at >= %s AND o.created_at < %s
+    GROUP BY o.id, o.created_at, o.table_id, t.capacity, r.party_size
+    ORDER BY o.created_at, o.id
+"""
+
+ITEMS = """
+    SELECT oi.order_id, oi.menu_item_id, m.name, oi.quantity, oi.notes
+    FROM order_items oi
+    JOIN menu_items m ON m.id = oi.menu_item_id
+    WHERE m.location_id = %s AND oi.created_at >= %s AND oi.created_at < %s
+    ORDER BY oi.order_id, oi.id
+"""
+
+
+class Replayed:
+    __slots__ = ("order_id", "table_id", "guests", "created_at", "arrival", "service", "actual", "items")
+
+
+def load(location_id, since, until):
+    with UnitOfWork(replica=True) as uow:
+        categories = uow.fetch_all(MENU_CATEGORIES, (location_id,))
+        orders = uow.fetch_all(ORDERS, (KITCHEN_WALK_IN_GUESTS, since, until, location_id, since, until))
+        items = defaultdict(list)
+        for order_id, *item in uow.fetch_all(ITEMS, (location_id, since, until)):
+            items[order_id].append(tuple(item))
+
+    tickets = []
+    for order_id, table_id, guests, created_at, preparing_at, ready_at in orders:
+        # Cancelled, or never cooked
+        if preparing_at is None or ready_at is None or ready_at <= preparing_at or not items[order_id]:
+            continue
+        ticket = Replayed()
+        ticket.order_id = order_id
+        ticket.table_id = table_id
+        ticket.guests = guests
+        ticket.created_at = created_at
+        ticket.arrival = created_at.timestamp()
+        ticket.service = (ready_at - preparing_at).total_seconds()
+        ticket.actual = (ready_at - created_at).total_seconds()
+        ticket.items = items[order_id]
+        tickets.append(ticket)
+    return categories, tickets
+
+
+def default_cooks(tickets, quantile):
+    """How many tickets were in preparation at once, at the given quantile of the arrivals."""
+    events = []
+    for t in tickets:
+        started = t.arrival + t.actual - t.service
+        events.append((started, 1))
+        events.append((started + t.service, -1))
+    events.sort()
+    arrivals = sorted(t.arrival for t in tickets)
+    counts = []
+    cooking = 0
+    i = 0
+    for arrival in arrivals:
+        while i < len(events) and events[i][0] <= arrival:
+            cooking += events[i][1]
+            i += 1
+        counts.append(cooking)
+    return max(1, percentile(counts, quantile))
+
+
+def simulate(queue, tickets, cooks):
+    """
+    Runs the tickets (sorted by arrival) through `cooks` parallel cooks
+    taking work from `queue`. Returns (ticket, wait, ticket time) per ticket
+    and the time spent in queue operations.
+    """
+    by_id = {t.order_id: t for t in tickets}
+    finishing = []
+    results = []
+    spent = 0.0
+    operations = 0
+    i = 0
+    while i < len(tickets) or len(queue) or finishing:
+        next_arrival = tickets[i].arrival if i < len(tickets) else math.inf
+        now = min(next_arrival, finishing[0] if finishing else math.inf)
+        while finishing and finishing[0] <= now:
+            heapq.heappop(finishing)
+
+        start = time.perf_counter()
+        while i < len(tickets) and tickets[i].arrival <= now:
+            t = tickets[i]
+            queue.add(t.order_id, t.table_id, "pending", t.created_at, t.guests, t.items)
+            operations += 1
+            i += 1
+        started = []
+        while len(finishing) + len(started) < cooks and len(queue):
+            ticket = queue.first()
+            queue.remove(ticket.order_id)
+            operations += 1
+            started.append(by_id[ticket.order_id])
+        spent += time.perf_counter() - start
+
+        for t in started:
+            heapq.heappush(finishing, now + t.service)
+            results.append((t, now - t.arrival, now + t.service - t.arrival))
+    return results, spent / max(operations, 1)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(name, times, large):
+    minutes = [s / 60 for s in times]
+    large_minutes = [s / 60 for s in large]
+    return (f"{name:<12} {sum(minutes) / len(minutes):>9.1f} {percentile(minutes, .5):>8.1f} "
+            f"{percentile(minutes, .9):>8.1f} {max(minutes):>8.1f} "
+            f"{(sum(large_minutes) / len(large_minutes)) if large_minutes else float('nan'):>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay historical orders through the kitchen queue policies")
+    parser.add_argument("--location", type=int, default=DEFAULT_LOCATION_ID)
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None,
+                        help="end of the replayed window (default: now)")
+    parser.add_argument("--days", type=float, default=7, help="length of the replayed window")
+    parser.add_argument("--cooks", type=int, help="tickets the kitchen works on at once")
+    parser.add_argument("--capacity-quantile", type=float, default=0.9,
+                        help="without --cooks, the quantile of the historical number of tickets in preparation")
+    parser.add_argument("--policies", nargs="+", choices=POLICIES, default=list(POLICIES))
+    parser.add_argument("--course-gap", type=float, default=KITCHEN_COURSE_GAP_SECONDS)
+    parser.add_argument("--guest-seconds", type=float, default=KITCHEN_GUEST_SECONDS)
+    args = parser.parse_args()
+
+    until = args.until or datetime.now()
+    since = until - timedelta(days=args.days)
+    with use_location(args.location):
+        categories, tickets = load(args.location, since, until)
+        if not tickets:
+            sys.exit(f"No cooked orders for location {args.location} between {since:%Y-%m-%d %H:%M} and "
+                     f"{until:%Y-%m-%d %H:%M}; pass --until to replay an older window")
+        prep_times = learn_prep_times(args.location, since - timedelta(days=KITCHEN_PREP_LOOKBACK_DAYS), since)
+    profiles = item_profiles(categories, prep_times, KITCHEN_DEFAULT_PREP_SECONDS)
+    cooks = args.cooks or default_cooks(tickets, args.capacity_quantile)
+
+    print(f"{len(tickets):,} orders from {since:%Y-%m-%d %H:%M} to {until:%Y-%m-%d %H:%M}, {cooks} cooks, "
+          f"prep times learned for {len(prep_times)} of {len(profiles)} menu items")
+    print(f"{'ticket time (min)':<12} {'mean':>9} {'p50':>8} {'p90':>8} {'max':>8} {'large tables':>12}")
+    print(summarize("actual", [t.actual for t in tickets], [t.actual for t in tickets if t.guests >= LARGE_TABLE]))
+    for policy in args.policies:
+        queue = KitchenQueue(policy, profiles, course_gap=args.course_gap, guest_seconds=args.guest_seconds)
+        results, per_operation = simulate(queue, tickets, cooks)
+        times = [total for _, _, total in results]
+        large = [total for t, _, total in results if t.guests >= LARGE_TABLE]
+        print(summarize(policy, times, large) + f"   ({per_operation * 1e6:.1f} us per queue operation)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+"""
+End-to-end load benchmark.
+
+Starts a throwaway PostgreSQL cluster (initdb/pg_ctl from PATH or --pg-bin),
+runs the schema migrations (migrate.py), seeds the menu and tables, launches the API with
+uvicorn and drives a mixed service workload against it:
+
+    menu browsing, table availability + reservations, order submission,
+    kitchen status bumps, payments, analytics polling
+
+while N WebSocket clients stay connected to /api/orders/ws and measure how long
+it takes for new_order / status_update broadcasts to reach them.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.load_test --concurrency 32 --duration 60 --ws-clients 10
+    python -m benchmarks.load_test --dsn postgresql://postgres@localhost/bench_db
+    python -m benchmarks.load_test compare results/old.json results/new.json
+
+initdb refuses to run as root; use --dsn against an existing empty database in
+that case. Results are written as JSON under benchmarks/results/.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+import httpx
+import psycopg2
+import websockets
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+# Relative frequency of each scenario in the service mix.
+SCENARIO_WEIGHTS = {
+    "browse_menu": 30,
+    "check_availability": 10,
+    "create_reservation": 5,
+    "create_order": 20,
+    "kds_bump": 20,
+    "pay_order": 8,
+    "poll_analytics": 4,
+    "list_orders": 3,
+}
+
+KDS_FLOW = {"pending": "preparing", "preparing": "ready", "ready": "served"}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    return ordered[int(round(pct / 100 * (len(ordered) - 1)))]
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p90_ms": round(percentile(ordered, 90) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2) if ordered else 0.0,
+    }
+
+
+class ThrowawayPostgres:
+    def __init__(self, pg_bin=None):
+        self.pg_bin = pg_bin
+        self.data_dir = tempfile.mkdtemp(prefix="rms-bench-pg-")
+        self.port = free_port()
+
+    def _bin(self, name):
+        if self.pg_bin:
+            return os.path.join(self.pg_bin, name)
+        path = shutil.which(name)
+        if not path:
+            raise SystemExit(f"{name} not found on PATH; pass --pg-bin or --dsn")
+        return path
+
+    def start(self):
+        subprocess.run(
+            [self._bin("initdb"), "-D", self.data_dir, "-U", "postgres", "--auth=trust", "-E", "UTF8"],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        options = f"-p {self.port} -k {self.data_dir} -c max_connections=300"
+        subprocess.run(
+            [self._bin("pg_ctl"), "-D", self.data_dir, "-o", options, "-w", "-l",
+             os.path.join(self.data_dir, "postgres.log"), "start"],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        conn = psycopg2.connect(host="127.0.0.1", port=self.port, dbname="postgres", user="postgres")
+        conn.autocommit = True
+        conn.cursor().execute("CREATE DATABASE restaurant_bench")
+        conn.close()
+        return {"host": "127.0.0.1", "port": str(self.port), "dbname": "restaurant_bench",
+                "user": "postgres", "password": ""}
+
+    def stop(self):
+        subprocess.run([self._bin("pg_ctl"), "-D", self.data_dir, "-m", "fast", "stop"],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+
+def dsn_to_config(dsn):
+    url = urlparse(dsn)
+    return {
+        "host": url.hostname or "localhost",
+        "port": str(url.port or 5432),
+        "dbname": url.path.lstrip("/"),
+        "user": url.username or "postgres",
+        "password": url.password or "",
+    }
+
+
+def prepare_database(db, tables):
+    env = {**os.environ, **db_env(db)}
+    subprocess.run([sys.executable, "migrate.py"], cwd=BACKEND_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    subprocess.run([sys.executable, "seed_menu.py"], cwd=BACKEND_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+    conn = psycopg2.connect(**db)
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM tables")
+    if cur.fetchone()[0] == 0:
+        for n in range(1, tables + 1):
+            cur.execute("INSERT INTO tables (table_number, capacity) VALUES (%s, %s)", (n, random.choice([2, 4, 4, 6, 8])))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+def db_env(db):
+    return {
+        "DB_HOST": db["host"], "DB_PORT": db["port"], "DB_NAME": db["dbname"],
+        "DB_USER": db["user"], "DB_PASSWORD": db["password"],
+    }
+
+
+def start_app(db, port, workers):
+    env = {**os.environ, **db_env(db)}
+    # Every virtual user shares one client address, which per-client rate
+    # limiting would throttle; set ADMISSION_ENABLED=true to measure shedding.
+    env.setdefault("ADMISSION_ENABLED", "false")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit("API did not become healthy within 30s")
+
+
+class Workload:
+    def __init__(self, base_url, seed):
+        self.base_url = base_url
+        self.rng = random.Random(seed)
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        # order_id -> status, for orders created by this run
+        self.orders = {}
+        self.menu_ids = []
+        self.table_ids = []
+        # (message type, order id, status) -> time the triggering request was sent
+        self.pending_broadcasts = {}
+        self.broadcast_lag = []
+        self.broadcasts_received = 0
+
+    async def call(self, client, name, method, path, expected=(200,), **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            self.errors[name] += 1
+            return None
+        self.latencies[name].append(time.perf_counter() - start)
+        self.statuses[name][response.status_code] += 1
+        if response.status_code not in expected:
+            self.errors[name] += 1
+            return None
+        return response
+
+    async def load_reference_data(self, client):
+        items = (await client.get("/api/menu/items")).json()
+        tables = (await client.get("/api/tables/")).json()
+        self.menu_ids = [i["id"] for i in items]
+        self.table_ids = [t["id"] for t in tables]
+
+    async def browse_menu(self, client):
+        await self.call(client, "GET /api/menu/categories", "GET", "/api/menu/categories")
+        await self.call(client, "GET /api/menu/items", "GET", "/api/menu/items")
+
+    def random_slot(self):
+        day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        day += timedelta(days=self.rng.randint(1, 60))
+        return day + timedelta(hours=self.rng.randint(11, 21), minutes=self.rng.choice([0, 15, 30, 45]))
+
+    async def check_availability(self, client):
+        await self.call(client, "GET /api/tables/available", "GET", "/api/tables/available",
+                        params={"reservation_time": self.random_slot().isoformat()})
+
+    async def create_reservation(self, client):
+        body = {
+            "table_id": self.rng.choice(self.table_ids),
+            "customer_name": "Bench Guest",
+            "customer_phone": "555-0100",
+            "reservation_time": self.random_slot().isoformat(),
+            "party_size": 2,
+        }
+        # 409 (slot taken) and 400 (party too large) are normal outcomes.
+        await self.call(client, "POST /api/reservations/", "POST", "/api/reservations/",
+                        expected=(200, 400, 409), json=body)
+
+    async def create_order(self, client):
+        items = [
+            {"menu_item_id": self.rng.choice(self.menu_ids), "quantity": self.rng.randint(1, 3)}
+            for _ in range(self.rng.randint(1, 6))
+        ]
+        sent = time.perf_counter()
+        response = await self.call(client, "POST /api/orders/", "POST", "/api/orders/",
+                                   json={"table_id": self.rng.choice(self.table_ids), "items": items})
+        if response is not None:
+            order_id = response.json()["id"]
+            self.orders[order_id] = "pending"
+            self.pending_broadcasts.setdefault(("new_order", order_id, "pending"), sent)
+
+    async def kds_bump(self, client):
+        candidates = [oid for oid, status in self.orders.items() if status in KDS_FLOW]
+        if not candidates:
+            return await self.create_order(client)
+        order_id = self.rng.choice(candidates)
+        new_status = KDS_FLOW[self.orders[order_id]]
+        self.orders[order_id] = new_status
+        self.pending_broadcasts[("status_update", order_id, new_status)] = time.perf_counter()
+        await self.call(client, "PUT /api/orders/{order_id}/status", "PUT", f"/api/orders/{order_id}/status",
+                        json={"status": new_status})
+
+    async def pay_order(self, client):
+        candidates = [oid for oid, status in self.orders.items() if status == "served"]
+        if not candidates:
+            return await self.kds_bump(client)
+        order_id = self.rng.choice(candidates)
+        self.orders[order_id] = "paid"
+        self.pending_broadcasts[("status_update", order_id, "paid")] = time.perf_counter()
+        await self.call(client, "POST /api/orders/{order_id}/pay", "POST", f"/api/orders/{order_id}/pay",
+                        json={"amount": 50.0, "payment_method": self.rng.choice(["cash", "card", "online"])})
+
+    async def poll_analytics(self, client):
+        for path in ("summary", "revenue-chart", "top-items", "order-status"):
+            await self.call(client, f"GET /api/analytics/{path}", "GET", f"/api/analytics/{path}")
+
+    async def list_orders(self, client):
+        status = self.rng.choice([None, "pending", "preparing", "ready"])
+        await self.call(client, "GET /api/orders/", "GET", "/api/orders/",
+                        params={"status": status} if status else None)
+
+    async def user(self, client, deadline):
+        names = list(SCENARIO_WEIGHTS)
+        weights = [SCENARIO_WEIGHTS[n] for n in names]
+        while time.perf_counter() < deadline:
+            scenario = self.rng.choices(names, weights)[0]
+            await getattr(self, scenario)(client)
+
+    async def ws_client(self, ws_url, stop):
+        async with websockets.connect(ws_url) as ws:
+            while not stop.is_set():
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+                received = time.perf_counter()
+                message = json.loads(raw)
+                if message.get("type") == "new_order":
+                    key = ("new_order", message["order"]["id"], "pending")
+                else:
+                    key = ("status_update", message.get("order_id"), message.get("new_status"))
+                sent = self.pending_broadcasts.get(key)
+                self.broadcasts_received += 1
+                if sent is not None:
+                    self.broadcast_lag.append(received - sent)
+
+
+async def run_workload(port, concurrency, duration, ws_clients, seed):
+    base_url = f"http://127.0.0.1:{port}"
+    workload = Workload(base_url, seed)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await workload.load_reference_data(client)
+
+        stop = asyncio.Event()
+        listeners = [
+            asyncio.create_task(workload.ws_client(f"ws://127.0.0.1:{port}/api/orders/ws", stop))
+            for _ in range(ws_clients)
+        ]
+        await asyncio.sleep(0.5)
+
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(workload.user(client, deadline) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        # Give in-flight broadcasts a moment to land before closing the sockets.
+        await asyncio.sleep(1)
+        stop.set()
+        await asyncio.gather(*listeners, return_exceptions=True)
+
+    endpoints = {}
+    for name, samples in sorted(workload.latencies.items()):
+        endpoints[name] = {
+            **summarize(samples),
+            "throughput_rps": round(len(samples) / elapsed, 2),
+            "errors": workload.errors[name],
+            "status_codes": dict(workload.statuses[name]),
+        }
+    total = sum(len(s) for s in workload.latencies.values())
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "total_requests": total,
+        "throughput_rps": round(total / elapsed, 2),
+        "endpoints": endpoints,
+        "websocket": {
+            "clients": ws_clients,
+            "messages_received": workload.broadcasts_received,
+            "delivery_lag": summarize(workload.broadcast_lag),
+        },
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    random.seed(args.seed)
+    pg = None
+    if args.dsn:
+        db = dsn_to_config(args.dsn)
+    else:
+        pg = ThrowawayPostgres(args.pg_bin)
+        db = pg.start()
+
+    app = None
+    try:
+        prepare_database(db, args.tables)
+        port = free_port()
+        app = start_app(db, port, args.workers)
+        results = asyncio.run(run_workload(port, args.concurrency, args.duration, args.ws_clients, args.seed))
+    finally:
+        if app:
+            app.terminate()
+            app.wait()
+        if pg:
+            pg.stop()
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "config": {
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "ws_clients": args.ws_clients,
+            "workers": args.workers,
+            "tables": args.tables,
+            "seed": args.seed,
+        },
+        **results,
+    }
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{report['revision'] or 'local'}-{int(time.time())}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print_report(report)
+    print(f"\nResults saved to {output}")
+
+
+def print_report(report):
+    print(f"{'endpoint':<40} {'count':>7} {'rps':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'err':>5}")
+    for name, e in report["endpoints"].items():
+        print(f"{name:<40} {e['count']:>7} {e['throughput_rps']:>8} {e['p50_ms']:>8} "
+              f"{e['p90_ms']:>8} {e['p99_ms']:>8} {e['errors']:>5}")
+    lag = report["websocket"]["delivery_lag"]
+    print(f"\nTotal: {report['total_requests']} requests, {report['throughput_rps']} req/s")
+    print(f"WebSocket delivery lag ({report['websocket']['clients']} clients, {lag['count']} deliveries): "
+          f"p50 {lag['p50_ms']} ms, p99 {lag['p99_ms']} ms, max {lag['max_ms']} ms")
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        old = json.load(f)
+    with open(args.candidate) as f:
+        new = json.load(f)
+
+    def delta(a, b):
+        return f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+
+    print(f"{old.get('revision')} -> {new.get('revision')}")
+    print(f"{'endpoint':<40} {'p50':>18} {'p99':>18} {'rps':>18}")
+    for name in sorted(set(old["endpoints"]) | set(new["endpoints"])):
+        a, b = old["endpoints"].get(name), new["endpoints"].get(name)
+        if not a or not b:
+            print(f"{name:<40} only in {'candidate' if b else 'baseline'}")
+            continue
+        print(f"{name:<40} {b['p50_ms']:>9} {delta(a['p50_ms'], b['p50_ms']):>8} "
+              f"{b['p99_ms']:>9} {delta(a['p99_ms'], b['p99_ms']):>8} "
+              f"{b['throughput_rps']:>9} {delta(a['throughput_rps'], b['throughput_rps']):>8}")
+    a, b = old["websocket"]["delivery_lag"], new["websocket"]["delivery_lag"]
+    print(f"{'websocket delivery lag':<40} {b['p50_ms']:>9} {delta(a['p50_ms'], b['p50_ms']):>8} "
+          f"{b['p99_ms']:>9} {delta(a['p99_ms'], b['p99_ms']):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load benchmark for the RMS backend")
+    sub = parser.add_subparsers(dest="command")
+
+    cmp_parser = sub.add_parser("compare", help="compare two result files")
+    cmp_parser.add_argument("baseline")
+    cmp_parser.add_argument("candidate")
+
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run the workload")
+    parser.add_argument("--ws-clients", type=int, default=5, help="connected kitchen display clients")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--tables", type=int, default=30, help="tables to seed")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dsn", help="use an existing empty database instead of a throwaway cluster")
+    parser.add_argument("--pg-bin", help="directory containing initdb and pg_ctl")
+    parser.add_argument("--output", help="result file path (default: benchmarks/results/)")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        compare(args)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""
+Handler-level micro-benchmarks.
+
+Runs the router functions against an in-memory stand-in for the database that
+answers every statement with synthetic rows, so only the Python side is
+measured. Each case is timed in up to four stages:
+
+    handler   the endpoint function itself (row mapping, pydantic construction)
+    validate  re-validating the result against response_model and dumping it
+              to JSON-compatible data, as FastAPI does before rendering
+    encode    rendering that data with the response class
+    stack     a full in-process ASGI request through app.main.app (routing,
+              middleware, threadpool hop, validation and encoding)
+
+Usage (from the backend directory, needs no database):
+
+    python -m benchmarks.micro                       # run and compare with the baseline
+    python -m benchmarks.micro --save-baseline       # store this run as the baseline
+    python -m benchmarks.micro --orders 500 --menu-items 1000 -k orders
+
+Exits with status 1 when any stage is slower than the baseline by more than
+--threshold percent.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from functools import lru_cache
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "benchmarks", "results", "micro_baseline.json")
+
+sys.path.insert(0, BACKEND_DIR)
+# Measure the handlers themselves, not the listing cache
+os.environ.setdefault("CACHE_TTL_SECONDS", "0")
+# Repeated requests from one client would be rate limited
+os.environ.setdefault("ADMISSION_ENABLED", "false")
+
+from pydantic import TypeAdapter  # noqa: E402
+from starlette.responses import JSONResponse, Response  # noqa: E402
+
+import app.core.database  # noqa: E402
+import app.utils.db_helper  # noqa: E402
+from app.api import analytics, menu, orders, reservations, tables  # noqa: E402
+from app.main import app as asgi_app  # noqa: E402
+from app.schemas.order import OrderCreate  # noqa: E402
+
+_WS = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=None)
+def normalize(query):
+    return _WS.sub(" ", query).strip()
+
+
+class SyntheticData:
+    def __init__(self, seed, menu_items, orders_count, items_per_order, tables_count, reservations_count):
+        rng = random.Random(seed)
+        now = datetime(2026, 1, 15, 19, 30, 0, 123456)
+        self.categories = [(i, f"Category {i}", i) for i in range(1, 8)]
+        self.menu = [
+            (i, f"Menu item {i}", "A reasonably long description of the dish " * 2,
+             Decimal(f"{rng.randint(3, 40)}.{rng.randint(0, 99):02d}"), rng.randint(1, 7),
+             f"https://images.example.com/{i}.jpg", True, f"Category {rng.randint(1, 7)}")
+            for i in range(1, menu_items + 1)
+        ]
+        self.orders = [
+            (i, rng.randint(1, tables_count), None, rng.choice(["pending", "preparing", "ready", "served", "paid"]),
+             Decimal(f"{rng.randint(10, 300)}.{rng.randint(0, 99):02d}"),
+             now - timedelta(minutes=i), now - timedelta(minutes=i) + timedelta(seconds=30))
+            for i in range(1, orders_count + 1)
+        ]
+        self.items_per_order = items_per_order
+        self.tables = [(i, i, rng.choice([2, 4, 6, 8]), "main_hall", True) for i in range(1, tables_count + 1)]
+        self.reservations = [
+            (i, rng.randint(1, tables_count), "Guest Name", "555-0100", now + timedelta(hours=i), 4, 90,
+             "confirmed", now)
+            for i in range(1, reservations_count + 1)
+        ]
+        self.now = now
+
+    def order_items(self, order_id):
+        return [
+            (order_id * 100 + n, order_id, n, 2, Decimal("12.50"), None, f"Menu item {n}")
+            for n in range(1, self.items_per_order + 1)
+        ]
+
+    def respond(self, query, params):
+        q = normalize(query)
+        if q.startswith("SELECT id, name, display_order FROM categories"):
+            return self.categories
+        if "FROM menu_items m LEFT JOIN categories" in q:
+            return self.menu
+        if "SUM(oi.quantity)" in q:
+            return [(f"Menu item {i}", 500 - i, Decimal("6250.00")) for i in range(5)]
+        if "JOIN order_items oi" in q:
+            return [row for o in self.orders for row in self.order_items(o[0])]
+        if "FROM order_items oi" in q:
+            return self.order_items(params[0])
+        if q.startswith("SELECT id, table_id, reservation_id, status, total_amount, created_at, updated_at FROM orders"):
+            if "WHERE id" in q:
+                return [self.orders[0]]
+            return self.orders
+        if q.startswith("SELECT version FROM reference_versions"):
+            return [(1,)]
+        if q.startswith("SELECT id, table_number, capacity, is_active FROM tables"):
+            return [(t[0], t[1], t[2], t[4]) for t in self.tables]
+        if q.startswith("SELECT m.id, m.name, m.price, m.is_active"):
+            return [(m[0], m[1], m[3], m[6], False) for m in self.menu]
+        if q.startswith("INSERT INTO orders"):
+            return [(1, self.now, self.now)]
+        if q.startswith("INSERT INTO order_items"):
+            return []
+        if "FROM tables t" in q or q.startswith("SELECT id, table_number"):
+            return self.tables
+        if "FROM reservations" in q and q.startswith("SELECT id, table_id, customer_name"):
+            return self.reservations
+        if "COALESCE(SUM(amount)" in q:
+            return [(Decimal("125000.50"),)]
+        if q.startswith("SELECT COUNT(*)"):
+            return [(1234,)]
+        if "TO_CHAR(payment_time" in q:
+            return [((self.now - timedelta(days=d)).strftime("%Y-%m-%d"), Decimal("4200.00")) for d in range(30)]
+        if q.startswith("SELECT status, COUNT(*)"):
+            return [(s, 100) for s in ("pending", "preparing", "ready", "served", "paid")]
+        raise AssertionError(f"No synthetic rows for query: {q[:120]}")
+
+
+class FakeCursor:
+    def __init__(self, data, connection):
+        self.data = data
+        self.connection = connection
+        self.rows = []
+        self.rowcount = -1
+
+    def execute(self, query, params=None):
+        self.rows = self.data.respond(query, params or ())
+        self.rowcount = len(self.rows)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, data):
+        self.data = data
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self.data, self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def install_fake_db(data):
+    def connect(*args, **kwargs):
+        return FakeConnection(data)
+
+    # Modules that bound get_db_connection at import time need patching too.
+    for module in (app.core.database, app.utils.db_helper, orders, analytics):
+        if hasattr(module, "get_db_connection"):
+            module.get_db_connection = connect
+
+
+def build_cases(data):
+    order_body = {"table_id": 1, "items": [{"menu_item_id": i, "quantity": 2} for i in range(1, 6)]}
+    slot = data.now + timedelta(days=1)
+    return [
+        # name, endpoint callable, route path, method, query string, json body
+        ("get_categories", lambda: menu.get_categories(None), "/api/menu/categories", "GET", "", None),
+        ("get_menu_items", lambda: menu.get_menu_items(None), "/api/menu/items", "GET", "", None),
+        ("get_orders", lambda: orders.get_orders(None), "/api/orders/", "GET", "", None),
+        ("get_order", lambda: orders.get_order(1, None), "/api/orders/1", "GET", "", None),
+        ("create_order", lambda: orders.create_order(OrderCreate(**order_body)), "/api/orders/", "POST", "",
+         order_body),
+        ("get_tables", tables.get_tables, "/api/tables/", "GET", "", None),
+        ("get_available_tables", lambda: tables.get_available_tables(slot, 90), "/api/tables/available", "GET",
+         f"reservation_time={slot.isoformat()}", None),
+        ("get_reservations", reservations.get_reservations, "/api/reservations/", "GET", "", None),
+        ("analytics_summary", analytics.get_analytics_summary, "/api/analytics/summary", "GET", "", None),
+        ("analytics_revenue_chart", analytics.get_revenue_chart, "/api/analytics/revenue-chart", "GET", "", None),
+        ("analytics_top_items", analytics.get_top_items, "/api/analytics/top-items", "GET", "", None),
+        ("analytics_order_status", analytics.get_order_status_distribution, "/api/analytics/order-status", "GET",
+         "", None),
+    ]
+
+
+def find_route(path, method):
+    for module in (menu, orders, tables, reservations, analytics):
+        for route in module.router.routes:
+            if method in getattr(route, "methods", ()) and route.path_regex.match(path):
+                return route
+    raise LookupError(path)
+
+
+async def asgi_request(method, path, query, body):
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "root_path": "", "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json"),
+                    (b"content-length", str(len(payload)).encode())],
+    }
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi_app(scope, receive, send)
+    status = sent[0]["status"]
+    if status != 200:
+        raise AssertionError(f"{method} {path} returned {status}: {sent[1].get('body', b'')[:200]!r}")
+
+
+def measure(fn, min_time, repeat):
+    """Returns the best per-call time in seconds, timeit style."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        fn(number)
+        if time.perf_counter() - start >= min_time / repeat:
+            break
+        number *= 2
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(number)
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def run_case(loop, case, min_time, repeat):
+    name, endpoint, path, method, query, body = case
+    route = find_route(path, method)
+
+    def call_handler():
+        result = endpoint()
+        if asyncio.iscoroutine(result):
+            result = loop.run_until_complete(result)
+        return result
+
+    result = call_handler()
+    timings = {"handler": measure(lambda n: [call_handler() for _ in range(n)], min_time, repeat)}
+
+    # Handlers that return a Response bypass response_model validation and
+    # default encoding entirely, so there is nothing further to measure.
+    if not isinstance(result, Response):
+        response_class = route.response_class
+        if not isinstance(response_class, type):
+            response_class = JSONResponse
+        if route.response_model is not None:
+            adapter = TypeAdapter(route.response_model)
+
+            def validate():
+                return adapter.dump_python(adapter.validate_python(result, from_attributes=True), mode="json")
+        else:
+            from fastapi.encoders import jsonable_encoder
+
+            def validate():
+                return jsonable_encoder(result)
+
+        content = validate()
+        timings["validate"] = measure(lambda n: [validate() for _ in range(n)], min_time, repeat)
+        timings["encode"] = measure(lambda n: [response_class(content) for _ in range(n)], min_time, repeat)
+
+    async def stack(n):
+        for _ in range(n):
+            await asgi_request(method, path.split("?")[0], query, body)
+
+    timings["stack"] = measure(lambda n: loop.run_until_complete(stack(n)), min_time, repeat)
+    return name, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Handler micro-benchmarks against an in-memory DB stand-in")
+    parser.add_argument("--menu-items", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=100)
+    parser.add_argument("--items-per-order", type=int, default=4)
+    parser.add_argument("--tables", type=int, default=40)
+    parser.add_argument("--reservations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-time", type=float, default=0.2, help="approximate seconds per measurement")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-k", dest="filter", help="only run cases whose name contains this string")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=20.0, help="regression threshold in percent")
+    parser.add_argument("--output", help="also write this run's results to a JSON file")
+    args = parser.parse_args()
+
+    data = SyntheticData(args.seed, args.menu_items, args.orders, args.items_per_order, args.tables,
+                         args.reservations)
+    install_fake_db(data)
+
+    cases = [c for c in build_cases(data) if not args.filter or args.filter in c[0]]
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    results = {}
+    for case in cases:
+        name, timings = run_case(loop, case, args.min_time, args.repeat)
+        results[name] = {stage: round(t * 1e6, 2) for stage, t in timings.items()}
+    loop.close()
+
+    config = {k: getattr(args, k) for k in ("menu_items", "orders", "items_per_order", "tables", "reservations", "seed")}
+    report = {"timestamp": datetime.now().isoformat(timespec="seconds"), "config": config, "results_us": results}
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print(f"warning: baseline was recorded with different sizes: {baseline.get('config')}")
+
+    regressions = []
+    stages = ("handler", "validate", "encode", "stack")
+    print(f"{'case':<26}" + "".join(f"{s + ' (us)':>22}" for s in stages))
+    for name, timings in results.items():
+        cells = []
+        for stage in stages:
+            value = timings.get(stage)
+            if value is None:
+                cells.append(f"{'-':>22}")
+                continue
+            old = (baseline or {}).get("results_us", {}).get(name, {}).get(stage)
+            if old:
+                change = (value - old) / old * 100
+                flag = "!" if change > args.threshold else " "
+                if flag == "!":
+                    regressions.append((name, stage, old, value, change))
+                cells.append(f"{value:>12.1f} {change:>+7.1f}%{flag}")
+            else:
+                cells.append(f"{value:>22.1f}")
+        print(f"{name:<26}" + "".join(cells))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif baseline is None:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold}%:")
+        for name, stage, old, new, change in regressions:
+            print(f"  {name} [{stage}]: {old:.1f}us -> {new:.1f}us ({change:+.1f}%)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Sequential scan check.
+
+Issues the API's read requests in-process against the configured database
+with the query log enabled, then plans every statement they ran with its
+real parameters and reports those that read a large table sequentially
+(see app/utils/plan_check.py). Run it against a database with realistic
+volumes, e.g. one filled by benchmarks.generate_data, after `python migrate.py`.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.seq_scans
+    python -m benchmarks.seq_scans --writes --min-rows 10000
+
+Analytics and closeout aggregate whole history, so their scans are listed
+for information only. --writes also creates, advances and pays one order and
+books one reservation, so the write paths are checked too; only use it on a
+benchmark database. Exits with status 1 when a request-path statement
+seq-scans.
+
+A server started with QUERY_LOG_ENABLED=true reports the same for the
+traffic it has actually seen at GET /api/metrics/queries/seq-scans.
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("QUERY_LOG_ENABLED", "true")
+# Listings must reach the database to be checked
+os.environ.setdefault("CACHE_TTL_SECONDS", "0")
+os.environ.setdefault("ADMISSION_ENABLED", "false")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.utils import query_log  # noqa: E402
+from app.utils.closeout import last_closed_business_date  # noqa: E402
+from app.utils.db_helper import fetch_one  # noqa: E402
+from app.utils.plan_check import SEQ_SCAN_MIN_ROWS, find_seq_scans  # noqa: E402
+
+
+def request_path_requests():
+    order = fetch_one("SELECT id FROM orders ORDER BY created_at DESC LIMIT 1")
+    slot = (datetime.now() + timedelta(days=1)).replace(hour=19, minute=15, second=0, microsecond=0)
+    paths = [
+        "/api/menu/categories",
+        "/api/menu/items",
+        "/api/tables/",
+        f"/api/tables/available?reservation_time={slot.isoformat()}",
+        "/api/reservations/",
+        # Unfiltered, this lists every order ever taken
+        "/api/orders/?status=pending",
+        "/api/kitchen/queue",
+    ]
+    if order:
+        paths.append(f"/api/orders/{order[0]}")
+    return paths
+
+
+# Whole-history aggregates: a sequential scan is expected, so these are
+# reported for information but don't fail the check
+REPORTING_PATHS = [
+    "/api/analytics/summary",
+    "/api/analytics/revenue-chart",
+    "/api/analytics/top-items",
+    "/api/analytics/order-status",
+]
+
+
+def write_fixtures():
+    table = fetch_one("SELECT id FROM tables WHERE is_active ORDER BY id LIMIT 1")
+    item = fetch_one("SELECT id FROM menu_items WHERE is_active ORDER BY id LIMIT 1")
+    return (table[0], item[0]) if table and item else None
+
+
+def run_writes(client, fixtures):
+    if fixtures is None:
+        return ["no active table or menu item to order from"]
+    table_id, item_id = fixtures
+    problems = []
+    order = client.post("/api/orders/", json={"table_id": table_id, "items": [{"menu_item_id": item_id, "quantity": 1}]})
+    if order.status_code != 200:
+        return [f"POST /api/orders/: HTTP {order.status_code}"]
+    order = order.json()
+    for status in ("preparing", "ready", "served"):
+        r = client.put(f"/api/orders/{order['id']}/status", json={"status": status})
+        if r.status_code != 200:
+            problems.append(f"PUT /api/orders/{order['id']}/status: HTTP {r.status_code}")
+    r = client.post(f"/api/orders/{order['id']}/pay", json={"amount": order["total_amount"], "payment_method": "card"})
+    if r.status_code != 200:
+        problems.append(f"POST /api/orders/{order['id']}/pay: HTTP {r.status_code}")
+    # Far enough ahead not to collide with real bookings
+    at = (datetime.now() + timedelta(days=400)).replace(hour=15, minute=0, second=0, microsecond=0)
+    r = client.post("/api/reservations/", json={
+        "table_id": table_id, "customer_name": "Seq Scan Check", "customer_phone": "555-0000",
+        "reservation_time": at.isoformat(), "party_size": 1,
+    })
+    if r.status_code not in (200, 409):
+        problems.append(f"POST /api/reservations/: HTTP {r.status_code}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report API queries that fall back to sequential scans")
+    parser.add_argument("--min-rows", type=int, default=SEQ_SCAN_MIN_ROWS,
+                        help="ignore tables smaller than this (planner estimate)")
+    parser.add_argument("--writes", action="store_true", help="also exercise the order and reservation write paths")
+    args = parser.parse_args()
+
+    client = TestClient(app)
+    paths = request_path_requests()
+    fixtures = write_fixtures() if args.writes else None
+    reporting = [f"/api/closeout/{last_closed_business_date().isoformat()}"] + REPORTING_PATHS
+
+    failed = False
+    for title, group, fatal in [("Request path", paths, True), ("Reporting (informational)", reporting, False)]:
+        # Only the statements issued by this group's requests
+        query_log.reset()
+        problems = []
+        for path in group:
+            r = client.get(path)
+            if r.status_code != 200:
+                problems.append(f"GET {path}: HTTP {r.status_code}")
+        if fatal and args.writes:
+            problems += run_writes(client, fixtures)
+
+        report = find_seq_scans(args.min_rows)
+        for entry in report:
+            if "error" in entry:
+                problems.append(f"could not plan [{entry['id']}]: {entry['error']}")
+        report = [entry for entry in report if "error" not in entry]
+        print(f"{title}: {len(report)} statement(s) with sequential scans")
+        for problem in problems:
+            print(f"  warning: {problem}")
+        for entry in report:
+            tables = ", ".join(f"{s['table']} (~{s['rows']:,} rows)" for s in entry["seq_scans"])
+            print(f"  [{entry['id']}] {entry['statement'][:160]}")
+            print(f"      seq scan on {tables}")
+        failed = failed or (fatal and bool(report))
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import os
+import sys
+from datetime import date
+
+# Add the current directory to sys.path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+
+from app.core.config import DEFAULT_LOCATION_ID
+from app.core.locations import use_location
+from app.utils.closeout import last_closed_business_date, preview, settle
+
+def print_report(report):
+    print(f"Location {report['location_id']}, business day {report['business_date']} "
+          f"({report['period_start']} - {report['period_end']})")
+    print(f"  Orders:          {report['order_count']}  {report['orders_by_status']}")
+    print(f"  Gross sales:     {report['gross_sales']:.2f}")
+    print(f"  Payments:        {report['payments_total']:.2f}")
+    for method, totals in report["payments_by_method"].items():
+        print(f"    {method:<14} {totals['amount']:.2f} ({totals['count']} payments)")
+    for key, label in [
+        ("unpaid", "Unpaid"),
+        ("served_unpaid", "Served, unpaid"),
+        ("cancellations", "Cancelled"),
+        ("overpayments", "Overpaid"),
+        ("underpayments", "Underpaid"),
+        ("late_payments", "Late payments"),
+    ]:
+        # Settlements stored before late payments were reported have no such section
+        bucket = report.get(key)
+        if bucket is None:
+            continue
+        ids = ", ".join(str(o["id"]) for o in bucket["orders"][:20])
+        more = " ..." if bucket["count"] > 20 else ""
+        print(f"  {label + ':':<16} {bucket['count']} ({bucket['amount']:.2f}){'  #' + ids + more if ids else ''}")
+    if report["cancellations"]["refunds_due"]:
+        print(f"  Refunds due:     {report['cancellations']['refunds_due']:.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="End-of-day closeout and settlement")
+    parser.add_argument("--date", type=date.fromisoformat, default=None,
+                        help="business day to close out (default: the last one that has ended)")
+    parser.add_argument("--location", type=int, default=DEFAULT_LOCATION_ID, help="location id")
+    parser.add_argument("--dry-run", action="store_true", help="print the report without storing it")
+    args = parser.parse_args()
+
+    business_date = args.date or last_closed_business_date()
+    with use_location(args.location):
+        if args.dry_run:
+            print_report(preview(business_date, replica=False))
+            return
+
+        try:
+            report, created = settle(business_date)
+        except ValueError as e:
+            sys.exit(str(e))
+    print_report(report)
+    if created:
+        print(f"Settlement recorded at {report['settled_at']}.")
+    else:
+        print(f"Already settled at {report['settled_at']}; stored record shown.")
+
+if __name__ == "__main__":
+    main()
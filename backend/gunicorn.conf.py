@@ -0,0 +1,19 @@
+# Pre-fork deployment: gunicorn -c gunicorn.conf.py app.main:app
+#
+# The app is imported once in the master (preload_app) and warmed up there, then
+# workers are forked from it so imported modules, compiled schemas and caches are
+# shared copy-on-write. Requires: pip install gunicorn uvicorn-worker
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before any worker is forked
+    from app.core.warmup import preload
+    from app.main import app
+
+    preload(app)
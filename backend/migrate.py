@@ -0,0 +1,35 @@
+import argparse
+import os
+import sys
+
+# Add the current directory to sys.path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+
+from app.core.database import PRIMARY_SHARD, shard_names
+from app.utils.migrations import migrate, status
+
+def main():
+    parser = argparse.ArgumentParser(description="Versioned schema migrations (app/db/migrations)")
+    parser.add_argument("command", nargs="?", choices=["up", "status"], default="up",
+                        help="up: apply pending migrations (default); status: list migrations and their state")
+    parser.add_argument("--to", metavar="VERSION", help="stop after this migration version")
+    parser.add_argument("--shard", default=PRIMARY_SHARD, help="database to migrate (a DB_SHARD_DSNS name)")
+    parser.add_argument("--all-shards", action="store_true", help="migrate the primary and every shard")
+    args = parser.parse_args()
+
+    shards = shard_names() if args.all_shards else [args.shard]
+    for shard in shards:
+        if args.command == "status":
+            print(f"{shard}:")
+            for row in status(shard):
+                print(f"  {row['version']} {row['name']:<30} {row['state']:<9} {row['applied_at'] or ''}")
+            continue
+
+        applied = migrate(shard, target=args.to)
+        for name in applied:
+            print(f"{shard}: applied {name}")
+        if not applied:
+            print(f"{shard}: up to date.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import argparse
+import os
+import sys
+
+# Add the current directory to sys.path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+
+from app.utils.partitions import maintain, migrate
+
+def main():
+    parser = argparse.ArgumentParser(description="Monthly partitions for orders, order_items, order_logs and payments")
+    parser.add_argument("command", choices=["migrate", "maintain"],
+                        help="migrate: convert existing plain tables (run once); "
+                             "maintain: create upcoming partitions and archive old ones (run daily)")
+    args = parser.parse_args()
+
+    actions = migrate() if args.command == "migrate" else maintain()
+    for action in actions:
+        print(action)
+    if not actions:
+        print("Partitions are up to date.")
+    if any(action.startswith("failed") for action in actions):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+from unittest import mock
+
+import psycopg2
+
+from app.utils.audit_log import LOG_COLUMNS, AuditLogWriter, audit_log
+from app.utils.db_helper import fetch_one
+
+
+def _writer(max_buffered=100):
+    # Not started, so every enqueue() flushes at once
+    return AuditLogWriter("batched", batch_size=10, interval=1, max_buffered=max_buffered)
+
+
+def _queued_order_ids(writer):
+    return [row[0] for _, row in writer.buffer]
+
+
+def test_flush_copies_buffered_rows():
+    writer = _writer()
+    conn = mock.MagicMock()
+    copied = []
+    conn.cursor.return_value.__enter__.return_value.copy_from.side_effect = \
+        lambda data, table, columns: copied.append((data.read(), table, columns))
+
+    with mock.patch("app.utils.audit_log.get_db_connection", return_value=conn):
+        writer.enqueue(7, "pending", "preparing", "2026-10-19 12:00:00")
+
+    assert copied == [("7\tpending\tpreparing\t2026-10-19 12:00:00\n", "order_logs", LOG_COLUMNS)]
+    conn.commit.assert_called_once()
+    conn.close.assert_called_once()
+    assert writer.status()["flushed"] == 1
+    assert writer.buffer == []
+
+
+def test_failed_flush_keeps_rows_in_order():
+    writer = _writer()
+    with mock.patch("app.utils.audit_log.get_db_connection",
+                    side_effect=psycopg2.OperationalError("connection refused")):
+        for order_id in range(3):
+            writer.enqueue(order_id, "pending", "preparing", None)
+
+    assert _queued_order_ids(writer) == [0, 1, 2]
+    assert writer.status()["flush_errors"] == 3
+    assert writer.status()["dropped"] == 0
+
+
+def test_buffer_drops_oldest_rows_beyond_cap(caplog):
+    writer = _writer(max_buffered=5)
+    with mock.patch("app.utils.audit_log.get_db_connection",
+                    side_effect=psycopg2.OperationalError("connection refused")):
+        for order_id in range(8):
+            writer.enqueue(order_id, "pending", "preparing", None)
+
+    assert _queued_order_ids(writer) == [3, 4, 5, 6, 7]
+    assert writer.status()["dropped"] == 3
+    assert "dropped" in caplog.text
+
+    # Written once the database is back
+    with mock.patch("app.utils.audit_log.get_db_connection", return_value=mock.MagicMock()):
+        assert writer.flush() == 5
+    assert writer.buffer == []
+
+
+def test_money_transitions_are_never_deferred():
+    writer = _writer()
+    assert writer.deferred("preparing")
+    assert writer.deferred("ready")
+    assert not writer.deferred("paid")
+    assert not writer.deferred("cancelled")
+    assert not AuditLogWriter("sync", batch_size=10, interval=1, max_buffered=100).deferred("preparing")
+
+
+def test_cancellation_is_logged_with_the_status_change(client, location, new_order):
+    order_id = client.post("/api/orders/", json=new_order()).json()["id"]
+    with mock.patch.object(audit_log, "enqueue") as enqueue:
+        assert client.put(f"/api/orders/{order_id}/status", json={"status": "cancelled"}).status_code == 200
+
+    enqueue.assert_not_called()
+    assert fetch_one("SELECT new_status FROM order_logs WHERE order_id = %s", (order_id,)) == ("cancelled",)
@@ -0,0 +1,46 @@
+from unittest import mock
+
+from app.utils.cache import TTLCache
+
+
+def _loader(rows):
+    reads = []
+
+    def load(replica):
+        reads.append(replica)
+        return list(rows)
+
+    return load, reads
+
+
+def test_cached_until_invalidated():
+    cache = TTLCache(ttl=30, primary_seconds=5)
+    load, reads = _loader([1])
+
+    assert cache.get_or_load("tables:1", load) == [1]
+    assert cache.get_or_load("tables:1", load) == [1]
+    assert reads == [True]
+
+
+def test_reload_after_invalidation_reads_the_primary():
+    cache = TTLCache(ttl=30, primary_seconds=5)
+    load, reads = _loader([1])
+    with mock.patch("app.utils.cache.time.monotonic", return_value=100.0):
+        cache.get_or_load("tables:1", load)
+        cache.invalidate("tables:1")
+        cache.get_or_load("tables:1", load)
+    # Expired long after the write: replicas have caught up by then
+    with mock.patch("app.utils.cache.time.monotonic", return_value=200.0):
+        cache.get_or_load("tables:1", load)
+
+    assert reads == [True, False, True]
+
+
+def test_uncached_reads_also_use_the_primary_after_a_write():
+    cache = TTLCache(ttl=0, primary_seconds=5)
+    load, reads = _loader([1])
+    cache.get_or_load("tables:1", load)
+    cache.invalidate("tables:1")
+    cache.get_or_load("tables:1", load)
+
+    assert reads == [True, False]
@@ -0,0 +1,243 @@
+import asyncio
+import threading
+import time
+import uuid
+from unittest import mock
+
+import psycopg2.errors
+import pytest
+from fastapi import HTTPException
+
+from app.core.locations import current_location, use_location
+from app.utils.db_helper import UnitOfWork, fetch_one
+from app.utils.idempotency import CLAIM_KEY, REPLAY_HEADER, Claim, IdempotencyStore, idempotency
+
+
+def _count_orders(location, order_id):
+    return fetch_one("SELECT COUNT(*) FROM orders WHERE location_id = %s AND id = %s", (location, order_id))[0]
+
+
+def _store(wait_seconds=0.2):
+    return IdempotencyStore(ttl_seconds=3600, cache_size=100, wait_seconds=wait_seconds)
+
+
+class FakeUnitOfWork:
+    """Answers the claim's statements: `claimed` for CLAIM_KEY, `stored` for the stored response."""
+
+    def __init__(self, claimed=None, stored=None, error=None):
+        self.claimed = claimed
+        self.stored = stored
+        self.error = error
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append(query)
+
+    def fetch_one(self, query, params=None):
+        if query is CLAIM_KEY:
+            if self.error:
+                raise self.error
+            return self.claimed
+        return self.stored
+
+
+async def _run(store, key, payload, work, started=None):
+    with use_location(1):
+        async with store.request(key, "create_order", payload) as claim:
+            if claim.response is not None:
+                return claim.response
+            if started:
+                started.set()
+            return await work(claim)
+
+
+def test_retry_in_the_same_process_waits_for_the_first_response():
+    store = _store(wait_seconds=2)
+
+    async def first_work(claim):
+        await asyncio.sleep(0.05)
+        claim.result = (200, {"id": 7})
+        return {"id": 7}
+
+    async def retry_work(claim):
+        raise AssertionError("the retry must not run the work again")
+
+    async def main():
+        started = asyncio.Event()
+        first = asyncio.create_task(_run(store, "k", {"a": 1}, first_work, started))
+        await started.wait()
+        return await first, await _run(store, "k", {"a": 1}, retry_work)
+
+    first, retry = asyncio.run(main())
+    assert first == {"id": 7}
+    assert retry.status_code == 200
+    assert retry.headers[REPLAY_HEADER] == "true"
+
+
+def test_retry_in_the_same_process_gives_up_after_the_wait():
+    store = _store(wait_seconds=0.05)
+    release = None
+
+    async def slow_work(claim):
+        await release.wait()
+        return {"id": 7}
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        started = asyncio.Event()
+        first = asyncio.create_task(_run(store, "k", {"a": 1}, slow_work, started))
+        await started.wait()
+        try:
+            with pytest.raises(HTTPException) as raised:
+                await _run(store, "k", {"a": 1}, slow_work)
+        finally:
+            release.set()
+            await first
+        return raised.value
+
+    error = asyncio.run(main())
+    assert error.status_code == 409
+    assert error.headers == {"Retry-After": "1"}
+
+
+def test_take_bounds_the_wait_for_another_process():
+    store = _store(wait_seconds=0.25)
+    uow = FakeUnitOfWork(error=psycopg2.errors.LockNotAvailable("lock timeout"))
+
+    with pytest.raises(HTTPException) as raised:
+        Claim(store, 1, "k", "hash").take(uow)
+
+    assert raised.value.status_code == 409
+    assert uow.executed == ["SET LOCAL lock_timeout = '250ms'"]
+
+
+def test_take_replays_or_rejects_a_stored_response():
+    store = _store()
+    assert Claim(store, 1, "k", "hash").take(FakeUnitOfWork(claimed=(1,))) is False
+
+    claim = Claim(store, 1, "k", "hash")
+    assert claim.take(FakeUnitOfWork(stored=("hash", 200, {"id": 7}))) is True
+    assert claim.response.headers[REPLAY_HEADER] == "true"
+
+    with pytest.raises(HTTPException) as raised:
+        Claim(store, 1, "k", "hash").take(FakeUnitOfWork(stored=("other", 200, {"id": 7})))
+    assert raised.value.status_code == 422
+
+
+def test_purge_runs_off_the_event_loop_for_the_requests_location():
+    store = _store()
+    store._purged_at -= 7200
+    seen = []
+    done = threading.Event()
+
+    def purge(query, params):
+        seen.append((threading.current_thread() is threading.main_thread(), current_location.get()))
+        done.set()
+
+    with mock.patch("app.utils.idempotency.execute_query", side_effect=purge):
+        store._purge_if_due(3)
+        assert done.wait(5)
+
+    assert seen == [(False, 3)]
+
+
+def test_retry_replays_the_first_response(client, location, new_order):
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    first = client.post("/api/orders/", json=new_order(), headers=headers)
+    retry = client.post("/api/orders/", json=new_order(), headers=headers)
+
+    assert first.status_code == 200
+    assert REPLAY_HEADER not in first.headers
+    assert retry.status_code == 200
+    assert retry.headers[REPLAY_HEADER] == "true"
+    assert retry.json() == first.json()
+    assert _count_orders(location, first.json()["id"]) == 1
+
+
+def test_replay_from_the_database(client, location, new_order):
+    # As seen by another worker, or after a restart: nothing cached in memory
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    first = client.post("/api/orders/", json=new_order(), headers=headers)
+    idempotency.responses.clear()
+    retry = client.post("/api/orders/", json=new_order(), headers=headers)
+
+    assert retry.headers[REPLAY_HEADER] == "true"
+    assert retry.json()["id"] == first.json()["id"]
+
+
+def test_key_reused_for_a_different_request(client, new_order):
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    client.post("/api/orders/", json=new_order(), headers=headers)
+
+    response = client.post("/api/orders/", json=new_order(quantity=2), headers=headers)
+    assert response.status_code == 422
+
+    idempotency.responses.clear()
+    response = client.post("/api/orders/", json=new_order(quantity=2), headers=headers)
+    assert response.status_code == 422
+
+
+def test_concurrent_retries_create_one_order(client, location, new_order):
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    responses = []
+
+    def submit():
+        responses.append(client.post("/api/orders/", json=new_order(), headers=headers))
+
+    threads = [threading.Thread(target=submit) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [r.status_code for r in responses] == [200] * 4
+    assert len({r.json()["id"] for r in responses}) == 1
+    assert sum(REPLAY_HEADER in r.headers for r in responses) == 3
+
+
+def test_failed_request_can_be_retried(client, table, new_order):
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    missing = client.post("/api/orders/", json=new_order(table_id=table + 1000000), headers=headers)
+    assert missing.status_code == 404
+
+    # Only successes are stored, so the same key goes through once corrected
+    response = client.post("/api/orders/", json=new_order(), headers=headers)
+    assert response.status_code == 200
+    assert REPLAY_HEADER not in response.headers
+
+
+def test_payment_retry_is_not_charged_twice(client, new_order):
+    order = client.post("/api/orders/", json=new_order()).json()
+    payment = {"amount": 12.50, "payment_method": "card"}
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+
+    first = client.post(f"/api/orders/{order['id']}/pay", json=payment, headers=headers)
+    retry = client.post(f"/api/orders/{order['id']}/pay", json=payment, headers=headers)
+
+    assert first.status_code == 200
+    assert retry.headers[REPLAY_HEADER] == "true"
+    assert retry.json() == first.json()
+    assert fetch_one("SELECT COUNT(*) FROM payments WHERE order_id = %s", (order["id"],))[0] == 1
+
+
+def test_waiting_retry_does_not_block_other_requests(client, location, new_order):
+    # Another worker's request holding the key, without this process knowing
+    key = uuid.uuid4().hex
+    responses = []
+    with UnitOfWork() as uow:
+        uow.execute("INSERT INTO idempotency_keys (location_id, idempotency_key, request_hash) VALUES (%s, %s, 'x')",
+                    (location, key))
+        retry = threading.Thread(target=lambda: responses.append(
+            client.post("/api/orders/", json=new_order(), headers={"Idempotency-Key": key})
+        ))
+        retry.start()
+        time.sleep(0.2)
+        start = time.perf_counter()
+        assert client.get("/api/tables/").status_code == 200
+        elapsed = time.perf_counter() - start
+        retry.join(10)
+        uow.execute("DELETE FROM idempotency_keys WHERE location_id = %s AND idempotency_key = %s", (location, key))
+
+    assert responses[0].status_code == 409
+    assert elapsed < idempotency.wait_seconds / 2
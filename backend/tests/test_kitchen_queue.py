@@ -0,0 +1,134 @@
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from app.utils.kitchen_queue import ItemProfile, KitchenBoard, KitchenQueue, SortedList
+from app.utils.reference_data import Snapshot, TableRef
+
+START = datetime(2026, 10, 19, 19, 0)
+SOUP, STEAK, CAKE = 1, 2, 3
+PROFILES = {
+    SOUP: ItemProfile("cold", 1, 60),
+    STEAK: ItemProfile("grill", 2, 900),
+    CAKE: ItemProfile("pastry", 3, 120),
+}
+
+
+def _queue(policy, guest_seconds=30):
+    return KitchenQueue(policy, PROFILES, course_gap=600, guest_seconds=guest_seconds)
+
+
+def _items(*menu_item_ids):
+    return [(menu_item_id, f"item {menu_item_id}", 1, None) for menu_item_id in menu_item_ids]
+
+
+def _order_ids(queue):
+    return [ticket.order_id for ticket in queue.ordered()]
+
+
+def test_sorted_list_keeps_values_in_order():
+    values = list(range(500))
+    random.Random(1).shuffle(values)
+    sorted_list = SortedList()
+    for value in values:
+        sorted_list.add(value)
+    for value in values[:200]:
+        sorted_list.remove(value)
+
+    assert list(sorted_list) == sorted(values[200:])
+    assert len(sorted_list) == 300
+    assert sorted_list.first() == min(values[200:])
+    with pytest.raises(ValueError):
+        sorted_list.remove(values[0])
+
+
+def test_fifo_works_tickets_in_arrival_order():
+    queue = _queue("fifo")
+    queue.add(1, 1, "pending", START, 2, _items(SOUP))
+    queue.add(2, 2, "pending", START + timedelta(minutes=1), 8, _items(STEAK))
+
+    assert _order_ids(queue) == [1, 2]
+    assert queue.first().fire_at == START.timestamp()
+
+
+def test_fire_time_starts_long_dishes_first():
+    queue = _queue("fire_time")
+    queue.add(1, 1, "pending", START, 2, _items(SOUP))
+    # Arrives later, but its steak has to go on 15 minutes before it is due
+    queue.add(2, 2, "pending", START + timedelta(minutes=5), 2, _items(STEAK))
+
+    assert _order_ids(queue) == [2, 1]
+    assert queue.first().fire_at == (START + timedelta(minutes=5)).timestamp() - 900
+
+
+def test_courses_are_due_a_course_gap_apart():
+    queue = _queue("fire_time")
+    queue.add(1, 1, "pending", START, 2, _items(SOUP, STEAK, CAKE))
+    created = START.timestamp()
+
+    assert [line.fire_at - created for line in queue.tickets[1].lines] == [-60, 600 - 900, 1200 - 120]
+
+
+@pytest.mark.parametrize("policy, expected", [("fire_time", [1, 2]), ("weighted", [2, 1])])
+def test_weighted_fires_large_parties_earlier(policy, expected):
+    queue = _queue(policy)
+    queue.add(1, 1, "pending", START, 2, _items(STEAK))
+    queue.add(2, 2, "pending", START + timedelta(minutes=1), 8, _items(STEAK))
+
+    assert _order_ids(queue) == expected
+
+
+def test_status_changes_move_lines_off_the_stations():
+    queue = _queue("fire_time")
+    queue.add(1, 1, "pending", START, 2, _items(SOUP, STEAK))
+    queue.add(2, 2, "pending", START, 2, _items(STEAK))
+
+    queue.set_status(1, "preparing")
+    # Still on the queue, but nothing left to fire
+    assert _order_ids(queue) == [2, 1]
+    assert {station: [ticket.order_id for ticket, _ in lines]
+            for station, lines in queue.next_up(10).items()} == {"grill": [2]}
+
+    queue.set_status(2, "ready")
+    assert _order_ids(queue) == [1]
+    assert queue.stations == {}
+
+    queue.set_status(1, "served")
+    assert len(queue) == 0
+
+
+def test_inactive_orders_are_not_queued():
+    queue = _queue("fifo")
+    queue.add(1, 1, "ready", START, 2, _items(SOUP))
+    queue.add(2, 1, "pending", START, 2, [])
+
+    assert len(queue) == 0
+
+
+@pytest.mark.parametrize("party_size, capacity, guests", [(5, 6, 5), (None, 6, 2), (None, 1, 1)])
+def test_guests_are_the_party_size_or_the_walk_in_default(party_size, capacity, guests):
+    board = KitchenBoard("weighted", resync_seconds=60, prep_refresh_seconds=60, lookback_days=7)
+    board.queues[1] = _queue("weighted")
+    order = SimpleNamespace(id=1, table_id=5, status="pending", created_at=START,
+                            items=[SimpleNamespace(menu_item_id=STEAK, menu_item_name="Steak", quantity=1, notes=None)])
+    reference = Snapshot(1, [TableRef(5, 5, capacity, True)], [])
+
+    with mock.patch("app.utils.kitchen_queue.reference_data.get", return_value=reference), \
+            mock.patch("app.utils.kitchen_queue.KITCHEN_WALK_IN_GUESTS", 2):
+        board.order_created(1, order, party_size)
+
+    assert board.queues[1].tickets[1].guests == guests
+
+
+def test_fire_at_of_queued_tickets_only():
+    board = KitchenBoard("fifo", resync_seconds=60, prep_refresh_seconds=60, lookback_days=7)
+    assert board.fire_at(1, 1) is None
+    board.queues[1] = _queue("fifo")
+    board.queues[1].add(1, 5, "pending", START, 2, _items(SOUP))
+
+    assert board.fire_at(1, 1) == START
+    board.status_changed(1, 1, "ready")
+    assert board.fire_at(1, 1) is None
@@ -0,0 +1,20 @@
+import threading
+
+from app.utils import metrics
+
+
+def test_background_queries_from_many_threads_are_all_counted():
+    before = metrics._background.queries
+
+    def record():
+        for _ in range(20000):
+            metrics.record_query(0.001, 1)
+
+    threads = [threading.Thread(target=record) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert metrics._background.queries - before == 8 * 20000
+    assert f"db_background_queries_total {metrics._background.queries}" in metrics.render_prometheus()
@@ -0,0 +1,119 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.schemas.order import OfflineOrderCreate
+from app.utils.db_helper import execute_query, fetch_one
+from app.utils.order_batch import CLOCK_SKEW, MAX_AGE, _Pending, _price
+from app.utils.reference_data import MenuItemRef, Snapshot, TableRef
+
+NOW = datetime(2026, 10, 19, 20, 0)
+REFERENCE = Snapshot(1, [TableRef(1, 1, 4, True)], [
+    MenuItemRef(10, "Soup", 6.5, True, False),
+    MenuItemRef(11, "Steak", 24.0, True, True),
+])
+
+
+def _pending(created_at, table_id=1, items=((10, 2), (11, 1))):
+    return _Pending(OfflineOrderCreate(
+        client_order_id=uuid.uuid4().hex, created_at=created_at, table_id=table_id,
+        items=[{"menu_item_id": menu_item_id, "quantity": quantity} for menu_item_id, quantity in items],
+    ))
+
+
+@pytest.mark.parametrize("created_at", [
+    NOW,
+    NOW - MAX_AGE + timedelta(minutes=1),
+    NOW + CLOCK_SKEW - timedelta(seconds=1),
+])
+def test_price_accepts_orders_inside_the_offline_window(created_at):
+    pending = _pending(created_at)
+    assert _price(pending, REFERENCE, NOW) is None
+    assert pending.total_amount == 6.5 * 2 + 24.0
+    assert dict(pending.counted) == {11: 1}
+
+
+def test_price_rejects_orders_from_the_future():
+    assert _price(_pending(NOW + CLOCK_SKEW + timedelta(seconds=1)), REFERENCE, NOW) == "created_at is in the future"
+
+
+@pytest.mark.parametrize("age", [MAX_AGE + timedelta(minutes=1), timedelta(days=400)])
+def test_price_rejects_orders_older_than_the_offline_window(age):
+    error = _price(_pending(NOW - age), REFERENCE, NOW)
+    assert error is not None and error.startswith("created_at is more than")
+
+
+def test_price_rejects_unknown_tables_and_items():
+    assert _price(_pending(NOW, table_id=2), REFERENCE, NOW) == "Table not found"
+    assert _price(_pending(NOW, items=((12, 1),)), REFERENCE, NOW) == "Menu item 12 not found"
+
+
+def _offline(table, menu_item, created_at=None, client_order_id=None, quantity=1):
+    return {
+        "client_order_id": client_order_id or uuid.uuid4().hex,
+        "created_at": (created_at or datetime.now()).isoformat(),
+        "table_id": table,
+        "items": [{"menu_item_id": menu_item, "quantity": quantity}],
+    }
+
+
+def test_batch_reports_each_order(client, location, table, menu_item):
+    repeated = _offline(table, menu_item)
+    batch = [
+        _offline(table, menu_item, created_at=datetime.now() - timedelta(minutes=30)),
+        repeated,
+        _offline(table, menu_item, created_at=datetime.now() - timedelta(days=400)),
+        _offline(table + 1000000, menu_item),
+        repeated,
+        dict(repeated, items=[{"menu_item_id": menu_item, "quantity": 3}]),
+    ]
+    response = client.post("/api/orders/batch", json={"orders": batch})
+    assert response.status_code == 200
+    body = response.json()
+    results = body["results"]
+
+    assert [r["status"] for r in results] == ["created", "created", "rejected", "rejected", "duplicate", "rejected"]
+    assert (body["created"], body["duplicates"], body["rejected"]) == (2, 1, 3)
+    assert results[2]["error"].startswith("created_at is more than")
+    assert results[3]["error"] == "Table not found"
+    assert results[4]["order_id"] == results[1]["order_id"]
+    assert results[5]["error"] == "client_order_id was already used for a different order"
+    assert fetch_one("SELECT COUNT(*) FROM orders WHERE location_id = %s AND id = ANY(%s)",
+                     (location, [results[0]["order_id"], results[1]["order_id"]]))[0] == 2
+
+
+def test_resent_batch_creates_nothing(client, location, table, menu_item):
+    batch = {"orders": [_offline(table, menu_item) for _ in range(3)]}
+    first = client.post("/api/orders/batch", json=batch).json()
+    resent = client.post("/api/orders/batch", json=batch).json()
+
+    assert first["created"] == 3
+    assert (resent["created"], resent["duplicates"]) == (0, 3)
+    assert [r["order_id"] for r in resent["results"]] == [r["order_id"] for r in first["results"]]
+
+
+def test_batch_dedupes_against_single_submissions(client, table, menu_item, new_order):
+    # A single POST that timed out on the device, then replayed in a batch
+    key = uuid.uuid4().hex
+    single = client.post("/api/orders/", json=new_order(), headers={"Idempotency-Key": key}).json()
+    result = client.post("/api/orders/batch", json={"orders": [_offline(table, menu_item, client_order_id=key)]}).json()
+
+    assert result["results"][0]["status"] == "duplicate"
+    assert result["results"][0]["order_id"] == single["id"]
+
+
+@pytest.mark.parametrize("response", [None, '{"detail": "Table not found"}'])
+def test_batch_rejects_a_key_stored_without_an_order(client, location, table, menu_item, response):
+    order = _offline(table, menu_item)
+    execute_query(
+        "INSERT INTO idempotency_keys (location_id, idempotency_key, request_hash, status_code, response) "
+        "VALUES (%s, %s, %s, %s, %s)",
+        (location, order["client_order_id"], _Pending(OfflineOrderCreate(**order)).request_hash,
+         response and 404, response),
+    )
+    result = client.post("/api/orders/batch", json={"orders": [order]}).json()
+
+    assert result["results"][0]["status"] == "rejected"
+    assert result["results"][0]["error"].startswith("client_order_id is already in use")
+    assert result["created"] == 0
@@ -0,0 +1,51 @@
+from unittest import mock
+
+from app.core.config import ORDER_HOT_DAYS
+from app.utils.db_helper import fetch_one_and_commit
+
+
+def _old_order(location, table, days):
+    # Older than ORDER_HOT_DAYS: only the unbounded lookups find it
+    return fetch_one_and_commit(
+        "INSERT INTO orders (table_id, total_amount, status, location_id, created_at) "
+        "VALUES (%s, 10, 'served', %s, LOCALTIMESTAMP - make_interval(days => %s)) RETURNING id",
+        (table, location, days),
+    )[0]
+
+
+def test_orders_older_than_the_hot_window_are_still_found(client, location, table):
+    order_id = _old_order(location, table, int(ORDER_HOT_DAYS) + 30)
+
+    assert client.get(f"/api/orders/{order_id}").json()["id"] == order_id
+    updated = client.put(f"/api/orders/{order_id}/status", json={"status": "cancelled"})
+    assert updated.status_code == 200
+    assert updated.json()["status"] == "cancelled"
+
+
+def test_status_listings_cover_the_hot_window(client, location, table, new_order):
+    old_id = _old_order(location, table, int(ORDER_HOT_DAYS) + 30)
+    new_id = client.post("/api/orders/", json=new_order()).json()["id"]
+    client.put(f"/api/orders/{new_id}/status", json={"status": "served"})
+
+    listed = [o["id"] for o in client.get("/api/orders/", params={"status": "served"}).json()]
+    assert new_id in listed and old_id not in listed
+
+    since = client.get(f"/api/orders/{old_id}").json()["created_at"]
+    listed = client.get("/api/orders/", params={"status": "served", "since": since}).json()
+    assert {new_id, old_id} <= {o["id"] for o in listed}
+    assert [len(o["items"]) for o in listed if o["id"] == new_id] == [1]
+
+
+def test_events_carry_the_ticket_queue_position(client, new_order):
+    # Displays patch their queue order from these instead of refetching it
+    client.get("/api/kitchen/queue")
+    with mock.patch("app.api.orders.manager.broadcast", new_callable=mock.AsyncMock) as broadcast:
+        order_id = client.post("/api/orders/", json=new_order()).json()["id"]
+        client.put(f"/api/orders/{order_id}/status", json={"status": "preparing"})
+        client.put(f"/api/orders/{order_id}/status", json={"status": "served"})
+
+    created, preparing, served = [call.args[0] for call in broadcast.call_args_list]
+    queued = {t["order_id"]: t["fire_at"] for t in client.get("/api/kitchen/queue").json()["tickets"]}
+    assert created["order"]["fire_at"] == preparing["fire_at"] is not None
+    assert order_id not in queued
+    assert served["fire_at"] is None
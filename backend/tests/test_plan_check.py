@@ -0,0 +1,16 @@
+from app.utils import plan_check, query_log
+
+
+def test_a_statement_that_no_longer_plans_does_not_stop_the_check(database, monkeypatch):
+    samples = [
+        ("a", "SELECT * FROM dropped_table WHERE id = ?", "SELECT * FROM dropped_table WHERE id = %s", (1,)),
+        ("b", "SELECT name FROM locations", "SELECT name FROM locations", None),
+    ]
+    monkeypatch.setattr(query_log, "samples", lambda: samples)
+
+    # reltuples is -1 for a table never analyzed, so every table counts
+    report = plan_check.find_seq_scans(min_rows=-1)
+
+    assert [entry["id"] for entry in report] == ["a", "b"]
+    assert "dropped_table" in report[0]["error"]
+    assert report[1]["seq_scans"][0]["table"] == "locations"
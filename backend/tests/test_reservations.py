@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+from app.utils.db_helper import execute_query
+from app.utils.reference_data import reference_data
+
+
+def _reservation(table, party_size=2):
+    return {
+        "table_id": table, "customer_name": "Pytest", "customer_phone": "555-0100",
+        "reservation_time": (datetime.now() + timedelta(days=1)).replace(microsecond=0).isoformat(),
+        "party_size": party_size, "duration_minutes": 90,
+    }
+
+
+def test_reservation_for_a_table_deleted_after_the_snapshot(client, location, table):
+    # Reloaded, so it has the table the fixture just inserted
+    reference_data.invalidate(location)
+    snapshot = reference_data.get(location)
+    assert table in snapshot.tables
+    execute_query("DELETE FROM tables WHERE id = %s", (table,))
+
+    # The worker's copy of the reference data still has the table
+    with mock.patch.object(reference_data, "get", return_value=snapshot), \
+            mock.patch.object(reference_data, "invalidate") as invalidate:
+        response = client.post("/api/reservations/", json=_reservation(table))
+
+    # Not the snapshot check (the table is in it) but the foreign key
+    assert response.status_code == 404
+    # The reference data listener may invalidate the location too
+    invalidate.assert_any_call(location)
@@ -0,0 +1,155 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from app.utils.closeout import business_date_of
+from app.utils.db_helper import UnitOfWork, execute_query, fetch_one
+from app.utils.stock import (
+    ITEM_COUNTED, LOCK_SHARDS, REFILL_ITEMS, SET_SHARDS, TAKE_FROM_SHARD, OutOfStock, StockCounters, stock,
+)
+
+
+class FakeUnitOfWork:
+    """Stock counters of one transaction: {menu_item_id: [remaining per shard]}, all locked by other orders."""
+
+    def __init__(self, shards, counted=True):
+        self.shards = shards
+        self.counted = counted
+        self.updates = []
+
+    def fetch_one(self, query, params):
+        if query is TAKE_FROM_SHARD:
+            # Every shard is locked (SKIP LOCKED) or holds too little
+            return None
+        assert query == ITEM_COUNTED
+        return (1,) if self.counted else None
+
+    def fetch_all(self, query, params):
+        assert query == LOCK_SHARDS
+        return list(enumerate(self.shards.get(params[0], [])))
+
+    def execute(self, query, params):
+        assert query == SET_SHARDS
+        shards, remaining, menu_item_id = params
+        for shard, count in zip(shards, remaining):
+            self.shards[menu_item_id][shard] = count
+        self.updates.append(params)
+
+
+def test_spread_takes_from_every_shard_in_order():
+    counters = StockCounters(4)
+    uow = FakeUnitOfWork({7: [2, 1, 3, 2]})
+
+    assert counters.take(uow, {7: 5}) == []
+    assert uow.shards[7] == [0, 0, 1, 2]
+    assert (counters.spread, counters.taken) == (1, 1)
+
+
+def test_spread_rejects_or_takes_what_is_left():
+    counters = StockCounters(4)
+    with pytest.raises(OutOfStock) as raised:
+        counters.take(FakeUnitOfWork({7: [1, 1, 0, 1]}), {7: 4})
+    assert raised.value.available == 3
+    assert counters.rejected == 1
+
+    uow = FakeUnitOfWork({7: [1, 1, 0, 1]})
+    assert counters.take(uow, {7: 4}, partial=True) == [7]
+    assert uow.shards[7] == [0, 0, 0, 0]
+
+
+def test_spread_of_an_item_without_counters():
+    # No longer counted: nothing to take
+    assert StockCounters(4).take(FakeUnitOfWork({}, counted=False), {7: 1}) == []
+    # Counted but without shards would sell it uncounted
+    with pytest.raises(RuntimeError):
+        StockCounters(4).take(FakeUnitOfWork({}), {7: 1})
+
+
+def test_refill_due_once_per_business_day():
+    counters = StockCounters(4)
+    evening = datetime(2026, 10, 19, 22, 0)
+    assert counters.refill_due(1, evening)
+    counters.refilled[1] = business_date_of(evening)
+    # Still the same business day after midnight
+    assert not counters.refill_due(1, datetime(2026, 10, 20, 1, 0))
+    assert counters.refill_due(1, datetime(2026, 10, 20, 12, 0))
+
+
+def _remaining(location, menu_item):
+    return stock.levels(location, menu_item)[0][3]
+
+
+def _take(quantities, partial=False):
+    with UnitOfWork() as uow:
+        return stock.take(uow, quantities, partial=partial)
+
+
+def _is_active(menu_item):
+    return fetch_one("SELECT is_active FROM menu_items WHERE id = %s", (menu_item,))[0]
+
+
+def test_take_counts_down_from_par(location, menu_item):
+    stock.set_par_level(location, menu_item, 24)
+    assert _take({menu_item: 2}) == []
+    # More than any one shard holds, so it is spread over several
+    spread = stock.spread
+    assert _take({menu_item: 10}) == []
+    assert stock.spread == spread + 1
+    assert _remaining(location, menu_item) == 12
+
+
+def test_take_rejects_more_than_is_left(location, menu_item):
+    stock.set_par_level(location, menu_item, 5)
+    with pytest.raises(OutOfStock) as raised:
+        _take({menu_item: 6})
+
+    assert (raised.value.menu_item_id, raised.value.available) == (menu_item, 5)
+    assert _remaining(location, menu_item) == 5
+
+
+def test_partial_take_sells_out_and_refill_restores(location, menu_item):
+    stock.set_par_level(location, menu_item, 5)
+    emptied = _take({menu_item: 6}, partial=True)
+
+    assert emptied == [menu_item]
+    assert stock.sell_out(emptied) == [{"menu_item_id": menu_item, "is_active": False, "remaining": 0}]
+    assert not _is_active(menu_item)
+
+    assert stock.refill(location, [menu_item]) == [{"menu_item_id": menu_item, "is_active": True, "remaining": 5}]
+    assert _is_active(menu_item)
+    assert _remaining(location, menu_item) == 5
+
+
+def test_uncounted_items_are_not_taken(menu_item):
+    assert _take({menu_item: 100}) == []
+
+
+def test_take_waiting_on_a_refill_counts_against_the_refilled_stock(location, menu_item):
+    stock.set_par_level(location, menu_item, 10)
+    _take({menu_item: 8})
+    taken = []
+
+    def take():
+        taken.append(_take({menu_item: 3}))
+
+    with UnitOfWork() as uow:
+        stock._fill(uow, uow.fetch_all(REFILL_ITEMS, (business_date_of(datetime.now()), location, [menu_item], [menu_item])))
+        # Every shard is locked by the refill, so the order waits on them
+        taker = threading.Thread(target=take)
+        taker.start()
+        time.sleep(0.3)
+        assert taker.is_alive()
+    taker.join(5)
+
+    assert taken == [[]]
+    assert _remaining(location, menu_item) == 7
+
+
+def test_take_fails_when_a_counted_item_lost_its_counters(location, menu_item):
+    stock.set_par_level(location, menu_item, 10)
+    execute_query("DELETE FROM item_stock_shards WHERE menu_item_id = %s", (menu_item,))
+
+    with pytest.raises(RuntimeError):
+        _take({menu_item: 1})
@@ -4,12 +4,16 @@ import { CheckCircle, Clock, ChefHat, RefreshCcw, AlertCircle } from "lucide-rea
 
 function KitchenDisplay() {
   const [orders, setOrders] = useState([]);
+  // order id -> when its ticket fires (ms), the server's kitchen queue order
+  const [fireAt, setFireAt] = useState({});
   const [loading, setLoading] = useState(true);
   const [connectionStatus, setConnectionStatus] = useState("disconnected");
   const ws = useRef(null);
+  const connectedBefore = useRef(false);
 
   useEffect(() => {
     fetchOrders();
+    fetchQueue();
     connectWebSocket();
 
     return () => {
@@ -25,17 +29,29 @@ function KitchenDisplay() {
     ws.current.onopen = () => {
       console.log("Connected to Kitchen WS");
       setConnectionStatus("connected");
+      // Events sent while disconnected are lost: start over from the server
+      if (connectedBefore.current) {
+        fetchOrders();
+        fetchQueue();
+      }
+      connectedBefore.current = true;
     };
 
     ws.current.onmessage = (event) => {
       const data = JSON.parse(event.data);
       console.log("WS Message:", data);
-      
+
       if (data.type === "new_order") {
         // Add new order to list if it matches active filters
         setOrders(prev => [data.order, ...prev]);
+        patchQueue([[data.order.id, data.order.status, data.order.fire_at]]);
         // Optional: Play sound or show visual alert
+      } else if (data.type === "new_orders") {
+        // A batch of orders replayed by a POS after being offline, oldest first
+        setOrders(prev => [...[...data.orders].reverse(), ...prev]);
+        patchQueue(data.orders.map(o => [o.id, o.status, o.fire_at]));
       } else if (data.type === "status_update") {
+        patchQueue([[data.order_id, data.new_status, data.fire_at]]);
         // Update local status
         setOrders(prev => prev.map(o => 
           o.id === data.order_id ? { ...o, status: data.new_status } : o
@@ -76,6 +92,36 @@ function KitchenDisplay() {
     }
   };
 
+  const fetchQueue = async () => {
+    try {
+      const res = await api.get("/kitchen/queue", { params: { limit: 1000 } });
+      setFireAt(Object.fromEntries(res.data.tickets.map(t => [t.order_id, Date.parse(t.fire_at)])));
+    } catch (err) {
+      console.error("Error fetching kitchen queue:", err);
+    }
+  };
+
+  // Applies [order id, status, fire_at] from events. The queue is ordered by
+  // fire time, so the tickets keep their order without refetching it.
+  const patchQueue = (changes) => {
+    // Still active but not queued where the event came from: ask for the queue
+    if (changes.some(([, status, at]) => !at && ['pending', 'preparing'].includes(status))) {
+      fetchQueue();
+      return;
+    }
+    setFireAt(prev => {
+      const next = { ...prev };
+      for (const [id, , at] of changes) {
+        if (at) next[id] = Date.parse(at);
+        else delete next[id];
+      }
+      return next;
+    });
+  };
+
+  // Queued tickets in the server's order (fire time, then id); ready ones (off the queue) after them
+  const byPriority = (a, b) => (fireAt[a.id] ?? Infinity) - (fireAt[b.id] ?? Infinity) || a.id - b.id;
+
   const updateStatus = async (orderId, newStatus) => {
     try {
       await api.put(`/orders/${orderId}/status`, { status: newStatus });
@@ -113,7 +159,7 @@ function KitchenDisplay() {
             {connectionStatus === 'connected' ? 'Live' : 'Disconnected'}
           </div>
           <button 
-            onClick={fetchOrders}
+            onClick={() => { fetchOrders(); fetchQueue(); }}
             className="flex items-center gap-2 text-gray-600 hover:text-orange-600"
           >
             <RefreshCcw className="w-5 h-5" /> Refresh
@@ -131,7 +177,7 @@ function KitchenDisplay() {
         </div>
       ) : (
         <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4 gap-6">
-          {orders.map((order) => (
+          {[...orders].sort(byPriority).map((order) => (
             <div 
               key={order.id} 
               className={`border-l-8 rounded-lg shadow-md p-4 bg-white transition-all duration-300 animate-fade-in ${getStatusColor(order.status)}`}